@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, "HIK_WEBHOOK_FAST_LANE", False):
+    from hik_gateway.fast_lane import WebhookFastLaneASGI  # noqa: E402
+
+    application = WebhookFastLaneASGI(application)
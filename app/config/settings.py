@@ -140,3 +140,45 @@ HIK_GATEWAY_ALLOWED_IPS = [ip.strip() for ip in os.getenv("HIK_GATEWAY_ALLOWED_I
 HIK_WEBHOOK_IP = os.getenv("HIK_WEBHOOK_IP", "")
 HIK_WEBHOOK_PORT = int(os.getenv("HIK_WEBHOOK_PORT", "443"))
 HIK_WEBHOOK_URL = os.getenv("HIK_WEBHOOK_URL", "/api/hik/events")
+HIK_GATEWAY_POOL_MAXSIZE = int(os.getenv("HIK_GATEWAY_POOL_MAXSIZE", "10"))
+HIK_GATEWAY_FANOUT_DEADLINE = float(os.getenv("HIK_GATEWAY_FANOUT_DEADLINE", "25"))
+HIK_GATEWAY_FANOUT_WORKERS = int(os.getenv("HIK_GATEWAY_FANOUT_WORKERS", "16"))
+HIK_GATEWAY_INVENTORY_TTL = float(os.getenv("HIK_GATEWAY_INVENTORY_TTL", "30"))
+HIK_GATEWAY_INVENTORY_STALE_TTL = float(os.getenv("HIK_GATEWAY_INVENTORY_STALE_TTL", "300"))
+HIK_RESOLUTION_CACHE_SIZE = int(os.getenv("HIK_RESOLUTION_CACHE_SIZE", "1024"))
+HIK_RESOLUTION_CACHE_TTL = float(os.getenv("HIK_RESOLUTION_CACHE_TTL", "300"))
+HIK_DEVICE_RESYNC_DEFERRED = os.getenv("HIK_DEVICE_RESYNC_DEFERRED", "1").strip().lower() in {"1", "true", "yes", "on"}
+HIK_DEVICE_RESYNC_BACKOFF = float(os.getenv("HIK_DEVICE_RESYNC_BACKOFF", "30"))
+HIK_DEVICE_RESYNC_MAX_BACKOFF = float(os.getenv("HIK_DEVICE_RESYNC_MAX_BACKOFF", "900"))
+HIK_RECENT_EVENT_KEYS_SIZE = int(os.getenv("HIK_RECENT_EVENT_KEYS_SIZE", "20000"))
+HIK_RECENT_EVENT_KEYS_TTL = float(os.getenv("HIK_RECENT_EVENT_KEYS_TTL", "900"))
+HIK_WEBHOOK_INBOX = os.getenv("HIK_WEBHOOK_INBOX", "0").strip().lower() in {"1", "true", "yes", "on"}
+HIK_WEBHOOK_INBOX_BATCH_SIZE = int(os.getenv("HIK_WEBHOOK_INBOX_BATCH_SIZE", "200"))
+HIK_WEBHOOK_SPOOL_DIR = os.getenv("HIK_WEBHOOK_SPOOL_DIR", "")
+HIK_WEBHOOK_SPOOL_SEGMENT_BYTES = int(os.getenv("HIK_WEBHOOK_SPOOL_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+HIK_WEBHOOK_SPOOL_MAX_BYTES = int(os.getenv("HIK_WEBHOOK_SPOOL_MAX_BYTES", str(512 * 1024 * 1024)))
+HIK_WEBHOOK_SPOOL_LATENCY_BUDGET = float(os.getenv("HIK_WEBHOOK_SPOOL_LATENCY_BUDGET", "2"))
+HIK_WEBHOOK_SPOOL_COOLDOWN = float(os.getenv("HIK_WEBHOOK_SPOOL_COOLDOWN", "10"))
+HIK_WEBHOOK_ASYNC = os.getenv("HIK_WEBHOOK_ASYNC", "0").strip().lower() in {"1", "true", "yes", "on"}
+HIK_WEBHOOK_FAST_LANE = os.getenv("HIK_WEBHOOK_FAST_LANE", "0").strip().lower() in {"1", "true", "yes", "on"}
+HIK_HEARTBEAT_TOUCH_INTERVAL = float(os.getenv("HIK_HEARTBEAT_TOUCH_INTERVAL", "60"))
+HIK_PICTURE_DIR = os.getenv("HIK_PICTURE_DIR", str(BASE_DIR / "hik_pictures"))
+HIK_ALERT_STREAM_BATCH_SIZE = int(os.getenv("HIK_ALERT_STREAM_BATCH_SIZE", "50"))
+HIK_ALERT_STREAM_FLUSH_INTERVAL = float(os.getenv("HIK_ALERT_STREAM_FLUSH_INTERVAL", "1"))
+HIK_ALERT_STREAM_READ_TIMEOUT = float(os.getenv("HIK_ALERT_STREAM_READ_TIMEOUT", "90"))
+HIK_ALERT_STREAM_MAX_BACKOFF = float(os.getenv("HIK_ALERT_STREAM_MAX_BACKOFF", "60"))
+HIK_CATCHUP_PER_GATEWAY = int(os.getenv("HIK_CATCHUP_PER_GATEWAY", "4"))
+HIK_CATCHUP_MIN_INTERVAL = float(os.getenv("HIK_CATCHUP_MIN_INTERVAL", "60"))
+HIK_CATCHUP_MAX_INTERVAL = float(os.getenv("HIK_CATCHUP_MAX_INTERVAL", "1800"))
+HIK_CATCHUP_REALTIME_FRESH = float(os.getenv("HIK_CATCHUP_REALTIME_FRESH", "600"))
+HIK_CATCHUP_OFFLINE_MAX_BACKOFF = float(os.getenv("HIK_CATCHUP_OFFLINE_MAX_BACKOFF", "3600"))
+HIK_CATCHUP_TICK_DEVICES = int(os.getenv("HIK_CATCHUP_TICK_DEVICES", "200"))
+HIK_SERIAL_GAP_MAX_SPAN = int(os.getenv("HIK_SERIAL_GAP_MAX_SPAN", "10000"))
+HIK_SERIAL_GAP_LOOKBACK = float(os.getenv("HIK_SERIAL_GAP_LOOKBACK", "86400"))
+HIK_BACKFILL_WINDOW_EVENTS = int(os.getenv("HIK_BACKFILL_WINDOW_EVENTS", "2000"))
+HIK_BACKFILL_MIN_WINDOW = float(os.getenv("HIK_BACKFILL_MIN_WINDOW", "60"))
+HIK_BACKFILL_INSERT_BATCH = int(os.getenv("HIK_BACKFILL_INSERT_BATCH", "1000"))
+HIK_WEBHOOK_SPOOL_MAX_RECORD_BYTES = int(os.getenv("HIK_WEBHOOK_SPOOL_MAX_RECORD_BYTES", str(4 * 1024 * 1024)))
+HIK_GATEWAY_INVENTORY_CACHE_SIZE = int(os.getenv("HIK_GATEWAY_INVENTORY_CACHE_SIZE", "256"))
+HIK_ALERT_STREAM_MAX_PENDING = int(os.getenv("HIK_ALERT_STREAM_MAX_PENDING", "5000"))
+HIK_ALERT_STREAM_RESUME_WORKERS = int(os.getenv("HIK_ALERT_STREAM_RESUME_WORKERS", "4"))
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, "HIK_WEBHOOK_FAST_LANE", False):
+    from hik_gateway.fast_lane import WebhookFastLaneWSGI  # noqa: E402
+
+    application = WebhookFastLaneWSGI(application)
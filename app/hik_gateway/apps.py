@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class HikGatewayConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "hik_gateway"
+
+    def ready(self):
+        from hik_gateway import signals  # noqa: F401
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+from urllib.parse import urljoin
+
+import httpx
+
+from hik_gateway.client import (
+    DEFAULT_PAGE_CONCURRENCY,
+    DEFAULT_POOL_MAXSIZE,
+    build_device_list_result,
+    build_device_search_payload,
+    device_page_positions,
+    merge_device_pages,
+    parse_device_page,
+)
+
+
+class AsyncHikGatewayClient:
+    def __init__(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        timeout: float = 20,
+        max_connections: int = DEFAULT_POOL_MAXSIZE,
+    ):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.timeout = timeout
+        self.http = httpx.AsyncClient(
+            auth=httpx.DigestAuth(username, password),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+
+    async def __aenter__(self) -> AsyncHikGatewayClient:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        payload: dict[str, Any],
+        params: dict[str, Any] | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        url = urljoin(self.base_url, path.lstrip("/"))
+        response = await self.http.request(
+            method,
+            url,
+            json=payload,
+            params=params or {},
+            timeout=timeout or self.timeout,
+        )
+        response.raise_for_status()
+        return response.json() if response.content else {}
+
+    async def _post(
+        self,
+        path: str,
+        payload: dict[str, Any],
+        params: dict[str, Any] | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        return await self._request("POST", path, payload, params=params, timeout=timeout)
+
+    async def _put(
+        self,
+        path: str,
+        payload: dict[str, Any],
+        params: dict[str, Any] | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        return await self._request("PUT", path, payload, params=params, timeout=timeout)
+
+    async def device_list(
+        self,
+        payload: dict[str, Any] | None = None,
+        timeout: float | None = None,
+        *,
+        position: int = 0,
+        max_result: int = 100,
+        protocol_types: list[str] | None = None,
+        statuses: list[str] | None = None,
+        dev_type: str = "",
+        key: str = "",
+    ) -> dict[str, Any]:
+        request_payload = payload or build_device_search_payload(
+            position=position,
+            max_result=max_result,
+            protocol_types=protocol_types,
+            statuses=statuses,
+            dev_type=dev_type,
+            key=key,
+        )
+
+        return await self._post(
+            "/ISAPI/ContentMgmt/DeviceMgmt/deviceList",
+            payload=request_payload,
+            params={"format": "json"},
+            timeout=timeout,
+        )
+
+    async def device_list_all(
+        self,
+        *,
+        max_result: int = 100,
+        protocol_types: list[str] | None = None,
+        statuses: list[str] | None = None,
+        dev_type: str = "",
+        key: str = "",
+        timeout: float | None = None,
+        page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    ) -> dict[str, Any]:
+        semaphore = asyncio.Semaphore(max(1, page_concurrency))
+
+        async def fetch_page(position: int, total_matches: int = 0) -> tuple[list[dict[str, Any]], int, int]:
+            async with semaphore:
+                payload = await self.device_list(
+                    position=position,
+                    max_result=max_result,
+                    protocol_types=protocol_types,
+                    statuses=statuses,
+                    dev_type=dev_type,
+                    key=key,
+                    timeout=timeout,
+                )
+            return parse_device_page(payload, total_matches)
+
+        page_matches, page_size, total_matches = await fetch_page(0)
+        pages = [page_matches]
+
+        positions = device_page_positions(page_size, total_matches)
+        if positions:
+            results = await asyncio.gather(*(fetch_page(position) for position in positions))
+            pages.extend(page for page, _, _ in results)
+        elif not total_matches:
+            position = page_size
+            num_of_matches = page_size
+            while num_of_matches > 0:
+                page_matches, num_of_matches, total_matches = await fetch_page(position, total_matches)
+                pages.append(page_matches)
+                position += num_of_matches
+                if total_matches and position >= total_matches:
+                    break
+
+        return build_device_list_result(merge_device_pages(pages), total_matches)
+
+    async def set_http_host(
+        self,
+        dev_index: str,
+        payload: dict[str, Any],
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        return await self._put(
+            "/ISAPI/Event/notification/httpHosts",
+            payload=payload,
+            params={"format": "json", "devIndex": dev_index},
+            timeout=timeout,
+        )
+
+    async def acs_event_search(
+        self,
+        dev_index: str,
+        cond: dict[str, Any],
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        return await self._post(
+            "/ISAPI/AccessControl/AcsEvent",
+            payload=cond,
+            params={"format": "json", "devIndex": dev_index},
+            timeout=timeout,
+        )
@@ -1,17 +1,143 @@
 from __future__ import annotations
 
-from typing import Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator
 from urllib.parse import urljoin
 
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPDigestAuth
 
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_PAGE_CONCURRENCY = 4
+
+
+def build_device_search_payload(
+    position: int = 0,
+    max_result: int = 100,
+    protocol_types: list[str] | None = None,
+    statuses: list[str] | None = None,
+    dev_type: str = "",
+    key: str = "",
+) -> dict[str, Any]:
+    return {
+        "SearchDescription": {
+            "position": position,
+            "maxResult": max_result,
+            "Filter": {
+                "key": key,
+                "devType": dev_type,
+                "protocolType": protocol_types if protocol_types is not None else ["ehomeV5"],
+                "devStatus": statuses if statuses is not None else ["online", "offline"],
+            },
+        }
+    }
+
+
+def parse_device_page(payload: dict[str, Any], total_matches: int = 0) -> tuple[list[dict[str, Any]], int, int]:
+    search_result = payload.get("SearchResult", {}) if isinstance(payload, dict) else {}
+    if not isinstance(search_result, dict):
+        search_result = {}
+    page_matches = search_result.get("MatchList", [])
+    if isinstance(page_matches, dict):
+        page_matches = [page_matches]
+    if not isinstance(page_matches, list):
+        page_matches = []
+
+    num_of_matches = int(search_result.get("numOfMatches", len(page_matches)) or 0)
+    total_matches = int(search_result.get("totalMatches", total_matches) or total_matches)
+    return [item for item in page_matches if isinstance(item, dict)], num_of_matches, total_matches
+
+
+def device_page_positions(page_size: int, total_matches: int) -> list[int]:
+    if page_size <= 0 or not total_matches:
+        return []
+    return list(range(page_size, total_matches, page_size))
+
+
+def merge_device_pages(pages: list[list[dict[str, Any]]]) -> list[dict[str, Any]]:
+    merged: list[dict[str, Any]] = []
+    seen: set[str] = set()
+    for page in pages:
+        for item in page:
+            device = item.get("Device") if isinstance(item.get("Device"), dict) else item
+            dev_index = device.get("devIndex")
+            if dev_index:
+                if dev_index in seen:
+                    continue
+                seen.add(dev_index)
+            merged.append(item)
+    return merged
+
+
+def build_device_list_result(match_list: list[dict[str, Any]], total_matches: int) -> dict[str, Any]:
+    return {
+        "SearchResult": {
+            "position": 0,
+            "numOfMatches": len(match_list),
+            "totalMatches": total_matches or len(match_list),
+            "MatchList": match_list,
+        }
+    }
+
+
+# HTTPDigestAuth keeps the challenge per thread; share it (and the nc counter) across
+# threads so only a stale nonce triggers a new 401 round trip.
+class PreemptiveDigestAuth(HTTPDigestAuth):
+    def __init__(self, username: str, password: str):
+        super().__init__(username, password)
+        self._challenge_lock = threading.RLock()
+        self._challenge: dict[str, str] = {}
+        self._nonce_count = 0
+
+    def __call__(self, r):
+        with self._challenge_lock:
+            self.init_per_thread_state()
+            if self._challenge:
+                self._thread_local.chal = dict(self._challenge)
+                self._thread_local.last_nonce = self._challenge.get("nonce", "")
+            return super().__call__(r)
+
+    def build_digest_header(self, method: str, url: str) -> str | None:
+        with self._challenge_lock:
+            nonce = self._thread_local.chal.get("nonce", "")
+            if nonce and nonce == self._challenge.get("nonce"):
+                self._thread_local.last_nonce = nonce
+                self._thread_local.nonce_count = self._nonce_count
+            header = super().build_digest_header(method, url)
+            if header:
+                self._challenge = dict(self._thread_local.chal)
+                self._nonce_count = self._thread_local.nonce_count
+            return header
+
 
 class HikGatewayClient:
-    def __init__(self, base_url: str, username: str, password: str, timeout: int = 20):
+    def __init__(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        timeout: int = 20,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    ):
         self.base_url = base_url.rstrip("/") + "/"
-        self.auth = HTTPDigestAuth(username, password)
+        self.auth = PreemptiveDigestAuth(username, password)
         self.timeout = timeout
+        self.session = self._build_session(pool_maxsize)
+
+    def _build_session(self, pool_maxsize: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.auth = self.auth
+        session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        return session
+
+    def close(self) -> None:
+        self.session.close()
 
     def _post(
         self,
@@ -21,11 +147,10 @@ class HikGatewayClient:
         timeout: int | None = None,
     ) -> dict[str, Any]:
         url = urljoin(self.base_url, path.lstrip("/"))
-        response = requests.post(
+        response = self.session.post(
             url,
             json=payload,
             params=params or {},
-            auth=self.auth,
             timeout=timeout or self.timeout,
         )
         response.raise_for_status()
@@ -33,7 +158,7 @@ class HikGatewayClient:
 
     def _put(self, path: str, payload: dict[str, Any], params: dict[str, Any] | None = None) -> dict[str, Any]:
         url = urljoin(self.base_url, path.lstrip("/"))
-        response = requests.put(url, json=payload, params=params or {}, auth=self.auth, timeout=self.timeout)
+        response = self.session.put(url, json=payload, params=params or {}, timeout=self.timeout)
         response.raise_for_status()
         return response.json() if response.content else {}
 
@@ -46,18 +171,14 @@ class HikGatewayClient:
         dev_type: str = "",
         key: str = "",
     ) -> dict[str, Any]:
-        return {
-            "SearchDescription": {
-                "position": position,
-                "maxResult": max_result,
-                "Filter": {
-                    "key": key,
-                    "devType": dev_type,
-                    "protocolType": protocol_types if protocol_types is not None else ["ehomeV5"],
-                    "devStatus": statuses if statuses is not None else ["online", "offline"],
-                },
-            }
-        }
+        return build_device_search_payload(
+            position=position,
+            max_result=max_result,
+            protocol_types=protocol_types,
+            statuses=statuses,
+            dev_type=dev_type,
+            key=key,
+        )
 
     def device_list(
         self,
@@ -96,10 +217,51 @@ class HikGatewayClient:
         dev_type: str = "",
         key: str = "",
         timeout: int | None = None,
+        page_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
     ) -> dict[str, Any]:
+        def fetch_page(position: int, total_matches: int = 0) -> tuple[list[dict[str, Any]], int, int]:
+            payload = self.device_list(
+                position=position,
+                max_result=max_result,
+                protocol_types=protocol_types,
+                statuses=statuses,
+                dev_type=dev_type,
+                key=key,
+                timeout=timeout,
+            )
+            return parse_device_page(payload, total_matches)
+
+        page_matches, page_size, total_matches = fetch_page(0)
+        pages = [page_matches]
+
+        positions = device_page_positions(page_size, total_matches)
+        if positions:
+            with ThreadPoolExecutor(max_workers=max(1, min(page_concurrency, len(positions)))) as executor:
+                pages.extend(page for page, _, _ in executor.map(fetch_page, positions))
+        elif not total_matches:
+            position = page_size
+            num_of_matches = page_size
+            while num_of_matches > 0:
+                page_matches, num_of_matches, total_matches = fetch_page(position, total_matches)
+                pages.append(page_matches)
+                position += num_of_matches
+                if total_matches and position >= total_matches:
+                    break
+
+        return build_device_list_result(merge_device_pages(pages), total_matches)
+
+    def iter_device_list_pages(
+        self,
+        *,
+        max_result: int = 100,
+        protocol_types: list[str] | None = None,
+        statuses: list[str] | None = None,
+        dev_type: str = "",
+        key: str = "",
+        timeout: int | None = None,
+    ) -> Iterator[dict[str, Any]]:
         position = 0
         total_matches = 0
-        match_list: list[dict[str, Any]] = []
 
         while True:
             payload = self.device_list(
@@ -111,32 +273,15 @@ class HikGatewayClient:
                 key=key,
                 timeout=timeout,
             )
-            search_result = payload.get("SearchResult", {}) if isinstance(payload, dict) else {}
-            page_matches = search_result.get("MatchList", []) if isinstance(search_result, dict) else []
-            if isinstance(page_matches, dict):
-                page_matches = [page_matches]
-            if not isinstance(page_matches, list):
-                page_matches = []
-
-            num_of_matches = int(search_result.get("numOfMatches", len(page_matches)) or 0)
-            total_matches = int(search_result.get("totalMatches", total_matches) or total_matches)
-            match_list.extend([item for item in page_matches if isinstance(item, dict)])
+            yield payload
 
+            _, num_of_matches, total_matches = parse_device_page(payload, total_matches)
             position += num_of_matches
             if num_of_matches <= 0:
                 break
             if total_matches and position >= total_matches:
                 break
 
-        return {
-            "SearchResult": {
-                "position": 0,
-                "numOfMatches": len(match_list),
-                "totalMatches": total_matches or len(match_list),
-                "MatchList": match_list,
-            }
-        }
-
     def set_http_host(self, dev_index: str, payload: dict[str, Any]) -> dict[str, Any]:
         return self._put(
             "/ISAPI/Event/notification/httpHosts",
@@ -144,9 +289,64 @@ class HikGatewayClient:
             params={"format": "json", "devIndex": dev_index},
         )
 
+    def alert_stream(self, dev_index: str | None = None, read_timeout: float = 90) -> requests.Response:
+        params = {"format": "json"}
+        if dev_index:
+            params["devIndex"] = dev_index
+        response = self.session.get(
+            urljoin(self.base_url, "ISAPI/Event/notification/alertStream"),
+            params=params,
+            stream=True,
+            timeout=(self.timeout, read_timeout),
+        )
+        response.raise_for_status()
+        return response
+
     def acs_event_search(self, dev_index: str, cond: dict[str, Any]) -> dict[str, Any]:
         return self._post(
             "/ISAPI/AccessControl/AcsEvent",
             payload=cond,
             params={"format": "json", "devIndex": dev_index},
         )
+
+    def acs_event_total_num(self, dev_index: str, cond: dict[str, Any]) -> dict[str, Any]:
+        return self._post(
+            "/ISAPI/AccessControl/AcsEventTotalNum",
+            payload=cond,
+            params={"format": "json", "devIndex": dev_index},
+        )
+
+
+_clients: dict[int, tuple[tuple[str, str, str], HikGatewayClient]] = {}
+_clients_lock = threading.Lock()
+
+
+def _gateway_fingerprint(gateway) -> tuple[str, str, str]:
+    return (gateway.base_url, gateway.username, gateway.password)
+
+
+def get_gateway_client(gateway) -> HikGatewayClient:
+    fingerprint = _gateway_fingerprint(gateway)
+    with _clients_lock:
+        cached = _clients.get(gateway.id)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        client = HikGatewayClient(
+            gateway.base_url,
+            gateway.username,
+            gateway.password,
+            pool_maxsize=getattr(settings, "HIK_GATEWAY_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE),
+        )
+        _clients[gateway.id] = (fingerprint, client)
+    if cached is not None:
+        # The credentials or URL changed: release the old client's pooled connections.
+        cached[1].close()
+    return client
+
+
+def drop_gateway_client(gateway_id: int) -> None:
+    with _clients_lock:
+        cached = _clients.pop(gateway_id, None)
+    if cached is not None:
+        cached[1].close()
@@ -0,0 +1,46 @@
+"""Canonical RawEvent identity, shared by ingestion and the migrations that backfill it.
+
+Kept free of model imports so migrations can call it with historical models.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils.dateparse import parse_datetime
+
+EVENT_KEY_SIZE = 16
+
+
+def build_event_key(device_ref: str, event_datetime: datetime | None, serial_no: int | None, person_hint: str) -> bytes:
+    timestamp = event_datetime.astimezone(dt_timezone.utc).isoformat() if event_datetime else ""
+    identity = str(serial_no) if serial_no is not None else f"person:{person_hint}"
+    raw = "|".join([device_ref, timestamp, identity])
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=EVENT_KEY_SIZE).digest()
+
+
+def _has_parseable_timestamp(payload) -> bool:
+    root = payload.get("EventNotificationAlert", payload) if isinstance(payload, dict) else {}
+    if not isinstance(root, dict):
+        return False
+    access_event = root.get("AccessControllerEvent") or {}
+    timestamp_raw = root.get("dateTime") or (access_event.get("time") if isinstance(access_event, dict) else None)
+    try:
+        return parse_datetime(timestamp_raw or "") is not None
+    except (TypeError, ValueError):
+        return False
+
+
+def stored_event_key(raw_event) -> bytes:
+    """The key ingestion would have given this stored row; event_datetime is only trusted when the payload had one."""
+    device_ref = str(raw_event.device_id) if raw_event.device_id is not None else f"dev:{raw_event.dev_index}"
+    event_datetime = raw_event.event_datetime if _has_parseable_timestamp(raw_event.payload) else None
+    person_hint = raw_event.employee_no_string or raw_event.employee_no or raw_event.card_no or ""
+    return build_event_key(device_ref, event_datetime, raw_event.serial_no, person_hint)
+
+
+def set_aside_event_key(event_key: bytes, raw_event_id: int) -> bytes:
+    """Unique stand-in key for a row that duplicates an older one, so it can be kept and purged explicitly."""
+    raw = bytes(event_key) + b"|duplicate|" + str(raw_event_id).encode("ascii")
+    return hashlib.blake2b(raw, digest_size=EVENT_KEY_SIZE).digest()
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+
+from hik_gateway.webhook_urls import WEBHOOK_PATHS
+
+WEBHOOK_URLCONF = "hik_gateway.webhook_urls"
+
+
+class _FastLaneMixin:
+    def load_middleware(self, is_async=False):
+        # Device pushes authenticate by IP/token inside the view; sessions, CSRF, auth, messages and
+        # clickjacking middleware only add per-request work, so the chain is the bare view call.
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+        get_response = self._get_response_async if is_async else self._get_response
+        self._middleware_chain = convert_exception_to_response(get_response)
+
+    def get_response(self, request):
+        request.urlconf = WEBHOOK_URLCONF
+        return super().get_response(request)
+
+    async def get_response_async(self, request):
+        request.urlconf = WEBHOOK_URLCONF
+        return await super().get_response_async(request)
+
+
+class WebhookWSGIHandler(_FastLaneMixin, WSGIHandler):
+    pass
+
+
+class WebhookASGIHandler(_FastLaneMixin, ASGIHandler):
+    pass
+
+
+class WebhookFastLaneWSGI:
+    def __init__(self, application):
+        self.application = application
+        self.fast_lane = WebhookWSGIHandler()
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") in WEBHOOK_PATHS:
+            return self.fast_lane(environ, start_response)
+        return self.application(environ, start_response)
+
+
+class WebhookFastLaneASGI:
+    def __init__(self, application):
+        self.application = application
+        self.fast_lane = WebhookASGIHandler()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope.get("path") in WEBHOOK_PATHS:
+            return await self.fast_lane(scope, receive, send)
+        return await self.application(scope, receive, send)
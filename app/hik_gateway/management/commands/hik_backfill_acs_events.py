@@ -0,0 +1,72 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from hik_gateway.models import Device
+from hik_gateway.services.backfill import BackfillProgress, backfill_device
+
+
+def _parse_moment(value: str, option: str) -> datetime:
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"{option}: expected a date or datetime, got '{value}'")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = "Backfill a device's stored access control events over a date range, several windows at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", required=True, help="Tenant code")
+        parser.add_argument("--dev-index", required=True, help="devIndex of the device")
+        parser.add_argument("--start", required=True, help="Start date or datetime (ISO 8601)")
+        parser.add_argument("--end", default=None, help="End date or datetime (ISO 8601), defaults to now")
+        parser.add_argument("--workers", type=int, default=None, help="Windows fetched at once, capped per gateway")
+        parser.add_argument("--max-results", type=int, default=50)
+
+    def _report(self, progress: BackfillProgress) -> None:
+        self.stdout.write(
+            f"windows {progress.windows_done}/{progress.windows} "
+            f"events {progress.fetched}/{progress.expected} (created {progress.created}) "
+            f"{progress.rate:.0f} events/s"
+        )
+
+    def handle(self, *args, **options):
+        start = _parse_moment(options["start"], "--start")
+        end = _parse_moment(options["end"], "--end") if options["end"] else timezone.now()
+        if end <= start:
+            raise CommandError("--end must be after --start")
+
+        device = (
+            Device.objects.select_related("gateway", "tenant")
+            .filter(tenant__code=options["tenant"], dev_index=options["dev_index"])
+            .first()
+        )
+        if device is None:
+            raise CommandError(f"Device '{options['dev_index']}' not found for tenant '{options['tenant']}'")
+
+        progress = backfill_device(
+            device,
+            start,
+            end,
+            max_results=options["max_results"],
+            workers=options["workers"],
+            on_progress=self._report,
+        )
+
+        for error in progress.errors:
+            self.stderr.write(f"failed window {error}")
+        message = (
+            f"Backfilled {progress.created} new events ({progress.fetched} fetched) in {progress.elapsed:.1f}s, "
+            f"{len(progress.errors)} windows failed"
+        )
+        if progress.errors:
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS(message))
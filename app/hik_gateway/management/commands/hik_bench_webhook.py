@@ -0,0 +1,64 @@
+import io
+import json
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from hik_gateway.fast_lane import WebhookWSGIHandler
+
+# A heartbeat is answered right after the view's IP/token checks, so the timing is the request
+# stack itself rather than ingestion or the database.
+HEARTBEAT_BODY = json.dumps({"EventNotificationAlert": {"eventType": "heartBeat"}}).encode("utf-8")
+
+
+def _environ(path: str, body: bytes, token: str) -> dict:
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": path,
+        "SCRIPT_NAME": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "REMOTE_ADDR": "127.0.0.1",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.url_scheme": "http",
+    }
+    if token:
+        environ["HTTP_X_HIK_TOKEN"] = token
+    return environ
+
+
+def _start_response(status, headers, exc_info=None):
+    return None
+
+
+class Command(BaseCommand):
+    help = "Measure per-request overhead of the full middleware stack vs. the webhook fast lane"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--path", default="/api/hik/events")
+        parser.add_argument("--token", default="", help="X-HIK-TOKEN to send when HIK_GATEWAY_WEBHOOK_TOKEN is set")
+
+    def _measure(self, handler, path: str, token: str, count: int) -> float:
+        handler(_environ(path, HEARTBEAT_BODY, token), _start_response)
+        started = time.perf_counter()
+        for _ in range(count):
+            response = handler(_environ(path, HEARTBEAT_BODY, token), _start_response)
+            response.close()
+        return (time.perf_counter() - started) / count
+
+    def handle(self, *args, **options):
+        count = max(1, options["requests"])
+        with override_settings(HIK_WEBHOOK_INBOX=False, HIK_WEBHOOK_SPOOL_DIR="", ALLOWED_HOSTS=["localhost"]):
+            full = self._measure(WSGIHandler(), options["path"], options["token"], count)
+            fast = self._measure(WebhookWSGIHandler(), options["path"], options["token"], count)
+
+        self.stdout.write(f"full stack: {full * 1e6:.1f} us/request")
+        self.stdout.write(f"fast lane:  {fast * 1e6:.1f} us/request")
+        self.stdout.write(
+            self.style.SUCCESS(f"saved {(full - fast) * 1e6:.1f} us/request ({(1 - fast / full) * 100 if full else 0:.0f}%)")
+        )
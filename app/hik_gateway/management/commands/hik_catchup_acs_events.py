@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 
-from hik_gateway.services.catchup import catchup_all_devices
+from hik_gateway.models import Device
+from hik_gateway.services.catchup import catchup_all_devices, catchup_device_report, catchup_devices_parallel, catchup_serial_gaps
 
 
 class Command(BaseCommand):
@@ -8,7 +9,42 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("--max-results", type=int, default=50)
+        parser.add_argument("--workers", type=int, default=1, help="Catch up this many devices at once")
+        parser.add_argument("--per-gateway", type=int, default=None, help="Max devices in flight per gateway")
+        parser.add_argument("--device-budget", type=float, default=None, help="Seconds per device before yielding")
+        parser.add_argument("--gaps", action="store_true", help="Only fetch the serial ranges recorded as missing")
 
     def handle(self, *args, **options):
-        total = catchup_all_devices(max_results=options["max_results"])
-        self.stdout.write(self.style.SUCCESS(f"Processed {total} catchup events"))
+        serial = options["workers"] <= 1 and options["per_gateway"] is None and options["device_budget"] is None
+        if serial and not options["gaps"]:
+            total = catchup_all_devices(max_results=options["max_results"])
+            self.stdout.write(self.style.SUCCESS(f"Processed {total} catchup events"))
+            return
+
+        devices = Device.objects.select_related("gateway", "tenant").order_by("gateway_id", "id")
+        if options["gaps"]:
+            devices = devices.filter(serial_gaps__isnull=False).distinct()
+        reports = catchup_devices_parallel(
+            devices,
+            max_results=options["max_results"],
+            workers=options["workers"],
+            per_gateway=options["per_gateway"],
+            budget=options["device_budget"],
+            catchup=catchup_serial_gaps if options["gaps"] else catchup_device_report,
+        )
+
+        for report in sorted(reports, key=lambda report: (report.device.tenant.code, report.device.dev_index)):
+            state = "error: " + report.error if report.error else ("budget exhausted" if report.timed_out else "ok")
+            self.stdout.write(
+                f"{report.device.tenant.code}/{report.device.dev_index}: processed={report.processed} "
+                f"fetched={report.fetched} pages={report.pages} elapsed={report.elapsed:.2f}s {state}"
+            )
+
+        total = sum(report.processed for report in reports)
+        failed = sum(1 for report in reports if not report.ok)
+        timed_out = sum(1 for report in reports if report.timed_out)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {total} catchup events from {len(reports)} devices ({failed} failed, {timed_out} over budget)"
+            )
+        )
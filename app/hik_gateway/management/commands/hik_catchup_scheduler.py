@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from hik_gateway.services.catchup_scheduler import CatchupScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run catchup continuously, polling each device according to its event rate and realtime freshness"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tick", type=float, default=15, help="Seconds between scheduling rounds")
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--per-gateway", type=int, default=None)
+        parser.add_argument("--device-budget", type=float, default=60)
+        parser.add_argument("--once", action="store_true", help="Run a single scheduling round and exit")
+
+    def handle(self, *args, **options):
+        scheduler = CatchupScheduler(
+            workers=options["workers"],
+            per_gateway=options["per_gateway"],
+            budget=options["device_budget"],
+        )
+        while True:
+            started = time.monotonic()
+            # Rounds are long apart: drop a connection the database restarted or timed out meanwhile.
+            close_old_connections()
+            try:
+                reports = scheduler.tick()
+            except Exception:  # noqa: BLE001
+                if options["once"]:
+                    raise
+                logger.exception("Catchup scheduling round failed")
+                reports = []
+            if reports:
+                processed = sum(report.processed for report in reports)
+                failed = sum(1 for report in reports if not report.ok)
+                self.stdout.write(f"Caught up {len(reports)} devices: {processed} events, {failed} failed")
+            if options["once"]:
+                break
+            time.sleep(max(0.0, options["tick"] - (time.monotonic() - started)))
@@ -2,9 +2,9 @@ from __future__ import annotations
 
 from django.core.management.base import BaseCommand, CommandError
 
-from hik_gateway.client import HikGatewayClient
+from hik_gateway.client import get_gateway_client
 from hik_gateway.models import Gateway
-from hik_gateway.services.device_payload import extract_devices, normalize_device
+from hik_gateway.services.device_payload import iter_devices
 
 
 class Command(BaseCommand):
@@ -32,20 +32,16 @@ class Command(BaseCommand):
         if gateway is None:
             raise CommandError(f"Aucune gateway trouvée pour le tenant '{tenant_code}'")
 
-        client = HikGatewayClient(gateway.base_url, gateway.username, gateway.password)
-        payload = client.device_list()
-        devices = extract_devices(payload)
-
+        client = get_gateway_client(gateway)
         match = None
-        for item in devices:
-            normalized = normalize_device(item)
+        for normalized in iter_devices(client):
             item_serial = str(normalized["serial_number"] or "").strip()
             item_dev_index = str(normalized["dev_index"] or "").strip()
 
             serial_ok = not serial or item_serial == serial
             dev_index_ok = not dev_index or item_dev_index == dev_index
             if serial_ok and dev_index_ok:
-                match = item
+                match = normalized
                 break
 
         if match is None:
@@ -54,10 +50,9 @@ class Command(BaseCommand):
                 f"Device introuvable sur la gateway du tenant '{tenant_code}' ({lookup})"
             )
 
-        resolved = normalize_device(match)
-        resolved_serial = resolved["serial_number"]
-        resolved_dev_index = resolved["dev_index"]
-        status = resolved["status"] or "unknown"
+        resolved_serial = match["serial_number"]
+        resolved_dev_index = match["dev_index"]
+        status = match["status"] or "unknown"
 
         self.stdout.write(
             self.style.SUCCESS(
@@ -0,0 +1,60 @@
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hik_gateway.models import Device, Gateway
+from hik_gateway.services.alert_stream import AlertStreamConsumer
+
+
+class Command(BaseCommand):
+    help = "Consume ISAPI alertStream event streams and ingest events as they arrive"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--gateway", type=int, action="append", dest="gateway_ids", help="Gateway id (repeatable)")
+        parser.add_argument("--per-device", action="store_true", help="Open one stream per device instead of per gateway")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--flush-interval", type=float, default=None)
+
+    def handle(self, *args, **options):
+        gateways = Gateway.objects.select_related("tenant").order_by("id")
+        if options["gateway_ids"]:
+            gateways = gateways.filter(id__in=options["gateway_ids"])
+        gateways = list(gateways)
+        if not gateways:
+            raise CommandError("No gateway to stream from")
+
+        stop_event = threading.Event()
+        consumers = []
+        for gateway in gateways:
+            dev_indexes = [None]
+            if options["per_device"]:
+                dev_indexes = list(Device.objects.filter(gateway=gateway).values_list("dev_index", flat=True))
+            for dev_index in dev_indexes:
+                consumers.append(
+                    AlertStreamConsumer(
+                        gateway,
+                        dev_index=dev_index,
+                        batch_size=options["batch_size"],
+                        flush_interval=options["flush_interval"],
+                        stop_event=stop_event,
+                    )
+                )
+
+        threads = [
+            threading.Thread(target=consumer.run, name=f"hik-stream-{consumer.gateway.id}", daemon=True) for consumer in consumers
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Streaming from {len(consumers)} alertStream connections")
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            stop_event.set()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        total = sum(consumer.ingested for consumer in consumers)
+        self.stdout.write(self.style.SUCCESS(f"Ingested {total} alertStream events"))
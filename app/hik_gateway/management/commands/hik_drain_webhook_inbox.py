@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import InterfaceError, OperationalError, close_old_connections
+
+from hik_gateway.services.webhook_inbox import drain_inbox, requeue_failed_inbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Ingest webhook events queued in the inbox in micro-batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--once", action="store_true", help="Drain what is queued now and exit")
+        parser.add_argument("--idle-sleep", type=float, default=0.5)
+        parser.add_argument("--retry-failed", action="store_true", help="Requeue dead-lettered events before draining")
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            requeued = requeue_failed_inbox()
+            self.stdout.write(f"Requeued {requeued} dead-lettered inbox events")
+
+        total = 0
+        while True:
+            try:
+                drained = drain_inbox(batch_size=options["batch_size"])
+            except (OperationalError, InterfaceError):
+                # The batch rolled back and stays queued; try again once the database is back.
+                if options["once"]:
+                    raise
+                logger.exception("Inbox drain failed, retrying")
+                close_old_connections()
+                time.sleep(options["idle_sleep"])
+                continue
+            total += drained
+            if drained:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["idle_sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Drained {total} inbox events"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from hik_gateway.event_keys import set_aside_event_key, stored_event_key
+from hik_gateway.models import RawEvent
+
+BATCH_SIZE = 2000
+KEY_FIELDS = ["id", "device_id", "dev_index", "event_datetime", "serial_no", "employee_no", "employee_no_string", "card_no", "payload", "event_key"]
+
+
+class Command(BaseCommand):
+    help = "List, and with --delete remove, raw events set aside as duplicates when event_key was introduced"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete", action="store_true", help="Delete them, with their attendance logs")
+
+    def handle(self, *args, **options):
+        duplicates = []
+        last_id = 0
+        while True:
+            batch = list(RawEvent.objects.filter(id__gt=last_id).order_by("id").only(*KEY_FIELDS)[:BATCH_SIZE])
+            if not batch:
+                break
+            for raw_event in batch:
+                if bytes(raw_event.event_key) == set_aside_event_key(stored_event_key(raw_event), raw_event.id):
+                    duplicates.append(raw_event.id)
+            last_id = batch[-1].id
+
+        self.stdout.write(f"Found {len(duplicates)} duplicate raw events")
+        if not options["delete"]:
+            return
+
+        deleted = 0
+        for start in range(0, len(duplicates), BATCH_SIZE):
+            deleted += RawEvent.objects.filter(id__in=duplicates[start : start + BATCH_SIZE]).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} rows (raw events and their attendance logs)"))
@@ -1,7 +1,7 @@
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
-from hik_gateway.client import HikGatewayClient
+from hik_gateway.client import get_gateway_client
 from hik_gateway.models import Device
 
 
@@ -23,11 +23,7 @@ class Command(BaseCommand):
 
         registered = 0
         for device in Device.objects.select_related("gateway").all().iterator():
-            client = HikGatewayClient(
-                device.gateway.base_url,
-                device.gateway.username,
-                device.gateway.password,
-            )
+            client = get_gateway_client(device.gateway)
             payload = {
                 "HttpHostNotificationList": [
                     {
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import InterfaceError, OperationalError
+
+from hik_gateway.services.webhook_spool import get_webhook_spool, replay_spool
+
+
+class Command(BaseCommand):
+    help = "Replay webhook events spooled to disk while the database was unavailable"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        spool = get_webhook_spool()
+        if spool is None:
+            raise CommandError("HIK_WEBHOOK_SPOOL_DIR is not configured")
+
+        try:
+            total = replay_spool(spool, batch_size=options["batch_size"])
+        except (OperationalError, InterfaceError) as exc:
+            raise CommandError(f"Database unavailable, replay stopped and the rest stays spooled: {exc}") from exc
+        self.stdout.write(self.style.SUCCESS(f"Replayed {total} spooled events"))
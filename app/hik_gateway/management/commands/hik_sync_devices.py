@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 
+from hik_gateway.models import Gateway
 from hik_gateway.services.device_sync import sync_all_gateways
+from hik_gateway.services.webhook_ingest import attach_pending_events
 
 
 class Command(BaseCommand):
@@ -8,4 +10,5 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         total = sync_all_gateways()
-        self.stdout.write(self.style.SUCCESS(f"Synced {total} devices"))
+        attached = sum(attach_pending_events(gateway) for gateway in Gateway.objects.select_related("tenant").iterator())
+        self.stdout.write(self.style.SUCCESS(f"Synced {total} devices, attached {attached} pending events"))
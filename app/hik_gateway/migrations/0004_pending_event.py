@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hik_gateway', '0003_rename_idx_hik_rawevent_dev_door_reader_idx_hik_access_dev_door_reader'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dev_index', models.CharField(max_length=64)),
+                ('source', models.CharField(choices=[('realtime', 'Realtime'), ('catchup', 'Catchup')], max_length=32)),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('tenant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='hik_pending_events', to='tenants.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dev_index', 'received_at'], name='hik_gateway_dev_ind_85e676_idx')],
+            },
+        ),
+    ]
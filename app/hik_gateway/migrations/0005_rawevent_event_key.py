@@ -0,0 +1,67 @@
+import logging
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+from hik_gateway.event_keys import set_aside_event_key, stored_event_key
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+KEY_FIELDS = ["id", "device_id", "dev_index", "event_datetime", "serial_no", "employee_no", "employee_no_string", "card_no", "payload"]
+
+
+def _batches(queryset, fields):
+    # Keyset pagination: bounded memory, and safe while rows of the same table are being updated.
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by("id").only(*fields)[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def fill_event_keys(apps, schema_editor):
+    RawEvent = apps.get_model("hik_gateway", "RawEvent")
+    for batch in _batches(RawEvent.objects.all(), KEY_FIELDS):
+        for raw_event in batch:
+            raw_event.event_key = stored_event_key(raw_event)
+        RawEvent.objects.bulk_update(batch, ["event_key"])
+
+    # The same event stored twice under the old key (webhook vs AcsEvent timestamp formats). Nothing is
+    # deleted here: later copies keep a stand-in key so 0006 can make event_key unique, and
+    # `manage.py hik_purge_duplicate_events` removes them once reviewed.
+    set_aside = 0
+    duplicated = (
+        RawEvent.objects.values("event_key").annotate(copies=Count("id"), keep=Min("id")).filter(copies__gt=1).order_by()
+    )
+    for group in duplicated.iterator():
+        copies = list(RawEvent.objects.filter(event_key=group["event_key"]).exclude(id=group["keep"]).only("id"))
+        for raw_event in copies:
+            raw_event.event_key = set_aside_event_key(group["event_key"], raw_event.id)
+        RawEvent.objects.bulk_update(copies, ["event_key"])
+        set_aside += len(copies)
+    if set_aside:
+        logger.warning("Set aside %d duplicate raw events; purge them with hik_purge_duplicate_events", set_aside)
+
+
+def clear_event_keys(apps, schema_editor):
+    RawEvent = apps.get_model("hik_gateway", "RawEvent")
+    RawEvent.objects.update(event_key=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hik_gateway", "0004_pending_event"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rawevent",
+            name="event_key",
+            field=models.BinaryField(max_length=16, null=True),
+        ),
+        migrations.RunPython(fill_event_keys, clear_event_keys),
+    ]
@@ -0,0 +1,71 @@
+import hashlib
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+BATCH_SIZE = 2000
+
+
+def _legacy_dedupe_key(raw_event) -> str:
+    # Frozen copy of the key ingestion used before event_key.
+    payload = raw_event.payload if isinstance(raw_event.payload, dict) else {}
+    root = payload.get("EventNotificationAlert", payload)
+    root = root if isinstance(root, dict) else {}
+    access_event = root.get("AccessControllerEvent") or {}
+    access_event = access_event if isinstance(access_event, dict) else {}
+    timestamp_raw = root.get("dateTime") or access_event.get("time") or ""
+    person_hint = str(access_event.get("employeeNoString") or access_event.get("employeeNo") or access_event.get("cardNo") or "")
+    serial_no = str(access_event.get("serialNo") or root.get("serialNo") or "")
+    raw = "|".join([raw_event.dev_index or "", str(timestamp_raw), person_hint, serial_no])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def restore_dedupe_keys(apps, schema_editor):
+    RawEvent = apps.get_model("hik_gateway", "RawEvent")
+    last_id = 0
+    while True:
+        batch = list(
+            RawEvent.objects.filter(id__gt=last_id).order_by("id").only("id", "dev_index", "payload")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for raw_event in batch:
+            raw_event.dedupe_key = _legacy_dedupe_key(raw_event)
+        RawEvent.objects.bulk_update(batch, ["dedupe_key"])
+        last_id = batch[-1].id
+
+    # Rows the legacy key cannot tell apart get their id appended so the unique constraint comes back.
+    collisions = (
+        RawEvent.objects.values("dedupe_key").annotate(copies=Count("id"), keep=Min("id")).filter(copies__gt=1).order_by()
+    )
+    for group in collisions.iterator():
+        copies = list(RawEvent.objects.filter(dedupe_key=group["dedupe_key"]).exclude(id=group["keep"]).only("id"))
+        for raw_event in copies:
+            raw_event.dedupe_key = f"{group['dedupe_key']}:{raw_event.id}"
+        RawEvent.objects.bulk_update(copies, ["dedupe_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hik_gateway", "0005_rawevent_event_key"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="rawevent",
+            name="event_key",
+            field=models.BinaryField(max_length=16, unique=True),
+        ),
+        # Relaxed first so that, going backwards, the column comes back empty, is refilled, then made unique.
+        migrations.AlterField(
+            model_name="rawevent",
+            name="dedupe_key",
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_dedupe_keys),
+        migrations.RemoveField(
+            model_name="rawevent",
+            name="dedupe_key",
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hik_gateway', '0006_rawevent_event_key_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_code', models.CharField(blank=True, default='', max_length=64)),
+                ('client_ip', models.CharField(blank=True, default='', max_length=64)),
+                ('body', models.TextField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hik_gateway', '0007_webhook_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rawevent',
+            name='picture_ref',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hik_gateway', '0008_rawevent_picture_ref'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerialGap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_serial_no', models.IntegerField()),
+                ('last_serial_no', models.IntegerField()),
+                ('seen_before', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='serial_gaps', to='hik_gateway.device')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['device', 'first_serial_no'], name='hik_gateway_device__3583fa_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hik_gateway', '0009_serial_gap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicecursor',
+            name='session_end_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='devicecursor',
+            name='session_start_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
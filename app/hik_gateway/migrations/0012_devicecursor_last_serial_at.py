@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hik_gateway', '0011_inboxevent_dead_letter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicecursor',
+            name='last_serial_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hik_gateway', '0012_devicecursor_last_serial_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancelog',
+            index=models.Index(fields=['source', 'created_at', 'device'], name='hik_gateway_source_ac8cff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rawevent',
+            index=models.Index(fields=['received_at', 'device'], name='hik_gateway_receive_f27d3d_idx'),
+        ),
+    ]
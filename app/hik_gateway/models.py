@@ -64,13 +64,16 @@ class RawEvent(models.Model):
     card_reader_no = models.IntegerField(null=True, blank=True)
     door_no = models.IntegerField(null=True, blank=True)
     attendance_status = models.CharField(max_length=64, blank=True, default="")
-    dedupe_key = models.CharField(max_length=255, unique=True)
+    event_key = models.BinaryField(max_length=16, unique=True)
+    picture_ref = models.CharField(max_length=128, blank=True, default="")
     payload = models.JSONField()
 
     class Meta:
         indexes = [
             models.Index(fields=["tenant", "dev_index", "event_datetime"]),
             models.Index(fields=["event_type"]),
+            # Catchup scheduler: events received per device over the last hour.
+            models.Index(fields=["received_at", "device"]),
         ]
 
 
@@ -98,22 +101,58 @@ class AttendanceLog(models.Model):
             models.Index(fields=["tenant", "timestamp"]),
             models.Index(fields=["person_id"]),
             models.Index(fields=["attendance_type"]),
+            # Catchup scheduler: last realtime event per device over a recent window.
+            models.Index(fields=["source", "created_at", "device"]),
         ]
 
 
+class PendingEvent(models.Model):
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="hik_pending_events", null=True, blank=True)
+    dev_index = models.CharField(max_length=64)
+    source = models.CharField(max_length=32, choices=AttendanceLog.SOURCE_CHOICES)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["dev_index", "received_at"])]
+
+
+class InboxEvent(models.Model):
+    tenant_code = models.CharField(max_length=64, blank=True, default="")
+    client_ip = models.CharField(max_length=64, blank=True, default="")
+    body = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+
 class DeviceCursor(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="hik_device_cursors")
     device = models.OneToOneField(Device, on_delete=models.CASCADE, related_name="cursor")
     last_event_time = models.DateTimeField(null=True, blank=True)
     last_serial_no = models.IntegerField(null=True, blank=True)
+    last_serial_at = models.DateTimeField(null=True, blank=True)
     last_search_id = models.CharField(max_length=128, blank=True, default="")
     last_search_result_position = models.PositiveIntegerField(default=0)
+    session_start_time = models.DateTimeField(null=True, blank=True)
+    session_end_time = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         indexes = [models.Index(fields=["last_event_time"])]
 
 
+class SerialGap(models.Model):
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="serial_gaps")
+    first_serial_no = models.IntegerField()
+    last_serial_no = models.IntegerField()
+    seen_before = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["device", "first_serial_no"])]
+
+
 class DeviceReaderConfig(models.Model):
     DIRECTION_IN = "IN"
     DIRECTION_OUT = "OUT"
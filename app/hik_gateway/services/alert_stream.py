@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, connection
+
+from hik_gateway.client import get_gateway_client
+from hik_gateway.models import AttendanceLog, Device, DeviceCursor, Gateway
+from hik_gateway.services.catchup import catchup_devices_parallel, open_catchup_sessions
+from hik_gateway.services.event_classifier import EVENT_DISCARD, EVENT_HEARTBEAT, classify_event, touch_device_heartbeat
+from hik_gateway.services.multipart_stream import iter_multipart_parts, multipart_boundary
+from hik_gateway.services.webhook_ingest import OUTCOME_CREATED, OUTCOME_DUPLICATE, ingest_events
+from hik_gateway.services.webhook_spool import SpoolFull, get_webhook_spool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_BATCH_SIZE = 50
+DEFAULT_STREAM_FLUSH_INTERVAL = 1.0
+DEFAULT_STREAM_READ_TIMEOUT = 90
+DEFAULT_STREAM_MAX_BACKOFF = 60
+DEFAULT_STREAM_MAX_PENDING = 5000
+DEFAULT_STREAM_RESUME_WORKERS = 4
+STREAM_CHUNK_SIZE = 8192
+
+
+class AlertStreamConsumer:
+    def __init__(
+        self,
+        gateway: Gateway,
+        dev_index: str | None = None,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+        stop_event: threading.Event | None = None,
+    ):
+        self.gateway = gateway
+        self.dev_index = dev_index
+        self.batch_size = batch_size or getattr(settings, "HIK_ALERT_STREAM_BATCH_SIZE", DEFAULT_STREAM_BATCH_SIZE)
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else getattr(settings, "HIK_ALERT_STREAM_FLUSH_INTERVAL", DEFAULT_STREAM_FLUSH_INTERVAL)
+        )
+        self.stop_event = stop_event or threading.Event()
+        self.max_pending = getattr(settings, "HIK_ALERT_STREAM_MAX_PENDING", DEFAULT_STREAM_MAX_PENDING)
+        self.ingested = 0
+        self.spooled = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.failed = 0
+        self._batch: list[dict] = []
+        self._batch_started = 0.0
+        self._resume_thread: threading.Thread | None = None
+
+    def run(self) -> int:
+        delay = 1.0
+        ceiling = getattr(settings, "HIK_ALERT_STREAM_MAX_BACKOFF", DEFAULT_STREAM_MAX_BACKOFF)
+        while not self.stop_event.is_set():
+            # After a database blip the connection is left broken; drop it so the next query reconnects.
+            close_old_connections()
+            try:
+                self.start_resume()
+                self.consume_once()
+                delay = 1.0
+            except Exception:  # noqa: BLE001
+                logger.exception("alertStream failed", extra={"gateway": self.gateway.base_url, "dev_index": self.dev_index})
+            try:
+                self.flush()
+            except Exception:  # noqa: BLE001
+                logger.exception("alertStream flush failed, keeping batch", extra={"gateway": self.gateway.base_url})
+            if self.stop_event.wait(delay):
+                break
+            delay = min(delay * 2, ceiling)
+        if self._resume_thread is not None:
+            self._resume_thread.join()
+        connection.close()
+        return self.ingested
+
+    def _devices(self):
+        devices = Device.objects.filter(gateway=self.gateway).select_related("gateway", "tenant")
+        if self.dev_index:
+            devices = devices.filter(dev_index=self.dev_index)
+        return devices
+
+    def start_resume(self) -> None:
+        # The stream only carries what happens while it is open. Catch up on the gap since each cursor
+        # alongside it, so a large gateway does not stay dark while its devices are caught up.
+        if self._resume_thread is not None and self._resume_thread.is_alive():
+            return
+        devices = list(self._devices())
+        # Fix every window before the stream connects: its flushes move the cursors forward, and a
+        # device still queued behind the workers would otherwise start after the disconnect gap.
+        open_catchup_sessions(devices)
+        self._resume_thread = threading.Thread(
+            target=self.resume, args=(devices,), name=f"hik-stream-resume-{self.gateway.id}", daemon=True
+        )
+        self._resume_thread.start()
+
+    def resume(self, devices: list[Device] | None = None) -> None:
+        try:
+            reports = catchup_devices_parallel(
+                devices if devices is not None else list(self._devices()),
+                workers=getattr(settings, "HIK_ALERT_STREAM_RESUME_WORKERS", DEFAULT_STREAM_RESUME_WORKERS),
+            )
+            for report in reports:
+                if report.error:
+                    logger.warning(
+                        "alertStream resume catchup failed",
+                        extra={"dev_index": report.device.dev_index, "error": report.error},
+                    )
+        except Exception:  # noqa: BLE001
+            logger.exception("alertStream resume catchup failed", extra={"gateway": self.gateway.base_url})
+        finally:
+            connection.close()
+
+    def consume_once(self) -> None:
+        client = get_gateway_client(self.gateway)
+        response = client.alert_stream(
+            self.dev_index,
+            read_timeout=getattr(settings, "HIK_ALERT_STREAM_READ_TIMEOUT", DEFAULT_STREAM_READ_TIMEOUT),
+        )
+        try:
+            boundary = multipart_boundary(response.headers.get("Content-Type", ""))
+            if not boundary:
+                raise ValueError("alertStream response is not multipart")
+            for headers, body in iter_multipart_parts(response.iter_content(STREAM_CHUNK_SIZE), boundary):
+                if self.stop_event.is_set():
+                    break
+                self.handle_part(headers, body)
+        finally:
+            response.close()
+
+    def handle_part(self, headers: dict[str, str], body: bytes) -> None:
+        content_type = headers.get("content-type", "")
+        if "json" in content_type:
+            kind, dev_index = classify_event(body)
+            if kind == EVENT_HEARTBEAT:
+                touch_device_heartbeat(dev_index or self.dev_index or "", tenant_code=self.gateway.tenant.code)
+            elif kind != EVENT_DISCARD:
+                self._add(body)
+        elif not content_type.startswith("image/"):
+            # Pictures ride along with their JSON event; anything else (XML alerts from terminals not
+            # switched to JSON) is not ingested and should be visible.
+            self.skipped += 1
+            logger.warning(
+                "Skipping non-JSON alertStream part",
+                extra={"gateway": self.gateway.base_url, "content_type": content_type, "size": len(body)},
+            )
+
+        if self._batch and time.monotonic() - self._batch_started >= self.flush_interval:
+            self.flush()
+
+    def _add(self, body: bytes) -> None:
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError:
+            logger.warning("Skipping unreadable alertStream part", extra={"gateway": self.gateway.base_url})
+            return
+        if not isinstance(payload, dict):
+            return
+        root = payload.get("EventNotificationAlert", payload)
+        if self.dev_index and isinstance(root, dict):
+            root.setdefault("devIndex", self.dev_index)
+
+        if len(self._batch) >= self.max_pending:
+            self._overflow(payload)
+            return
+        if not self._batch:
+            self._batch_started = time.monotonic()
+        self._batch.append(payload)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def _overflow(self, payload: dict) -> None:
+        # Flushes keep failing (database down): park further events in the webhook spool, which
+        # hik_replay_webhook_spool ingests later, rather than growing the batch without bound.
+        spool = get_webhook_spool()
+        if spool is not None:
+            try:
+                spool.append(json.dumps(payload, ensure_ascii=False), tenant_code=self.gateway.tenant.code)
+                self.spooled += 1
+                return
+            except (SpoolFull, OSError):
+                logger.exception("alertStream overflow could not be spooled", extra={"gateway": self.gateway.base_url})
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 1000 == 0:
+            logger.error("alertStream batch full, dropping events", extra={"gateway": self.gateway.base_url, "dropped": self.dropped})
+
+    def flush(self) -> None:
+        if not self._batch:
+            return
+        payloads = self._batch
+        try:
+            outcomes = ingest_events(payloads, source=AttendanceLog.SOURCE_REALTIME, tenant=self.gateway.tenant)
+        except (OperationalError, InterfaceError):
+            # The database, not the events: keep the batch for the next flush.
+            raise
+        except Exception:  # noqa: BLE001
+            logger.warning("alertStream batch failed, ingesting events one by one", exc_info=True)
+            payloads, outcomes = self._ingest_one_by_one(payloads)
+        self._batch = []
+
+        latest: dict[str, datetime] = {}
+        for payload, outcome in zip(payloads, outcomes):
+            if outcome.status not in (OUTCOME_CREATED, OUTCOME_DUPLICATE) or not outcome.has_attendance:
+                continue
+            if outcome.status == OUTCOME_CREATED:
+                self.ingested += 1
+            dev_index = payload.get("EventNotificationAlert", payload).get("devIndex", "")
+            if dev_index not in latest or outcome.event_datetime > latest[dev_index]:
+                latest[dev_index] = outcome.event_datetime
+        self._advance_cursors(latest)
+
+    def _ingest_one_by_one(self, payloads: list[dict]) -> tuple[list[dict], list]:
+        kept, outcomes = [], []
+        for payload in payloads:
+            try:
+                outcomes.extend(ingest_events([payload], source=AttendanceLog.SOURCE_REALTIME, tenant=self.gateway.tenant))
+            except (OperationalError, InterfaceError):
+                raise
+            except Exception:  # noqa: BLE001
+                # A malformed event is dropped so it cannot hold back the ones behind it.
+                self.failed += 1
+                logger.exception("Dropping alertStream event that failed to ingest", extra={"gateway": self.gateway.base_url})
+                continue
+            kept.append(payload)
+        return kept, outcomes
+
+    def _advance_cursors(self, latest: dict[str, datetime]) -> None:
+        for device in self._devices().filter(dev_index__in=list(latest)):
+            cursor, _ = DeviceCursor.objects.get_or_create(device=device, defaults={"tenant": device.tenant})
+            if cursor.last_event_time is None or latest[device.dev_index] > cursor.last_event_time:
+                cursor.last_event_time = latest[device.dev_index]
+                cursor.save(update_fields=["last_event_time", "updated_at"])
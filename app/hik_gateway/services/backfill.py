@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import connection
+
+from hik_gateway.client import HikGatewayClient, get_gateway_client
+from hik_gateway.models import Device
+from hik_gateway.services.catchup import DEFAULT_CATCHUP_PER_GATEWAY, _extract_acs_info
+from hik_gateway.services.webhook_ingest import OUTCOME_CREATED, ingest_acs_events
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKFILL_WINDOW_EVENTS = 2000
+DEFAULT_BACKFILL_MIN_WINDOW = 60
+DEFAULT_BACKFILL_INSERT_BATCH = 1000
+
+
+@dataclass
+class BackfillWindow:
+    start: datetime
+    end: datetime
+    expected: int
+
+
+@dataclass
+class BackfillProgress:
+    windows: int = 0
+    expected: int = 0
+    windows_done: int = 0
+    fetched: int = 0
+    created: int = 0
+    errors: list[str] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.fetched / self.elapsed if self.elapsed else 0.0
+
+
+def _total_num(payload: dict) -> int:
+    info = payload.get("AcsEventTotalNum", payload)
+    return int(info.get("totalNum") or 0)
+
+
+def count_events(client: HikGatewayClient, device: Device, start: datetime, end: datetime) -> int:
+    response = client.acs_event_total_num(
+        device.dev_index,
+        {"AcsEventTotalNumCond": {"major": 0, "minor": 0, "startTime": start.isoformat(), "endTime": end.isoformat()}},
+    )
+    return _total_num(response)
+
+
+def plan_windows(client: HikGatewayClient, device: Device, start: datetime, end: datetime) -> list[BackfillWindow]:
+    """Split [start, end) into windows of at most HIK_BACKFILL_WINDOW_EVENTS events, skipping empty ones."""
+    target = max(1, getattr(settings, "HIK_BACKFILL_WINDOW_EVENTS", DEFAULT_BACKFILL_WINDOW_EVENTS))
+    min_window = timedelta(seconds=getattr(settings, "HIK_BACKFILL_MIN_WINDOW", DEFAULT_BACKFILL_MIN_WINDOW))
+
+    windows: list[BackfillWindow] = []
+    pending = [(start, end, count_events(client, device, start, end))]
+    while pending:
+        window_start, window_end, count = pending.pop()
+        if not count:
+            continue
+        if count <= target or window_end - window_start <= min_window:
+            windows.append(BackfillWindow(window_start, window_end, count))
+            continue
+        # Events are rarely spread evenly, so each part is counted again and split further if needed.
+        parts = min(math.ceil(count / target), max(2, int((window_end - window_start) / min_window)))
+        step = (window_end - window_start) / parts
+        for index in range(parts):
+            part_start = window_start + step * index
+            part_end = window_end if index == parts - 1 else part_start + step
+            pending.append((part_start, part_end, count_events(client, device, part_start, part_end)))
+    return sorted(windows, key=lambda window: window.start)
+
+
+def _ingest_batch(device: Device, events: list[dict], progress: BackfillProgress) -> None:
+    outcomes = ingest_acs_events(device, events)
+    created = sum(1 for outcome in outcomes if outcome.status == OUTCOME_CREATED)
+    with progress._lock:
+        progress.created += created
+
+
+def _fetch_window(device: Device, window: BackfillWindow, max_results: int, progress: BackfillProgress) -> None:
+    client = get_gateway_client(device.gateway)
+    insert_batch = getattr(settings, "HIK_BACKFILL_INSERT_BATCH", DEFAULT_BACKFILL_INSERT_BATCH)
+    search_id = f"{device.tenant_id}-{device.dev_index}-backfill-{uuid.uuid4().hex[:12]}"
+    position = 0
+    buffered: list[dict] = []
+
+    while True:
+        response = client.acs_event_search(
+            device.dev_index,
+            {
+                "AcsEventCond": {
+                    "searchID": search_id,
+                    "searchResultPosition": position,
+                    "maxResults": max_results,
+                    "startTime": window.start.isoformat(),
+                    "endTime": window.end.isoformat(),
+                }
+            },
+        )
+        events, _ = _extract_acs_info(response)
+        position += len(events)
+        buffered.extend(events)
+        with progress._lock:
+            progress.fetched += len(events)
+        if len(buffered) >= insert_batch:
+            _ingest_batch(device, buffered, progress)
+            buffered = []
+        if len(events) < max_results:
+            break
+
+    if buffered:
+        _ingest_batch(device, buffered, progress)
+
+
+def _fetch_in_worker(device: Device, window: BackfillWindow, max_results: int, progress: BackfillProgress) -> None:
+    try:
+        _fetch_window(device, window, max_results, progress)
+    finally:
+        connection.close()
+
+
+def backfill_device(
+    device: Device,
+    start: datetime,
+    end: datetime,
+    max_results: int = 50,
+    workers: int | None = None,
+    on_progress: Callable[[BackfillProgress], None] | None = None,
+) -> BackfillProgress:
+    """Fetch every stored event of the device between start and end, several windows at a time."""
+    client = get_gateway_client(device.gateway)
+    progress = BackfillProgress()
+    windows = plan_windows(client, device, start, end)
+    progress.windows = len(windows)
+    progress.expected = sum(window.expected for window in windows)
+    if on_progress:
+        on_progress(progress)
+
+    per_gateway = getattr(settings, "HIK_CATCHUP_PER_GATEWAY", DEFAULT_CATCHUP_PER_GATEWAY)
+    workers = max(1, min(workers or per_gateway, per_gateway))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hik-backfill") as executor:
+        futures = {executor.submit(_fetch_in_worker, device, window, max_results, progress): window for window in windows}
+        for future in as_completed(futures):
+            window = futures[future]
+            try:
+                future.result()
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Backfill window failed", extra={"dev_index": device.dev_index, "start": window.start.isoformat()})
+                progress.errors.append(f"{window.start.isoformat()} - {window.end.isoformat()}: {exc}")
+            progress.windows_done += 1
+            if on_progress:
+                on_progress(progress)
+    return progress
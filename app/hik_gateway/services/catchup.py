@@ -1,12 +1,27 @@
 from __future__ import annotations
 
+import logging
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from datetime import timedelta
+from typing import Callable, Iterable
 
+from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
 
-from hik_gateway.client import HikGatewayClient
-from hik_gateway.models import AttendanceLog, Device, DeviceCursor
-from hik_gateway.services.webhook_ingest import ingest_acs_event
+from hik_gateway.client import get_gateway_client
+from hik_gateway.models import Device, DeviceCursor, SerialGap
+from hik_gateway.services.webhook_ingest import ingest_acs_events
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATCHUP_PER_GATEWAY = 4
+# How far before the event that exposed a serial gap the targeted search still looks.
+DEFAULT_SERIAL_GAP_LOOKBACK = 86400
 
 
 def _extract_acs_info(payload: dict) -> tuple[list[dict], int]:
@@ -20,22 +35,113 @@ def _extract_acs_info(payload: dict) -> tuple[list[dict], int]:
     return events if isinstance(events, list) else [], int(total)
 
 
-def catchup_device(device: Device, max_results: int = 50) -> int:
-    cursor, _ = DeviceCursor.objects.get_or_create(device=device, defaults={"tenant": device.tenant})
+@dataclass
+class CatchupReport:
+    device: Device
+    processed: int = 0
+    fetched: int = 0
+    pages: int = 0
+    elapsed: float = 0.0
+    timed_out: bool = False
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+
+SESSION_FIELDS = ["session_start_time", "session_end_time", "last_search_id", "last_search_result_position"]
 
+
+def _open_session(device: Device, cursor: DeviceCursor) -> None:
+    # A window gets its own search ID so the device never pages a stale result set.
     now = timezone.now()
-    start_time = (cursor.last_event_time or (now - timedelta(minutes=30))) - timedelta(minutes=2)
-    end_time = now
-    search_id = cursor.last_search_id or f"{device.tenant_id}-{device.dev_index}"
-    position = cursor.last_search_result_position
+    cursor.session_start_time = (cursor.last_event_time or (now - timedelta(minutes=30))) - timedelta(minutes=2)
+    cursor.session_end_time = now
+    cursor.last_search_id = f"{device.tenant_id}-{device.dev_index}-{uuid.uuid4().hex[:12]}"
+    cursor.last_search_result_position = 0
+    cursor.save(update_fields=[*SESSION_FIELDS, "updated_at"])
+
+
+def open_catchup_sessions(devices: Iterable[Device]) -> None:
+    """Pin each device's next catchup window to where its cursor stands now.
 
-    client = HikGatewayClient(device.gateway.base_url, device.gateway.username, device.gateway.password)
+    A session already open keeps its window. Once pinned, moving the cursor (a live stream
+    advancing it) no longer shrinks the window a queued catchup will fetch.
+    """
+    for device in devices:
+        cursor, _ = DeviceCursor.objects.get_or_create(device=device, defaults={"tenant": device.tenant})
+        if cursor.session_end_time is None:
+            _open_session(device, cursor)
 
-    processed = 0
-    max_processed_time = cursor.last_event_time
-    max_serial_no = cursor.last_serial_no
+
+def _close_session(cursor: DeviceCursor) -> None:
+    cursor.session_start_time = None
+    cursor.session_end_time = None
+    cursor.last_search_id = ""
+    cursor.last_search_result_position = 0
+
+
+def _catchup_pages(device: Device, report: CatchupReport, max_results: int, deadline: float | None) -> None:
+    cursor, _ = DeviceCursor.objects.get_or_create(device=device, defaults={"tenant": device.tenant})
+    if cursor.session_end_time is None:
+        _open_session(device, cursor)
+    client = get_gateway_client(device.gateway)
 
     while True:
+        if deadline is not None and report.pages and time.monotonic() >= deadline:
+            # Out of budget: the session stays open and the next pass resumes at the saved page.
+            report.timed_out = True
+            return
+
+        condition = {
+            "AcsEventCond": {
+                "searchID": cursor.last_search_id,
+                "searchResultPosition": cursor.last_search_result_position,
+                "maxResults": max_results,
+                "startTime": cursor.session_start_time.isoformat(),
+                "endTime": cursor.session_end_time.isoformat(),
+            }
+        }
+        response = client.acs_event_search(device.dev_index, condition)
+        report.pages += 1
+        events, _ = _extract_acs_info(response)
+        report.fetched += len(events)
+
+        # The page's rows and the position after it commit together: a crash either keeps both or
+        # neither, so a resumed session never skips or re-fetches a page.
+        with transaction.atomic():
+            outcomes = ingest_acs_events(device, events) if events else []
+            for outcome in outcomes:
+                if outcome.raw_event_id is None or not outcome.has_attendance:
+                    continue
+                report.processed += 1
+                if cursor.last_event_time is None or outcome.event_datetime > cursor.last_event_time:
+                    cursor.last_event_time = outcome.event_datetime
+
+            cursor.last_search_result_position += len(events)
+            finished = len(events) < max_results
+            if finished:
+                _close_session(cursor)
+            # last_serial_no belongs to the serial gap tracker, which ingestion already advanced.
+            cursor.save(update_fields=["last_event_time", *SESSION_FIELDS, "updated_at"])
+        if finished:
+            return
+
+
+def _catchup_gap(device: Device, gap: SerialGap, report: CatchupReport, max_results: int, deadline: float | None) -> bool:
+    lookback = getattr(settings, "HIK_SERIAL_GAP_LOOKBACK", DEFAULT_SERIAL_GAP_LOOKBACK)
+    end_time = (gap.seen_before or timezone.now()) + timedelta(minutes=2)
+    start_time = end_time - timedelta(seconds=lookback)
+    search_id = f"{device.tenant_id}-{device.dev_index}-gap-{gap.first_serial_no}"
+    position = 0
+    client = get_gateway_client(device.gateway)
+
+    while True:
+        if deadline is not None and report.pages and time.monotonic() >= deadline:
+            report.timed_out = True
+            return False
+
         condition = {
             "AcsEventCond": {
                 "searchID": search_id,
@@ -43,33 +149,59 @@ def catchup_device(device: Device, max_results: int = 50) -> int:
                 "maxResults": max_results,
                 "startTime": start_time.isoformat(),
                 "endTime": end_time.isoformat(),
+                "beginSerialNo": gap.first_serial_no,
+                "endSerialNo": gap.last_serial_no,
             }
         }
         response = client.acs_event_search(device.dev_index, condition)
-        events, returned = _extract_acs_info(response)
+        report.pages += 1
+        events, _ = _extract_acs_info(response)
         if not events:
-            break
+            return True
+        report.fetched += len(events)
+        report.processed += sum(1 for outcome in ingest_acs_events(device, events) if outcome.has_attendance)
+
+        position += len(events)
+        if len(events) < max_results:
+            return True
+
 
-        for event in events:
-            raw_event, attendance = ingest_acs_event(device, event)
-            if raw_event:
-                if raw_event.serial_no is not None and (max_serial_no is None or raw_event.serial_no > max_serial_no):
-                    max_serial_no = raw_event.serial_no
-            if raw_event and attendance:
-                processed += 1
-                if max_processed_time is None or attendance.timestamp > max_processed_time:
-                    max_processed_time = attendance.timestamp
-
-        position += returned
-        if returned < max_results:
+def _catchup_gap_pages(device: Device, report: CatchupReport, max_results: int, deadline: float | None) -> None:
+    for gap in list(SerialGap.objects.filter(device=device).order_by("first_serial_no")):
+        if not _catchup_gap(device, gap, report, max_results, deadline):
             break
+        # Whatever the terminal still had is ingested now and closed its part of the gap; serials it
+        # no longer holds cannot be recovered, so stop asking for them.
+        SerialGap.objects.filter(
+            device=device, first_serial_no__gte=gap.first_serial_no, last_serial_no__lte=gap.last_serial_no
+        ).delete()
+
+
+def _run_catchup(pages, device: Device, max_results: int, budget: float | None) -> CatchupReport:
+    report = CatchupReport(device)
+    started = time.monotonic()
+    try:
+        pages(device, report, max_results, started + budget if budget else None)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Catchup failed", extra={"tenant": device.tenant.code, "dev_index": device.dev_index})
+        report.error = str(exc)
+    report.elapsed = time.monotonic() - started
+    return report
+
+
+def catchup_device_report(device: Device, max_results: int = 50, budget: float | None = None) -> CatchupReport:
+    return _run_catchup(_catchup_pages, device, max_results, budget)
+
+
+def catchup_serial_gaps(device: Device, max_results: int = 50, budget: float | None = None) -> CatchupReport:
+    """Fetch only the serial ranges the gap tracker recorded as missing for this device."""
+    return _run_catchup(_catchup_gap_pages, device, max_results, budget)
 
-    cursor.last_event_time = max_processed_time or cursor.last_event_time
-    cursor.last_search_id = search_id
-    cursor.last_search_result_position = position
-    cursor.last_serial_no = max_serial_no
-    cursor.save(update_fields=["last_event_time", "last_search_id", "last_search_result_position", "last_serial_no", "updated_at"])
-    return processed
+
+def catchup_device(device: Device, max_results: int = 50) -> int:
+    report = CatchupReport(device)
+    _catchup_pages(device, report, max_results, None)
+    return report.processed
 
 
 def catchup_all_devices(max_results: int = 50) -> int:
@@ -77,3 +209,63 @@ def catchup_all_devices(max_results: int = 50) -> int:
     for device in Device.objects.select_related("gateway", "tenant").all().iterator():
         total += catchup_device(device, max_results=max_results)
     return total
+
+
+CatchupFunction = Callable[..., CatchupReport]
+
+
+def _catchup_in_worker(catchup: CatchupFunction, device: Device, max_results: int, budget: float | None) -> CatchupReport:
+    try:
+        return catchup(device, max_results=max_results, budget=budget)
+    finally:
+        connection.close()
+
+
+def catchup_devices_parallel(
+    devices: Iterable[Device],
+    max_results: int = 50,
+    workers: int = 8,
+    per_gateway: int | None = None,
+    budget: float | None = None,
+    catchup: CatchupFunction = catchup_device_report,
+) -> list[CatchupReport]:
+    if per_gateway is None:
+        per_gateway = getattr(settings, "HIK_CATCHUP_PER_GATEWAY", DEFAULT_CATCHUP_PER_GATEWAY)
+    per_gateway = max(1, per_gateway)
+    workers = max(1, workers)
+
+    queues: OrderedDict[int, deque[Device]] = OrderedDict()
+    for device in devices:
+        queues.setdefault(device.gateway_id, deque()).append(device)
+    in_flight: dict[int, int] = defaultdict(int)
+    reports: list[CatchupReport] = []
+
+    def next_device() -> Device | None:
+        # Round-robin over gateways that still have room, so one large or slow gateway cannot hog the pool.
+        for gateway_id in list(queues):
+            if in_flight[gateway_id] >= per_gateway:
+                continue
+            device = queues[gateway_id].popleft()
+            if not queues[gateway_id]:
+                del queues[gateway_id]
+            else:
+                queues.move_to_end(gateway_id)
+            return device
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hik-catchup") as executor:
+        pending: dict[Future, Device] = {}
+        while queues or pending:
+            while len(pending) < workers:
+                device = next_device()
+                if device is None:
+                    break
+                in_flight[device.gateway_id] += 1
+                pending[executor.submit(_catchup_in_worker, catchup, device, max_results, budget)] = device
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                device = pending.pop(future)
+                in_flight[device.gateway_id] -= 1
+                reports.append(future.result())
+    return reports
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from hik_gateway.models import AttendanceLog, Device, RawEvent, SerialGap
+from hik_gateway.services.catchup import (
+    CatchupReport,
+    catchup_device_report,
+    catchup_devices_parallel,
+    catchup_serial_gaps,
+)
+from hik_gateway.services.webhook_ingest import CONNECTED_DEVICE_STATUSES
+
+
+DEFAULT_CATCHUP_MIN_INTERVAL = 60
+DEFAULT_CATCHUP_MAX_INTERVAL = 1800
+DEFAULT_CATCHUP_REALTIME_FRESH = 600
+DEFAULT_CATCHUP_OFFLINE_MAX_BACKOFF = 3600
+DEFAULT_CATCHUP_TICK_DEVICES = 200
+# Events per hour at which a device is polled twice as often as an idle one.
+EVENT_RATE_SCALE = 10
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def poll_interval(events_last_hour: int, last_realtime: datetime | None, now: datetime) -> float | None:
+    """Seconds until the next catchup of an online device, or None while its pushes are current."""
+    fresh_window = _setting("HIK_CATCHUP_REALTIME_FRESH", DEFAULT_CATCHUP_REALTIME_FRESH)
+    if last_realtime is not None and (now - last_realtime).total_seconds() < fresh_window:
+        return None
+
+    min_interval = _setting("HIK_CATCHUP_MIN_INTERVAL", DEFAULT_CATCHUP_MIN_INTERVAL)
+    max_interval = _setting("HIK_CATCHUP_MAX_INTERVAL", DEFAULT_CATCHUP_MAX_INTERVAL)
+    interval = max_interval / (1 + events_last_hour / EVENT_RATE_SCALE)
+    return max(min_interval, min(max_interval, interval))
+
+
+def _is_online(device: Device) -> bool:
+    return device.status.lower() in CONNECTED_DEVICE_STATUSES
+
+
+@dataclass
+class _DeviceState:
+    next_due: float = 0.0
+    failures: int = 0
+
+
+class CatchupScheduler:
+    def __init__(self, workers: int = 8, per_gateway: int | None = None, budget: float | None = None):
+        self.workers = workers
+        self.per_gateway = per_gateway
+        self.budget = budget
+        self._states: dict[int, _DeviceState] = {}
+        self._intervals: dict[int, float] = {}
+        self._gap_devices: set[int] = set()
+
+    def _state(self, device_id: int) -> _DeviceState:
+        return self._states.setdefault(device_id, _DeviceState())
+
+    def _backoff(self, state: _DeviceState, interval: float) -> float:
+        ceiling = _setting("HIK_CATCHUP_OFFLINE_MAX_BACKOFF", DEFAULT_CATCHUP_OFFLINE_MAX_BACKOFF)
+        state.failures += 1
+        return min(interval * 2 ** state.failures, ceiling)
+
+    def due_devices(self) -> list[Device]:
+        now = timezone.now()
+        clock = time.monotonic()
+        min_interval = _setting("HIK_CATCHUP_MIN_INTERVAL", DEFAULT_CATCHUP_MIN_INTERVAL)
+        max_interval = _setting("HIK_CATCHUP_MAX_INTERVAL", DEFAULT_CATCHUP_MAX_INTERVAL)
+
+        event_counts = dict(
+            RawEvent.objects.filter(received_at__gte=now - timedelta(hours=1))
+            .values_list("device_id")
+            .annotate(count=Count("id"))
+        )
+        last_realtime = dict(
+            AttendanceLog.objects.filter(source=AttendanceLog.SOURCE_REALTIME, created_at__gte=now - timedelta(days=1))
+            .values_list("device_id")
+            .annotate(last=Max("created_at"))
+        )
+
+        gap_device_ids = set(SerialGap.objects.values_list("device_id", flat=True).distinct())
+
+        self._intervals = {}
+        self._gap_devices = set()
+        by_tenant: OrderedDict[int, deque[Device]] = OrderedDict()
+        for device in Device.objects.select_related("gateway", "tenant").order_by("tenant_id", "id"):
+            state = self._state(device.id)
+            # Known missing serials are fetched on the next round, unless the device is backing off.
+            has_gaps = device.id in gap_device_ids and not state.failures
+            if state.next_due > clock and not has_gaps:
+                continue
+            if not _is_online(device):
+                # Known offline from the last device sync: probing it would only time out.
+                state.next_due = clock + self._backoff(state, min_interval)
+                continue
+            if has_gaps:
+                self._gap_devices.add(device.id)
+                by_tenant.setdefault(device.tenant_id, deque()).append(device)
+                continue
+            interval = poll_interval(event_counts.get(device.id, 0), last_realtime.get(device.id), now)
+            if interval is None:
+                state.next_due = clock + max_interval
+                continue
+            self._intervals[device.id] = interval
+            by_tenant.setdefault(device.tenant_id, deque()).append(device)
+
+        # Take devices one tenant at a time so a tenant with hundreds of due devices cannot starve the others.
+        limit = _setting("HIK_CATCHUP_TICK_DEVICES", DEFAULT_CATCHUP_TICK_DEVICES)
+        due: list[Device] = []
+        while by_tenant and len(due) < limit:
+            for tenant_id in list(by_tenant):
+                due.append(by_tenant[tenant_id].popleft())
+                if not by_tenant[tenant_id]:
+                    del by_tenant[tenant_id]
+                if len(due) >= limit:
+                    break
+        return due
+
+    def record(self, report: CatchupReport) -> None:
+        state = self._state(report.device.id)
+        interval = self._intervals.get(report.device.id) or _setting("HIK_CATCHUP_MIN_INTERVAL", DEFAULT_CATCHUP_MIN_INTERVAL)
+        clock = time.monotonic()
+        if report.error:
+            state.next_due = clock + self._backoff(state, interval)
+        elif report.timed_out:
+            # More to fetch: come back as soon as the minimum interval allows.
+            state.failures = 0
+            state.next_due = clock + _setting("HIK_CATCHUP_MIN_INTERVAL", DEFAULT_CATCHUP_MIN_INTERVAL)
+        else:
+            state.failures = 0
+            state.next_due = clock + interval
+
+    def _catchup(self, device: Device, max_results: int = 50, budget: float | None = None) -> CatchupReport:
+        if device.id in self._gap_devices:
+            return catchup_serial_gaps(device, max_results=max_results, budget=budget)
+        return catchup_device_report(device, max_results=max_results, budget=budget)
+
+    def tick(self) -> list[CatchupReport]:
+        due = self.due_devices()
+        if not due:
+            return []
+        reports = catchup_devices_parallel(
+            due,
+            workers=self.workers,
+            per_gateway=self.per_gateway,
+            budget=self.budget,
+            catchup=self._catchup,
+        )
+        for report in reports:
+            self.record(report)
+        return reports
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Iterator
+
 
 def _as_list(value):
     if isinstance(value, list):
@@ -48,3 +50,9 @@ def normalize_device(item: dict) -> dict:
         "device_type": item.get("deviceType") or item.get("devType") or "",
         "raw": item,
     }
+
+
+def iter_devices(client, **filters) -> Iterator[dict]:
+    for payload in client.iter_device_list_pages(**filters):
+        for item in extract_devices(payload):
+            yield normalize_device(item)
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from hik_gateway.models import Gateway
+from hik_gateway.services.device_sync import sync_gateway_devices
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESYNC_BACKOFF = 30
+DEFAULT_RESYNC_MAX_BACKOFF = 900
+
+
+class MissingDeviceBackoff:
+    def __init__(self):
+        self._entries: dict[tuple[int | None, str], tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def should_resync(self, tenant_id: int | None, dev_index: str) -> bool:
+        base = getattr(settings, "HIK_DEVICE_RESYNC_BACKOFF", DEFAULT_RESYNC_BACKOFF)
+        ceiling = getattr(settings, "HIK_DEVICE_RESYNC_MAX_BACKOFF", DEFAULT_RESYNC_MAX_BACKOFF)
+        now = time.monotonic()
+        with self._lock:
+            retry_at, delay = self._entries.get((tenant_id, dev_index), (0.0, 0.0))
+            if now < retry_at:
+                return False
+            delay = min(delay * 2, ceiling) if delay else base
+            self._entries[(tenant_id, dev_index)] = (now + delay, delay)
+            return True
+
+    def forget(self, dev_index: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == dev_index]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+missing_device_backoff = MissingDeviceBackoff()
+
+_inflight_gateways: set[int] = set()
+# Submitted to the executor and not finished yet, whether still waiting for a worker or running.
+_queued_gateways: set[int] = set()
+_inflight_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def resync_gateway(gateway: Gateway) -> int:
+    from hik_gateway.services.webhook_ingest import attach_pending_events
+
+    with _inflight_lock:
+        if gateway.id in _inflight_gateways:
+            return 0
+        _inflight_gateways.add(gateway.id)
+    try:
+        sync_gateway_devices(gateway)
+        return attach_pending_events(gateway)
+    finally:
+        with _inflight_lock:
+            _inflight_gateways.discard(gateway.id)
+
+
+def _resync_in_background(gateway: Gateway) -> None:
+    try:
+        resync_gateway(gateway)
+    except Exception:  # noqa: BLE001
+        logger.exception("Background device resync failed", extra={"gateway": gateway.base_url})
+    finally:
+        with _inflight_lock:
+            _queued_gateways.discard(gateway.id)
+        connection.close()
+
+
+def resync_is_deferred() -> bool:
+    return getattr(settings, "HIK_DEVICE_RESYNC_DEFERRED", True)
+
+
+def schedule_device_resync(dev_index: str, tenant_id: int | None = None) -> bool:
+    if not missing_device_backoff.should_resync(tenant_id, dev_index):
+        return False
+
+    gateways = Gateway.objects.select_related("tenant")
+    if tenant_id is not None:
+        gateways = gateways.filter(tenant_id=tenant_id)
+
+    deferred = resync_is_deferred()
+    global _executor
+    for gateway in gateways:
+        with _inflight_lock:
+            if gateway.id in _inflight_gateways or gateway.id in _queued_gateways:
+                continue
+            if deferred:
+                # Claimed at submit time: unknown devIndexes arriving while the job waits for a
+                # worker must not queue another full device list sync of the same gateway.
+                _queued_gateways.add(gateway.id)
+                if _executor is None:
+                    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hik-resync")
+        if not deferred:
+            try:
+                resync_gateway(gateway)
+            except Exception:  # noqa: BLE001
+                logger.exception("Device resync failed", extra={"gateway": gateway.base_url})
+            continue
+
+        try:
+            _executor.submit(_resync_in_background, gateway)
+        except RuntimeError:
+            with _inflight_lock:
+                _queued_gateways.discard(gateway.id)
+            raise
+    return True
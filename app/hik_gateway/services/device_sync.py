@@ -5,9 +5,9 @@ from datetime import datetime, timezone as dt_timezone
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 
-from hik_gateway.client import HikGatewayClient
+from hik_gateway.client import get_gateway_client
 from hik_gateway.models import Device, Gateway
-from hik_gateway.services.device_payload import extract_devices, normalize_device
+from hik_gateway.services.device_payload import iter_devices
 
 
 def _as_aware(dt: datetime | None) -> datetime | None:
@@ -19,13 +19,11 @@ def _as_aware(dt: datetime | None) -> datetime | None:
 
 
 def sync_gateway_devices(gateway: Gateway) -> int:
-    client = HikGatewayClient(gateway.base_url, gateway.username, gateway.password)
-    response = client.device_list()
-    items = extract_devices(response)
+    client = get_gateway_client(gateway)
 
     synced = 0
-    for item in items:
-        normalized = normalize_device(item)
+    for normalized in iter_devices(client):
+        item = normalized["raw"]
         dev_index = normalized["dev_index"]
         serial_number = normalized["serial_number"]
         if not dev_index or not serial_number:
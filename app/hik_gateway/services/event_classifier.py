@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import re
+
+from django.conf import settings
+from django.utils import timezone
+
+from hik_gateway.models import Device
+from hik_gateway.services.resolution_cache import MISSING, TTLCache
+
+EVENT_ACCESS = "access"
+EVENT_HEARTBEAT = "heartbeat"
+EVENT_DISCARD = "discard"
+EVENT_UNKNOWN = "unknown"
+
+ACCESS_EVENT_TYPE = b"AccessControllerEvent"
+HEARTBEAT_EVENT_TYPES = {b"heartbeat"}
+# The alert envelope puts eventType ahead of the event body, so a bounded prefix is enough even for
+# pushes that carry a picture.
+CLASSIFY_SCAN_BYTES = 4096
+DEFAULT_HEARTBEAT_TOUCH_INTERVAL = 60
+
+_EVENT_TYPE_RE = re.compile(rb'"eventType"\s*:\s*"([^"]*)"')
+_DEV_INDEX_RE = re.compile(rb'"devIndex"\s*:\s*"([^"]*)"')
+
+heartbeat_touches = TTLCache(
+    maxsize=getattr(settings, "HIK_RESOLUTION_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "HIK_HEARTBEAT_TOUCH_INTERVAL", DEFAULT_HEARTBEAT_TOUCH_INTERVAL),
+)
+
+
+def classify_event(body: bytes) -> tuple[str, str]:
+    head = body[:CLASSIFY_SCAN_BYTES]
+    match = _EVENT_TYPE_RE.search(head)
+    if match is None:
+        return EVENT_UNKNOWN, ""
+
+    dev_index_match = _DEV_INDEX_RE.search(head)
+    dev_index = dev_index_match.group(1).decode("utf-8", errors="replace") if dev_index_match else ""
+    event_type = match.group(1)
+    if event_type == ACCESS_EVENT_TYPE:
+        return EVENT_ACCESS, dev_index
+    if event_type.lower() in HEARTBEAT_EVENT_TYPES:
+        return EVENT_HEARTBEAT, dev_index
+    return EVENT_DISCARD, dev_index
+
+
+def _heartbeat_devices(dev_index: str, tenant_code: str):
+    if not dev_index or heartbeat_touches.get((tenant_code, dev_index)) is not MISSING:
+        return None
+
+    devices = Device.objects.filter(dev_index=dev_index)
+    if tenant_code:
+        devices = devices.filter(tenant__code=tenant_code)
+    return devices
+
+
+def touch_device_heartbeat(dev_index: str, tenant_code: str = "") -> None:
+    devices = _heartbeat_devices(dev_index, tenant_code)
+    if devices is not None:
+        devices.update(last_seen_at=timezone.now())
+        # Throttle only once the touch is stored, so a failed update is retried by the next heartbeat.
+        heartbeat_touches.set((tenant_code, dev_index), True)
+
+
+async def atouch_device_heartbeat(dev_index: str, tenant_code: str = "") -> None:
+    devices = _heartbeat_devices(dev_index, tenant_code)
+    if devices is not None:
+        await devices.aupdate(last_seen_at=timezone.now())
+        heartbeat_touches.set((tenant_code, dev_index), True)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+from django.conf import settings
+
+from hik_gateway.client import HikGatewayClient, get_gateway_client
+from hik_gateway.models import Gateway
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FANOUT_DEADLINE = 25
+DEFAULT_FANOUT_WORKERS = 16
+
+
+@dataclass
+class GatewayCallResult:
+    gateway: Gateway
+    payload: Any = None
+    error: str = ""
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+
+def _call_gateway(gateway: Gateway, call: Callable[[Gateway, HikGatewayClient], Any]) -> GatewayCallResult:
+    started = time.monotonic()
+    try:
+        payload = call(gateway, get_gateway_client(gateway))
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Gateway call failed", extra={"tenant": gateway.tenant.code, "gateway": gateway.base_url})
+        return GatewayCallResult(gateway, error=str(exc), elapsed=time.monotonic() - started)
+    return GatewayCallResult(gateway, payload=payload, elapsed=time.monotonic() - started)
+
+
+def call_gateways(
+    gateways: Iterable[Gateway],
+    call: Callable[[Gateway, HikGatewayClient], Any],
+    deadline: float | None = None,
+) -> list[GatewayCallResult]:
+    gateways = list(gateways)
+    if not gateways:
+        return []
+
+    if deadline is None:
+        deadline = getattr(settings, "HIK_GATEWAY_FANOUT_DEADLINE", DEFAULT_FANOUT_DEADLINE)
+    max_workers = getattr(settings, "HIK_GATEWAY_FANOUT_WORKERS", DEFAULT_FANOUT_WORKERS)
+
+    started = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(len(gateways), max_workers)))
+    futures = [executor.submit(_call_gateway, gateway, call) for gateway in gateways]
+    done, _ = wait(futures, timeout=deadline)
+    # Stragglers keep running until their own HTTP timeout; nobody waits for them.
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    for gateway, future in zip(gateways, futures):
+        if future in done:
+            results.append(future.result())
+            continue
+        elapsed = time.monotonic() - started
+        logger.warning("Gateway missed fan-out deadline", extra={"tenant": gateway.tenant.code, "gateway": gateway.base_url})
+        results.append(GatewayCallResult(gateway, error=f"deadline exceeded after {elapsed:.1f}s", elapsed=elapsed))
+    return results
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INVENTORY_TTL = 30
+DEFAULT_INVENTORY_STALE_TTL = 300
+DEFAULT_INVENTORY_CACHE_SIZE = 256
+
+
+class InventoryCache:
+    def __init__(self, ttl: float | None = None, stale_ttl: float | None = None, maxsize: int | None = None):
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._maxsize = maxsize
+        self._entries: OrderedDict[tuple[int, Hashable], tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[tuple[int, Hashable], Future] = {}
+        self._lock = threading.Lock()
+        self._refresher: ThreadPoolExecutor | None = None
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "HIK_GATEWAY_INVENTORY_TTL", DEFAULT_INVENTORY_TTL)
+
+    @property
+    def stale_ttl(self) -> float:
+        if self._stale_ttl is not None:
+            return self._stale_ttl
+        return getattr(settings, "HIK_GATEWAY_INVENTORY_STALE_TTL", DEFAULT_INVENTORY_STALE_TTL)
+
+    @property
+    def maxsize(self) -> int:
+        if self._maxsize is not None:
+            return self._maxsize
+        return getattr(settings, "HIK_GATEWAY_INVENTORY_CACHE_SIZE", DEFAULT_INVENTORY_CACHE_SIZE)
+
+    def get(self, gateway_id: int, key: Hashable, loader: Callable[[], Any], fresh: bool = False) -> Any:
+        cache_key = (gateway_id, key)
+        if not fresh:
+            with self._lock:
+                entry = self._entries.get(cache_key)
+                if entry is not None:
+                    if time.monotonic() - entry[0] < self.ttl + self.stale_ttl:
+                        self._entries.move_to_end(cache_key)
+                    else:
+                        del self._entries[cache_key]
+                        entry = None
+            if entry is not None:
+                age = time.monotonic() - entry[0]
+                if age < self.ttl:
+                    return entry[1]
+                if age < self.ttl + self.stale_ttl:
+                    self._refresh_in_background(cache_key, loader)
+                    return entry[1]
+
+        return self._load(cache_key, loader).result()
+
+    def invalidate(self, gateway_id: int) -> None:
+        with self._lock:
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == gateway_id]:
+                del self._entries[cache_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _load(self, cache_key: tuple[int, Hashable], loader: Callable[[], Any]) -> Future:
+        with self._lock:
+            future = self._inflight.get(cache_key)
+            if future is not None:
+                return future
+            future = Future()
+            self._inflight[cache_key] = future
+
+        try:
+            payload = loader()
+        except Exception as exc:  # noqa: BLE001
+            future.set_exception(exc)
+        else:
+            with self._lock:
+                self._store(cache_key, payload)
+            future.set_result(payload)
+        finally:
+            with self._lock:
+                self._inflight.pop(cache_key, None)
+        return future
+
+    def _store(self, cache_key: tuple[int, Hashable], payload: Any) -> None:
+        now = time.monotonic()
+        expiry = self.ttl + self.stale_ttl
+        for expired in [key for key, (stored_at, _) in self._entries.items() if now - stored_at >= expiry]:
+            del self._entries[expired]
+        self._entries[cache_key] = (now, payload)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > max(1, self.maxsize):
+            self._entries.popitem(last=False)
+
+    def _refresh_in_background(self, cache_key: tuple[int, Hashable], loader: Callable[[], Any]) -> None:
+        with self._lock:
+            if cache_key in self._inflight:
+                return
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hik-inventory")
+            refresher = self._refresher
+
+        def refresh():
+            future = self._load(cache_key, loader)
+            if future.exception() is not None:
+                logger.warning("Background inventory refresh failed", extra={"gateway_id": cache_key[0]}, exc_info=future.exception())
+
+        refresher.submit(refresh)
+
+
+inventory_cache = InventoryCache()
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Iterable, Iterator
+
+
+def multipart_boundary(content_type: str) -> bytes:
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "boundary":
+            return value.strip().strip('"').encode("latin-1")
+    return b""
+
+
+def _part_headers(block: bytes) -> dict[str, str]:
+    headers = {}
+    for line in block.decode("latin-1").split("\r\n"):
+        name, separator, value = line.partition(":")
+        if separator:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def iter_multipart_parts(chunks: Iterable[bytes], boundary: bytes) -> Iterator[tuple[dict[str, str], bytes]]:
+    delimiter = b"--" + boundary
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while True:
+            start = buffer.find(delimiter)
+            if start < 0:
+                # Keep just enough to recognise a delimiter split across chunks.
+                del buffer[: max(0, len(buffer) - len(delimiter))]
+                break
+            del buffer[:start]
+            header_end = buffer.find(b"\r\n\r\n", len(delimiter))
+            if header_end < 0:
+                break
+            headers = _part_headers(bytes(buffer[len(delimiter) : header_end]))
+            body_start = header_end + 4
+            length = headers.get("content-length", "")
+            if length.isdigit():
+                body_end = body_start + int(length)
+                if len(buffer) < body_end:
+                    break
+                body = bytes(buffer[body_start:body_end])
+            else:
+                body_end = buffer.find(delimiter, body_start)
+                if body_end < 0:
+                    break
+                body = bytes(buffer[body_start:body_end]).removesuffix(b"\r\n")
+            del buffer[:body_end]
+            yield headers, body
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    MemoryFileUploadHandler,
+    StopFutureHandlers,
+    TemporaryFileUploadHandler,
+)
+from django.http import HttpRequest
+
+PICTURE_REF_FIELD = "pictureRef"
+PICTURE_REF_MAX_LENGTH = 128
+# What SpooledPicture.finish() produces: <2 hex>/<2 hex>/<sha256 hex><extension>.
+PICTURE_REF_RE = re.compile(r"([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})(\.[a-z0-9]{1,10})?")
+
+
+def picture_store_dir() -> Path:
+    return Path(getattr(settings, "HIK_PICTURE_DIR", "") or Path(settings.BASE_DIR) / "hik_pictures")
+
+
+def is_picture_ref(value) -> bool:
+    if not isinstance(value, str) or len(value) > PICTURE_REF_MAX_LENGTH:
+        return False
+    match = PICTURE_REF_RE.fullmatch(value)
+    return bool(match) and match.group(3).startswith(match.group(1) + match.group(2))
+
+
+def picture_path(picture_ref: str) -> Path:
+    # Refs reach here from stored payloads; anything but a content digest could point outside the store.
+    if not is_picture_ref(picture_ref):
+        raise ValueError(f"invalid picture ref {picture_ref!r}")
+    return picture_store_dir() / picture_ref
+
+
+class SpooledPicture:
+    def __init__(self, field_name: str, content_type: str):
+        self.field_name = field_name
+        self.content_type = content_type
+        self.size = 0
+        self.ref = ""
+        self._hash = hashlib.sha256()
+        self._committed = False
+        directory = picture_store_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._path = Path(path)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def finish(self) -> None:
+        self._file.close()
+        digest = self._hash.hexdigest()
+        extension = mimetypes.guess_extension(self.content_type) or ""
+        self.ref = f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def commit(self) -> None:
+        if self._committed:
+            return
+        target = picture_path(self.ref)
+        if target.exists():
+            # Same bytes already stored: terminals resend the capture with every retry.
+            self._path.unlink(missing_ok=True)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._path, target)
+        self._committed = True
+
+    def discard(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if not self._committed:
+            self._path.unlink(missing_ok=True)
+
+
+class PictureUploadHandler(FileUploadHandler):
+    """Stream image parts chunk by chunk into the picture store; other parts fall through."""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.pictures: list[SpooledPicture] = []
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.picture = None
+        if (content_type or "").startswith("image/"):
+            self.picture = SpooledPicture(field_name, content_type)
+            self.pictures.append(self.picture)
+            raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.picture is None:
+            return raw_data
+        self.picture.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.picture is None:
+            return None
+        self.picture.finish()
+        return self.picture
+
+
+def is_multipart(request: HttpRequest) -> bool:
+    return request.content_type == "multipart/form-data"
+
+
+def _json_parts(request: HttpRequest):
+    for _, values in request.POST.lists():
+        yield from values
+    for _, uploads in request.FILES.lists():
+        for upload in uploads:
+            if not isinstance(upload, SpooledPicture):
+                yield upload.read().decode(upload.charset or "utf-8", errors="replace")
+
+
+def read_multipart_webhook(request: HttpRequest) -> tuple[bytes, list[SpooledPicture]]:
+    picture_handler = PictureUploadHandler(request)
+    request.upload_handlers = [picture_handler, MemoryFileUploadHandler(request), TemporaryFileUploadHandler(request)]
+    try:
+        request.FILES
+    except Exception:
+        for picture in picture_handler.pictures:
+            picture.discard()
+        raise
+    pictures = picture_handler.pictures
+
+    payload = None
+    for part in _json_parts(request):
+        try:
+            candidate = json.loads(part)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(candidate, dict):
+            payload = candidate
+            break
+    if payload is None:
+        return b"{}", pictures
+
+    if pictures:
+        root = payload.get("EventNotificationAlert", payload)
+        if isinstance(root, dict):
+            root[PICTURE_REF_FIELD] = pictures[0].ref
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8"), pictures
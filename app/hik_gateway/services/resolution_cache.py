@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from django.conf import settings
+
+from hik_gateway.models import DeviceReaderConfig
+from tenants.models import Tenant
+
+DEFAULT_RESOLUTION_CACHE_SIZE = 1024
+DEFAULT_RESOLUTION_CACHE_TTL = 300
+DEFAULT_RECENT_EVENT_KEYS_SIZE = 20000
+DEFAULT_RECENT_EVENT_KEYS_TTL = 900
+
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Hashable, Any], bool]) -> None:
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if predicate(key, value)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _build_cache() -> TTLCache:
+    return TTLCache(
+        maxsize=getattr(settings, "HIK_RESOLUTION_CACHE_SIZE", DEFAULT_RESOLUTION_CACHE_SIZE),
+        ttl=getattr(settings, "HIK_RESOLUTION_CACHE_TTL", DEFAULT_RESOLUTION_CACHE_TTL),
+    )
+
+
+tenant_cache = _build_cache()
+device_cache = _build_cache()
+reader_direction_cache = _build_cache()
+recent_event_keys = TTLCache(
+    maxsize=getattr(settings, "HIK_RECENT_EVENT_KEYS_SIZE", DEFAULT_RECENT_EVENT_KEYS_SIZE),
+    ttl=getattr(settings, "HIK_RECENT_EVENT_KEYS_TTL", DEFAULT_RECENT_EVENT_KEYS_TTL),
+)
+
+
+def resolve_tenant_code(tenant_code: str) -> Tenant | None:
+    tenant = tenant_cache.get(tenant_code)
+    if tenant is not MISSING:
+        return tenant
+
+    tenant = Tenant.objects.filter(code=tenant_code).first()
+    if tenant is not None:
+        tenant_cache.set(tenant_code, tenant)
+    return tenant
+
+
+async def aresolve_tenant_code(tenant_code: str) -> Tenant | None:
+    # Cache hits never touch the event loop's executor; the locks only guard dict operations.
+    tenant = tenant_cache.get(tenant_code)
+    if tenant is not MISSING:
+        return tenant
+
+    tenant = await Tenant.objects.filter(code=tenant_code).afirst()
+    if tenant is not None:
+        tenant_cache.set(tenant_code, tenant)
+    return tenant
+
+
+def _reader_directions_queryset(device_id: int):
+    return DeviceReaderConfig.objects.filter(device_id=device_id).values_list("door_no", "card_reader_no", "direction_default")
+
+
+def reader_directions(device_id: int) -> dict[tuple[int, int], str]:
+    directions = reader_direction_cache.get(device_id)
+    if directions is not MISSING:
+        return directions
+
+    directions = {
+        (door_no, card_reader_no): direction
+        for door_no, card_reader_no, direction in _reader_directions_queryset(device_id)
+    }
+    reader_direction_cache.set(device_id, directions)
+    return directions
+
+
+async def areader_directions(device_id: int) -> dict[tuple[int, int], str]:
+    directions = reader_direction_cache.get(device_id)
+    if directions is not MISSING:
+        return directions
+
+    directions = {
+        (door_no, card_reader_no): direction
+        async for door_no, card_reader_no, direction in _reader_directions_queryset(device_id)
+    }
+    reader_direction_cache.set(device_id, directions)
+    return directions
+
+
+def invalidate_reader_directions(device_id: int) -> None:
+    reader_direction_cache.discard(device_id)
+
+
+def invalidate_tenant(tenant: Tenant) -> None:
+    tenant_cache.discard_where(lambda key, value: key == tenant.code or value.id == tenant.id)
+    device_cache.discard_where(lambda key, value: key[0] == tenant.id or value.tenant_id == tenant.id)
+
+
+def invalidate_device(device) -> None:
+    device_cache.discard_where(lambda key, value: key[1] == device.dev_index or value.id == device.id)
+
+
+def invalidate_gateway(gateway) -> None:
+    device_cache.discard_where(lambda key, value: value.gateway_id == gateway.id)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable
+
+from django.conf import settings
+
+from hik_gateway.models import DeviceCursor, RawEvent, SerialGap
+
+logger = logging.getLogger(__name__)
+
+# A jump this large is a counter reset or a replaced terminal rather than missed pushes.
+DEFAULT_SERIAL_GAP_MAX_SPAN = 10000
+
+
+def _split_gap(gap: SerialGap, serials: list[int]) -> list[SerialGap]:
+    pieces = []
+    first = gap.first_serial_no
+    for serial_no in serials:
+        if serial_no > first:
+            pieces.append(SerialGap(device_id=gap.device_id, first_serial_no=first, last_serial_no=serial_no - 1, seen_before=gap.seen_before))
+        first = serial_no + 1
+    if first <= gap.last_serial_no:
+        pieces.append(SerialGap(device_id=gap.device_id, first_serial_no=first, last_serial_no=gap.last_serial_no, seen_before=gap.seen_before))
+    return pieces
+
+
+def _fill_gaps(device_id: int, serials: list[int]) -> None:
+    gaps = SerialGap.objects.filter(device_id=device_id, first_serial_no__lte=serials[-1], last_serial_no__gte=serials[0])
+    filled, pieces = [], []
+    for gap in gaps:
+        inside = [serial_no for serial_no in serials if gap.first_serial_no <= serial_no <= gap.last_serial_no]
+        if inside:
+            filled.append(gap.pk)
+            pieces.extend(_split_gap(gap, inside))
+    if filled:
+        SerialGap.objects.filter(pk__in=filled).delete()
+        SerialGap.objects.bulk_create(pieces)
+
+
+def _is_counter_reset(high_water: int, serial_no: int, event_datetime: datetime | None, last_serial_at: datetime | None, max_span: int) -> bool:
+    # Far below the high-water mark yet newer than it: the terminal restarted its sequence. Old
+    # events far below it (a backfill, a late redelivery) are older and stay plain late arrivals.
+    if high_water - serial_no <= max_span:
+        return False
+    return last_serial_at is None or event_datetime is None or event_datetime > last_serial_at
+
+
+def _record_device_serials(device_id: int, tenant_id: int, seen: dict[int, datetime | None]) -> None:
+    serials = sorted(seen)
+    lowest, highest = serials[0], serials[-1]
+    if highest - lowest + 1 == len(serials):
+        # The steady state: the batch continues the sequence, one conditional update and done.
+        if DeviceCursor.objects.filter(device_id=device_id, last_serial_no=lowest - 1).update(
+            last_serial_no=highest, last_serial_at=seen[highest]
+        ):
+            return
+
+    cursor, _ = DeviceCursor.objects.select_for_update().get_or_create(device_id=device_id, defaults={"tenant_id": tenant_id})
+    max_span = getattr(settings, "HIK_SERIAL_GAP_MAX_SPAN", DEFAULT_SERIAL_GAP_MAX_SPAN)
+    high_water = cursor.last_serial_no
+    if high_water is None:
+        # Nothing is known before the first event seen, only the holes between the ones at hand.
+        high_water = lowest - 1
+    else:
+        restarted = [
+            serial_no
+            for serial_no in serials
+            if _is_counter_reset(high_water, serial_no, seen[serial_no], cursor.last_serial_at, max_span)
+        ]
+        if restarted:
+            logger.warning(
+                "Serial counter reset, rebasing gap tracking",
+                extra={"device_id": device_id, "high_water": high_water, "serial_no": restarted[0]},
+            )
+            # Gaps of the old sequence can never be filled now; track the new one from its first serial.
+            SerialGap.objects.filter(device_id=device_id).delete()
+            serials = restarted
+            high_water = serials[0] - 1
+
+    late = [serial_no for serial_no in serials if serial_no <= high_water]
+    if late:
+        _fill_gaps(device_id, late)
+
+    new_gaps = []
+    previous = high_water
+    for serial_no in serials:
+        if serial_no <= high_water:
+            continue
+        if 1 < serial_no - previous <= max_span + 1:
+            new_gaps.append(
+                SerialGap(device_id=device_id, first_serial_no=previous + 1, last_serial_no=serial_no - 1, seen_before=seen[serial_no])
+            )
+        previous = serial_no
+    SerialGap.objects.bulk_create(new_gaps)
+
+    if previous != cursor.last_serial_no:
+        cursor.last_serial_no = previous
+        cursor.last_serial_at = seen[previous]
+        cursor.save(update_fields=["last_serial_no", "last_serial_at", "updated_at"])
+
+
+def record_serials(raw_events: Iterable[RawEvent]) -> None:
+    """Advance each device's serial high-water mark and open/close the missing ranges it implies.
+
+    Call inside the transaction that inserted the events, with the newly created rows only.
+    """
+    by_device: dict[int, dict[int, datetime | None]] = defaultdict(dict)
+    tenants: dict[int, int] = {}
+    for raw_event in raw_events:
+        if raw_event.serial_no is None or raw_event.device_id is None:
+            continue
+        by_device[raw_event.device_id][raw_event.serial_no] = raw_event.event_datetime
+        tenants[raw_event.device_id] = raw_event.tenant_id
+    for device_id, seen in by_device.items():
+        _record_device_serials(device_id, tenants[device_id], seen)
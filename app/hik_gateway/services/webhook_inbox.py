@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+import logging
+from collections import defaultdict
+from typing import Iterable
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, connection, transaction
+from django.utils import timezone
+
+from hik_gateway.models import AttendanceLog, InboxEvent
+from hik_gateway.services.resolution_cache import resolve_tenant_code
+from hik_gateway.services.webhook_ingest import ingest_events
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INBOX_BATCH_SIZE = 200
+
+
+def inbox_enabled() -> bool:
+    return getattr(settings, "HIK_WEBHOOK_INBOX", False)
+
+
+def enqueue_webhook(body: str, tenant_code: str = "", client_ip: str = "") -> InboxEvent:
+    return InboxEvent.objects.create(tenant_code=tenant_code, client_ip=client_ip, body=body)
+
+
+async def aenqueue_webhook(body: str, tenant_code: str = "", client_ip: str = "") -> InboxEvent:
+    return await InboxEvent.objects.acreate(tenant_code=tenant_code, client_ip=client_ip, body=body)
+
+
+def _parse_body(body: str) -> dict | None:
+    try:
+        payload = json.loads(body or "{}")
+    except json.JSONDecodeError:
+        logger.warning("Dropping queued webhook with invalid JSON")
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def _tenant_code(tenant_code: str, payload: dict) -> str:
+    if tenant_code:
+        return tenant_code
+    root = payload.get("EventNotificationAlert", payload)
+    if not isinstance(root, dict):
+        return ""
+    return str(root.get("tenantCode") or payload.get("tenantCode") or "").strip()
+
+
+def _ingest_entries(entries: Iterable[tuple[str, str]]) -> None:
+    groups: dict[str, list[dict]] = defaultdict(list)
+    for body, tenant_code in entries:
+        payload = _parse_body(body)
+        if payload is None:
+            continue
+        groups[_tenant_code(tenant_code, payload)].append(payload)
+
+    for tenant_code, payloads in groups.items():
+        tenant = resolve_tenant_code(tenant_code) if tenant_code else None
+        if tenant_code and tenant is None:
+            logger.warning("Dropping queued webhooks for unknown tenant", extra={"tenant": tenant_code, "count": len(payloads)})
+            continue
+        ingest_events(payloads, source=AttendanceLog.SOURCE_REALTIME, tenant=tenant)
+
+
+def ingest_webhook_bodies(entries: Iterable[tuple[str, str]]) -> dict[int, str]:
+    """Ingest (body, tenant_code) entries; return the errors of the ones that failed, by position.
+
+    The batch goes in at once; if it fails, each entry is retried in its own savepoint so one bad
+    body cannot hold back the others. Database errors (outage, timeout, deadlock) are not the
+    entries' fault and propagate, so the caller's transaction rolls back and the batch is retried.
+    """
+    entries = list(entries)
+    try:
+        with transaction.atomic():
+            _ingest_entries(entries)
+        return {}
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception:  # noqa: BLE001
+        logger.warning("Queued webhook batch failed, ingesting entries one by one", exc_info=True)
+
+    errors: dict[int, str] = {}
+    for index, entry in enumerate(entries):
+        try:
+            with transaction.atomic():
+                _ingest_entries([entry])
+        except (OperationalError, InterfaceError):
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Queued webhook failed")
+            errors[index] = f"{type(exc).__name__}: {exc}"
+    return errors
+
+
+def requeue_failed_inbox() -> int:
+    """Put dead-lettered rows back in line for the next drain."""
+    return InboxEvent.objects.filter(failed_at__isnull=False).update(failed_at=None, error="")
+
+
+def drain_inbox(batch_size: int | None = None) -> int:
+    if batch_size is None:
+        batch_size = getattr(settings, "HIK_WEBHOOK_INBOX_BATCH_SIZE", DEFAULT_INBOX_BATCH_SIZE)
+
+    with transaction.atomic():
+        batch = InboxEvent.objects.filter(failed_at__isnull=True).order_by("id")
+        if connection.features.has_select_for_update_skip_locked:
+            # Several drain workers can run side by side; each claims its own rows.
+            batch = batch.select_for_update(skip_locked=True)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return 0
+
+        errors = ingest_webhook_bodies((inbox_event.body, inbox_event.tenant_code) for inbox_event in batch)
+        failed = []
+        for index, error in errors.items():
+            # Dead-lettered: kept with its error for inspection, skipped by later drains.
+            inbox_event = batch[index]
+            inbox_event.failed_at = timezone.now()
+            inbox_event.error = error
+            failed.append(inbox_event)
+        InboxEvent.objects.bulk_update(failed, ["failed_at", "error"])
+        InboxEvent.objects.filter(id__in=[inbox_event.id for index, inbox_event in enumerate(batch) if index not in errors]).delete()
+    return len(batch)
@@ -1,17 +1,31 @@
 from __future__ import annotations
 
-import hashlib
+import logging
+from dataclasses import dataclass
 from datetime import datetime, timezone as dt_timezone
 
-from django.db import IntegrityError, transaction
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
 from django.db.models import Q
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 
-from hik_gateway.models import AttendanceLog, Device, DeviceReaderConfig, RawEvent
-from hik_gateway.services.device_sync import sync_gateway_devices
+from hik_gateway.event_keys import build_event_key
+from hik_gateway.models import AttendanceLog, Device, PendingEvent, RawEvent
+from hik_gateway.services.device_resync import resync_is_deferred, schedule_device_resync
+from hik_gateway.services.picture_store import PICTURE_REF_FIELD, is_picture_ref
+from hik_gateway.services.resolution_cache import (
+    MISSING,
+    areader_directions,
+    device_cache,
+    reader_directions,
+    recent_event_keys,
+)
+from hik_gateway.services.serial_gaps import record_serials
 from tenants.models import Tenant
 
+logger = logging.getLogger(__name__)
+
 ATTENDANCE_DIRECTION_MAP = {
     "checkin": "IN",
     "breakin": "IN",
@@ -25,6 +39,11 @@ AUTH_SUCCESS_SUB_TYPES = {1, 2, 15, 16, 38, 40, 43, 46}
 IGNORED_SUB_TYPES = {3, 6, 25, 26, 27, 28}
 CONNECTED_DEVICE_STATUSES = ("online", "active", "connected")
 
+OUTCOME_CREATED = "created"
+OUTCOME_DUPLICATE = "duplicate"
+OUTCOME_PENDING = "pending"
+OUTCOME_IGNORED = "ignored"
+
 
 def _as_aware(dt: datetime | None) -> datetime:
     if dt is None:
@@ -48,9 +67,13 @@ def _to_int(value):
     return None
 
 
-def _build_dedupe_key(dev_index: str, event_datetime: str, person_hint: str, serial_no: str) -> str:
-    raw = "|".join([dev_index or "", event_datetime or "", person_hint or "", serial_no or ""])
-    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+def _event_key_ids(event_keys: list[bytes]) -> dict[bytes, int]:
+    if not event_keys:
+        return {}
+    return {
+        bytes(event_key): pk
+        for event_key, pk in RawEvent.objects.filter(event_key__in=event_keys).values_list("event_key", "id")
+    }
 
 
 def _person_hint(access_event: dict) -> str:
@@ -62,11 +85,26 @@ def _person_hint(access_event: dict) -> str:
     )
 
 
+def _picture_ref(root: dict) -> str:
+    # Only refs the picture store minted are kept; the payload is client input and the ref becomes a path.
+    value = root.get(PICTURE_REF_FIELD)
+    if not value:
+        return ""
+    if not is_picture_ref(value):
+        logger.warning("Dropping invalid pictureRef", extra={"picture_ref": str(value)[:200]})
+        return ""
+    return value
+
+
 def _attendance_status_value(access_event: dict) -> str:
     return str(access_event.get("attendanceStatus") or "").strip()
 
 
-def _resolve_direction(device: Device, access_event: dict) -> tuple[str, bool]:
+def _resolve_direction(
+    device: Device,
+    access_event: dict,
+    directions: dict[tuple[int, int], str] | None = None,
+) -> tuple[str, bool]:
     status = _attendance_status_value(access_event)
     normalized = status.lower()
     if normalized and normalized != "undefined":
@@ -81,13 +119,11 @@ def _resolve_direction(device: Device, access_event: dict) -> tuple[str, bool]:
         door_no = _to_int(access_event.get("doorNo"))
         card_reader_no = _to_int(access_event.get("cardReaderNo"))
         if door_no is not None and card_reader_no is not None:
-            reader_config = DeviceReaderConfig.objects.filter(
-                device=device,
-                door_no=door_no,
-                card_reader_no=card_reader_no,
-            ).first()
-            if reader_config:
-                return reader_config.direction_default, False
+            if directions is None:
+                directions = reader_directions(device.id)
+            direction = directions.get((door_no, card_reader_no))
+            if direction:
+                return direction, False
         return "IN", False
 
     return "UNKNOWN", False
@@ -100,33 +136,55 @@ def _connected_status_filter() -> Q:
     return connected_filter
 
 
-def _get_or_resync_device(dev_index: str, tenant: Tenant | None = None) -> Device | None:
+def _device_queryset(dev_index: str, tenant: Tenant | None = None):
     queryset = Device.objects.filter(dev_index=dev_index)
     if tenant is not None:
         queryset = queryset.filter(tenant=tenant)
+    return queryset
+
+
+def _connected_device_queryset(dev_index: str, tenant: Tenant | None = None):
+    return _device_queryset(dev_index, tenant).filter(_connected_status_filter()).select_related("gateway", "tenant")
 
-    device = queryset.filter(_connected_status_filter()).select_related("gateway").first()
+
+def _resolve_device(dev_index: str, tenant: Tenant | None = None) -> Device | None:
+    cache_key = (tenant.id if tenant is not None else None, dev_index)
+    device = device_cache.get(cache_key)
+    if device is not MISSING:
+        return device
+
+    device = _connected_device_queryset(dev_index, tenant).first()
     if device:
+        device_cache.set(cache_key, device)
+    return device
+
+
+async def _aresolve_device(dev_index: str, tenant: Tenant | None = None) -> Device | None:
+    cache_key = (tenant.id if tenant is not None else None, dev_index)
+    device = device_cache.get(cache_key)
+    if device is not MISSING:
         return device
 
-    from hik_gateway.models import Gateway
+    device = await _connected_device_queryset(dev_index, tenant).afirst()
+    if device:
+        device_cache.set(cache_key, device)
+    return device
 
-    gateways = Gateway.objects.all()
-    if tenant is not None:
-        gateways = gateways.filter(tenant=tenant)
-
-    for gateway in gateways.iterator():
-        sync_gateway_devices(gateway)
-        device = (
-            Device.objects.filter(gateway=gateway, dev_index=dev_index)
-            .filter(_connected_status_filter())
-            .select_related("gateway")
-            .first()
-        )
-        if device:
-            return device
 
-    return queryset.select_related("gateway").first()
+def _get_or_resync_device(dev_index: str, tenant: Tenant | None = None) -> Device | None:
+    device = _resolve_device(dev_index, tenant=tenant)
+    if device:
+        return device
+
+    fallback = _device_queryset(dev_index, tenant).select_related("gateway", "tenant").first()
+    deferred = resync_is_deferred()
+    if fallback is None and deferred:
+        return None
+
+    tenant_id = tenant.id if tenant is not None else None
+    if schedule_device_resync(dev_index, tenant_id=tenant_id) and not deferred:
+        device = _resolve_device(dev_index, tenant=tenant)
+    return device or fallback
 
 
 def ingest_event(payload: dict, source: str, tenant: Tenant | None = None) -> tuple[RawEvent | None, AttendanceLog | None]:
@@ -134,68 +192,314 @@ def ingest_event(payload: dict, source: str, tenant: Tenant | None = None) -> tu
     if root.get("eventType") != "AccessControllerEvent":
         return None, None
 
-    access_event = root.get("AccessControllerEvent", {})
     dev_index = root.get("devIndex", "")
     if not dev_index:
         return None, None
 
     device = _get_or_resync_device(dev_index, tenant=tenant)
     if not device:
+        PendingEvent.objects.create(tenant=tenant, dev_index=dev_index, source=source, payload=payload)
+        schedule_device_resync(dev_index, tenant_id=tenant.id if tenant is not None else None)
+        return None, None
+
+    return _store_event(device, payload, source)
+
+
+async def aingest_event(
+    payload: dict, source: str, tenant: Tenant | None = None
+) -> tuple[RawEvent | None, AttendanceLog | None]:
+    root = _event_root(payload)
+    if root.get("eventType") != "AccessControllerEvent":
+        return None, None
+
+    dev_index = root.get("devIndex", "")
+    if not dev_index:
         return None, None
 
+    device = await _aresolve_device(dev_index, tenant=tenant)
+    if device is None:
+        # Unknown or disconnected devices are rare; let the sync path park the event and schedule the resync.
+        return await sync_to_async(ingest_event)(payload, source, tenant=tenant)
+
+    directions = await areader_directions(device.id)
+    raw_event, attendance = _build_event(device, payload, source, directions=directions)
+    recent = _from_recent_events(raw_event, attendance)
+    if recent is not None:
+        return recent
+    return await sync_to_async(_persist_event)(raw_event, attendance)
+
+
+def _build_event(
+    device: Device,
+    payload: dict,
+    source: str,
+    directions: dict[tuple[int, int], str] | None = None,
+) -> tuple[RawEvent, AttendanceLog | None]:
+    root = _event_root(payload)
+    access_event = root.get("AccessControllerEvent", {})
+    dev_index = root.get("devIndex", "")
+
     timestamp_raw = root.get("dateTime") or access_event.get("time")
-    event_dt = _as_aware(parse_datetime(timestamp_raw or ""))
+    parsed_dt = parse_datetime(timestamp_raw or "")
+    event_dt = _as_aware(parsed_dt)
     person_hint = _person_hint(access_event)
-    serial_no = str(access_event.get("serialNo") or root.get("serialNo") or "")
+    serial_no = _to_int(access_event.get("serialNo") or root.get("serialNo"))
 
-    dedupe_key = _build_dedupe_key(dev_index, timestamp_raw or "", person_hint, serial_no)
-    event_type = root.get("eventType", "")
     attendance_status = _attendance_status_value(access_event)
-    direction, from_status = _resolve_direction(device, access_event)
+    direction, from_status = _resolve_direction(device, access_event, directions)
+
+    raw_event = RawEvent(
+        tenant=device.tenant,
+        device=device,
+        dev_index=dev_index,
+        event_type=root.get("eventType", ""),
+        event_datetime=event_dt,
+        major_event_type=_to_int(access_event.get("majorEventType")),
+        sub_event_type=_to_int(access_event.get("subEventType")),
+        serial_no=serial_no,
+        front_serial_no=_to_int(access_event.get("frontSerialNo") or root.get("frontSerialNo")),
+        employee_no=str(access_event.get("employeeNo") or ""),
+        employee_no_string=str(access_event.get("employeeNoString") or ""),
+        card_no=str(access_event.get("cardNo") or ""),
+        card_reader_no=_to_int(access_event.get("cardReaderNo")),
+        door_no=_to_int(access_event.get("doorNo")),
+        attendance_status=attendance_status,
+        event_key=build_event_key(str(device.id), event_dt if parsed_dt else None, serial_no, person_hint),
+        picture_ref=_picture_ref(root),
+        payload=payload,
+    )
+    if direction == "IGNORE":
+        return raw_event, None
+
+    attendance = AttendanceLog(
+        tenant=device.tenant,
+        person_id=person_hint,
+        device=device,
+        timestamp=event_dt,
+        attendance_type=attendance_status or ("fallback" if not from_status else "unknown"),
+        attendance_status=attendance_status,
+        direction=direction,
+        source=source,
+    )
+    return raw_event, attendance
+
+
+def _insert_raw_events(raw_events: list[RawEvent]) -> dict[bytes, int]:
+    if not raw_events:
+        return {}
+
+    features = connection.features
+    if features.supports_ignore_conflicts and features.can_return_rows_from_bulk_insert:
+        inserted = _insert_returning(raw_events)
+    else:
+        # No RETURNING: rows whose key was already stored before the insert were not inserted by it.
+        event_keys = [raw_event.event_key for raw_event in raw_events]
+        before = _event_key_ids(event_keys)
+        RawEvent.objects.bulk_create([raw_event for raw_event in raw_events if raw_event.event_key not in before], ignore_conflicts=True)
+        inserted = {event_key: pk for event_key, pk in _event_key_ids(event_keys).items() if event_key not in before}
+
+    for raw_event in raw_events:
+        if raw_event.event_key in inserted:
+            raw_event.pk = inserted[raw_event.event_key]
+            raw_event._state.adding = False
+    return inserted
+
+
+def _insert_returning(raw_events: list[RawEvent]) -> dict[bytes, int]:
+    opts = RawEvent._meta
+    quote = connection.ops.quote_name
+    fields = [field for field in opts.concrete_fields if not field.primary_key]
+    columns = ", ".join(quote(field.column) for field in fields)
+    row = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    conflict_column = quote(opts.get_field("event_key").column)
+    batch_size = connection.ops.bulk_batch_size(fields, raw_events) or len(raw_events)
+
+    inserted: dict[bytes, int] = {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(raw_events), batch_size):
+            batch = raw_events[start : start + batch_size]
+            params = [field.get_db_prep_save(field.pre_save(raw_event, True), connection) for raw_event in batch for field in fields]
+            cursor.execute(
+                f"INSERT INTO {quote(opts.db_table)} ({columns}) VALUES {', '.join([row] * len(batch))} "
+                f"ON CONFLICT ({conflict_column}) DO NOTHING RETURNING {quote(opts.pk.column)}, {conflict_column}",
+                params,
+            )
+            inserted.update((bytes(event_key), pk) for pk, event_key in cursor.fetchall())
+    return inserted
+
+
+def _remember_events(entries: dict[bytes, tuple[int, int | None]]) -> None:
+    def remember():
+        for key, value in entries.items():
+            recent_event_keys.set(key, value)
+
+    if entries:
+        transaction.on_commit(remember)
+
+
+def _as_stored(instance, pk: int | None):
+    if instance is None or pk is None:
+        return None
+    instance.pk = pk
+    instance._state.adding = False
+    return instance
 
+
+def _from_recent_events(
+    raw_event: RawEvent, attendance: AttendanceLog | None
+) -> tuple[RawEvent, AttendanceLog | None] | None:
+    cached = recent_event_keys.get(raw_event.event_key)
+    if cached is MISSING:
+        return None
+    raw_event = _as_stored(raw_event, cached[0])
+    attendance = _as_stored(attendance, cached[1])
+    if attendance is not None:
+        attendance.raw_event = raw_event
+    return raw_event, attendance
+
+
+def _persist_event(
+    raw_event: RawEvent, attendance: AttendanceLog | None
+) -> tuple[RawEvent | None, AttendanceLog | None]:
     with transaction.atomic():
-        try:
-            raw_event = RawEvent.objects.create(
-                tenant=device.tenant,
-                device=device,
-                dev_index=dev_index,
-                event_type=event_type,
-                event_datetime=event_dt,
-                major_event_type=_to_int(access_event.get("majorEventType")),
-                sub_event_type=_to_int(access_event.get("subEventType")),
-                serial_no=_to_int(access_event.get("serialNo") or root.get("serialNo")),
-                front_serial_no=_to_int(access_event.get("frontSerialNo") or root.get("frontSerialNo")),
-                employee_no=str(access_event.get("employeeNo") or ""),
-                employee_no_string=str(access_event.get("employeeNoString") or ""),
-                card_no=str(access_event.get("cardNo") or ""),
-                card_reader_no=_to_int(access_event.get("cardReaderNo")),
-                door_no=_to_int(access_event.get("doorNo")),
-                attendance_status=attendance_status,
-                dedupe_key=dedupe_key,
-                payload=payload,
+        if not _insert_raw_events([raw_event]):
+            raw_event = RawEvent.objects.filter(event_key=raw_event.event_key).select_related("attendance_log").first()
+            if raw_event is None:
+                return None, None
+            try:
+                attendance = raw_event.attendance_log
+            except AttendanceLog.DoesNotExist:
+                attendance = None
+        else:
+            if attendance is not None:
+                attendance.raw_event = raw_event
+                attendance.save(force_insert=True)
+            record_serials([raw_event])
+
+        _remember_events({bytes(raw_event.event_key): (raw_event.pk, attendance.pk if attendance else None)})
+    return raw_event, attendance
+
+
+def _store_event(device: Device, payload: dict, source: str) -> tuple[RawEvent | None, AttendanceLog | None]:
+    raw_event, attendance = _build_event(device, payload, source)
+    return _from_recent_events(raw_event, attendance) or _persist_event(raw_event, attendance)
+
+
+@dataclass
+class IngestOutcome:
+    status: str
+    raw_event_id: int | None = None
+    event_datetime: datetime | None = None
+    serial_no: int | None = None
+    has_attendance: bool = False
+
+
+def ingest_events(
+    payloads: list[dict],
+    source: str,
+    tenant: Tenant | None = None,
+    device: Device | None = None,
+) -> list[IngestOutcome]:
+    outcomes: list[IngestOutcome | None] = [None] * len(payloads)
+    built: dict[bytes, tuple[RawEvent, AttendanceLog | None]] = {}
+    positions: dict[bytes, list[int]] = {}
+    pending: list[PendingEvent] = []
+
+    for index, payload in enumerate(payloads):
+        root = _event_root(payload)
+        dev_index = root.get("devIndex", "")
+        if root.get("eventType") != "AccessControllerEvent" or not dev_index:
+            outcomes[index] = IngestOutcome(OUTCOME_IGNORED)
+            continue
+
+        event_device = device or _get_or_resync_device(dev_index, tenant=tenant)
+        if event_device is None:
+            pending.append(PendingEvent(tenant=tenant, dev_index=dev_index, source=source, payload=payload))
+            outcomes[index] = IngestOutcome(OUTCOME_PENDING)
+            continue
+
+        raw_event, attendance = _build_event(event_device, payload, source)
+        built.setdefault(raw_event.event_key, (raw_event, attendance))
+        positions.setdefault(raw_event.event_key, []).append(index)
+
+    stored: dict[bytes, tuple[int, int | None]] = {}
+    for key in built:
+        cached = recent_event_keys.get(key)
+        if cached is not MISSING:
+            stored[key] = cached
+    created: set[bytes] = set()
+
+    with transaction.atomic():
+        if pending:
+            PendingEvent.objects.bulk_create(pending)
+
+        lookup = [key for key in built if key not in stored]
+        existing = _event_key_ids(lookup)
+        inserted = _insert_raw_events([built[key][0] for key in lookup if key not in existing])
+        raced = [key for key in lookup if key not in existing and key not in inserted]
+        if raced:
+            existing.update(_event_key_ids(raced))
+
+        new_attendances = []
+        for key in inserted:
+            raw_event, attendance = built[key]
+            if attendance is not None:
+                attendance.raw_event = raw_event
+                new_attendances.append(attendance)
+        AttendanceLog.objects.bulk_create(new_attendances)
+        for key in inserted:
+            attendance = built[key][1]
+            stored[key] = (inserted[key], attendance.pk if attendance else None)
+            created.add(key)
+        record_serials(built[key][0] for key in inserted)
+
+        if existing:
+            attendance_ids = dict(
+                AttendanceLog.objects.filter(raw_event_id__in=list(existing.values())).values_list("raw_event_id", "id")
             )
-        except IntegrityError:
-            raw_event = RawEvent.objects.filter(dedupe_key=dedupe_key).first()
-            if raw_event:
-                attendance = AttendanceLog.objects.filter(raw_event=raw_event).first()
-                return raw_event, attendance
-            return None, None
-
-        if direction == "IGNORE":
-            return raw_event, None
-
-        attendance = AttendanceLog.objects.create(
-            tenant=device.tenant,
-            person_id=person_hint,
-            device=device,
-            timestamp=event_dt,
-            attendance_type=attendance_status or ("fallback" if not from_status else "unknown"),
-            attendance_status=attendance_status,
-            direction=direction,
-            source=source,
-            raw_event=raw_event,
+            for key, raw_event_id in existing.items():
+                stored[key] = (raw_event_id, attendance_ids.get(raw_event_id))
+
+        _remember_events(stored)
+
+    for key, (raw_event, _) in built.items():
+        raw_event_id, attendance_id = stored.get(key, (None, None))
+        outcome = IngestOutcome(
+            OUTCOME_CREATED if key in created else OUTCOME_DUPLICATE,
+            raw_event_id,
+            event_datetime=raw_event.event_datetime,
+            serial_no=raw_event.serial_no,
+            has_attendance=attendance_id is not None,
         )
-    return raw_event, attendance
+        for index in positions[key]:
+            outcomes[index] = outcome
+
+    if pending:
+        for dev_index in {pending_event.dev_index for pending_event in pending}:
+            schedule_device_resync(dev_index, tenant_id=tenant.id if tenant is not None else None)
+    return outcomes
+
+
+def attach_pending_events(gateway) -> int:
+    dev_indexes = Device.objects.filter(gateway=gateway).values_list("dev_index", flat=True)
+    pending_events = (
+        PendingEvent.objects.filter(dev_index__in=dev_indexes)
+        .filter(Q(tenant=gateway.tenant_id) | Q(tenant__isnull=True))
+        .select_related("tenant")
+        .order_by("id")
+    )
+
+    attached = 0
+    for pending_event in pending_events.iterator():
+        device = _device_queryset(pending_event.dev_index, pending_event.tenant).select_related("gateway", "tenant").first()
+        if device is None:
+            continue
+        with transaction.atomic():
+            raw_event, _ = _store_event(device, pending_event.payload, pending_event.source)
+            pending_event.delete()
+        if raw_event is not None:
+            attached += 1
+    return attached
 
 
 def ingest_acs_event(device: Device, acs_event: dict) -> tuple[RawEvent | None, AttendanceLog | None]:
@@ -208,3 +512,18 @@ def ingest_acs_event(device: Device, acs_event: dict) -> tuple[RawEvent | None,
         }
     }
     return ingest_event(wrapped, source=AttendanceLog.SOURCE_CATCHUP)
+
+
+def ingest_acs_events(device: Device, acs_events: list[dict]) -> list[IngestOutcome]:
+    payloads = [
+        {
+            "EventNotificationAlert": {
+                "eventType": "AccessControllerEvent",
+                "devIndex": device.dev_index,
+                "dateTime": acs_event.get("dateTime") or acs_event.get("time"),
+                "AccessControllerEvent": acs_event,
+            }
+        }
+        for acs_event in acs_events
+    ]
+    return ingest_events(payloads, source=AttendanceLog.SOURCE_CATCHUP, device=device)
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from hik_gateway.services.webhook_inbox import ingest_webhook_bodies
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_SEGMENT_BYTES = 8 * 1024 * 1024
+DEFAULT_SPOOL_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_SPOOL_SEGMENT_AGE = 5
+DEFAULT_SPOOL_LATENCY_BUDGET = 2.0
+DEFAULT_SPOOL_COOLDOWN = 10
+DEFAULT_SPOOL_REPLAY_BATCH_SIZE = 500
+DEFAULT_SPOOL_MAX_RECORD_BYTES = 4 * 1024 * 1024
+
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".seg"
+OFFSET_SUFFIX = ".offset"
+REJECTED_DIR = "rejected"
+# An .open segment untouched for this long belongs to a worker that died or went idle; live workers
+# rotate well before (segment age), so replay can safely take it over.
+ABANDONED_SEGMENT_AGE = 60
+
+
+class SpoolFull(Exception):
+    pass
+
+
+class WebhookSpool:
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        segment_bytes: int = DEFAULT_SPOOL_SEGMENT_BYTES,
+        max_bytes: int = DEFAULT_SPOOL_MAX_BYTES,
+        segment_age: float = DEFAULT_SPOOL_SEGMENT_AGE,
+    ):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.segment_age = segment_age
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._segment = None
+        self._segment_path: Path | None = None
+        self._segment_opened = 0.0
+        self._written = 0
+        self._synced = 0
+        self._total_bytes: int | None = None
+
+    def append(self, body: str, tenant_code: str = "", client_ip: str = "") -> None:
+        record = json.dumps(
+            {"body": body, "tenant_code": tenant_code, "client_ip": client_ip, "spooled_at": time.time()},
+            ensure_ascii=False,
+        )
+        line = (record + "\n").encode("utf-8")
+
+        with self._lock:
+            self._reserve(len(line))
+            if self._segment is None or self._segment.tell() >= self.segment_bytes or (
+                time.monotonic() - self._segment_opened >= self.segment_age
+            ):
+                self._rotate()
+            self._segment.write(line)
+            self._segment.flush()
+            self._written += 1
+            sequence = self._written
+
+        # Group commit: whoever gets the sync lock fsyncs every record written so far, so writers
+        # queued behind it find their record already durable and return without another fsync.
+        with self._sync_lock:
+            with self._lock:
+                if self._synced >= sequence:
+                    return
+                target = self._written
+                # A private descriptor keeps the fsync valid even if the segment is rotated meanwhile.
+                fd = os.dup(self._segment.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            with self._lock:
+                self._synced = max(self._synced, target)
+
+    def close(self) -> None:
+        with self._lock:
+            self._seal()
+
+    def sealed_segments(self) -> list[Path]:
+        if not self.directory.exists():
+            return []
+        segments = []
+        now = time.time()
+        for path in self.directory.iterdir():
+            if path.suffix == SEALED_SUFFIX:
+                segments.append(path)
+            elif path.suffix == OPEN_SUFFIX and path != self._segment_path:
+                try:
+                    if now - path.stat().st_mtime >= ABANDONED_SEGMENT_AGE:
+                        segments.append(path)
+                except FileNotFoundError:
+                    continue
+        return sorted(segments, key=lambda path: path.stem)
+
+    def _reserve(self, size: int) -> None:
+        if self._total_bytes is None or self._total_bytes + size > self.max_bytes:
+            # Replay runs in another process and shrinks the spool behind our back; recount before refusing.
+            self._total_bytes = self._directory_size()
+        if self._total_bytes + size > self.max_bytes:
+            raise SpoolFull(f"webhook spool {self.directory} is over {self.max_bytes} bytes")
+        self._total_bytes += size
+
+    def _directory_size(self) -> int:
+        if not self.directory.exists():
+            return 0
+        total = 0
+        for path in self.directory.iterdir():
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                continue
+        return total
+
+    def _rotate(self) -> None:
+        self._seal()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segment_path = self.directory / f"{time.time_ns():020d}-{os.getpid()}{OPEN_SUFFIX}"
+        self._segment = open(self._segment_path, "ab")
+        self._segment_opened = time.monotonic()
+        _fsync_directory(self.directory)
+
+    def _seal(self) -> None:
+        if self._segment is None:
+            return
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        self._segment.close()
+        self._synced = max(self._synced, self._written)
+        try:
+            os.replace(self._segment_path, self._segment_path.with_suffix(SEALED_SUFFIX))
+        except FileNotFoundError:
+            pass
+        self._segment = None
+        self._segment_path = None
+
+
+def _fsync_directory(directory: Path) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class DatabaseBreaker:
+    def __init__(self):
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def trip(self) -> None:
+        cooldown = getattr(settings, "HIK_WEBHOOK_SPOOL_COOLDOWN", DEFAULT_SPOOL_COOLDOWN)
+        with self._lock:
+            self._open_until = time.monotonic() + cooldown
+
+    def record(self, elapsed: float) -> None:
+        if elapsed > getattr(settings, "HIK_WEBHOOK_SPOOL_LATENCY_BUDGET", DEFAULT_SPOOL_LATENCY_BUDGET):
+            logger.warning("Webhook ingest over latency budget, spooling to disk", extra={"elapsed": elapsed})
+            self.trip()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._open_until = 0.0
+
+
+database_breaker = DatabaseBreaker()
+
+_spools: dict[str, WebhookSpool] = {}
+_spools_lock = threading.Lock()
+
+
+def get_webhook_spool() -> WebhookSpool | None:
+    directory = getattr(settings, "HIK_WEBHOOK_SPOOL_DIR", "")
+    if not directory:
+        return None
+    directory = str(directory)
+    with _spools_lock:
+        spool = _spools.get(directory)
+        if spool is None:
+            spool = WebhookSpool(
+                directory,
+                segment_bytes=getattr(settings, "HIK_WEBHOOK_SPOOL_SEGMENT_BYTES", DEFAULT_SPOOL_SEGMENT_BYTES),
+                max_bytes=getattr(settings, "HIK_WEBHOOK_SPOOL_MAX_BYTES", DEFAULT_SPOOL_MAX_BYTES),
+                segment_age=getattr(settings, "HIK_WEBHOOK_SPOOL_SEGMENT_AGE", DEFAULT_SPOOL_SEGMENT_AGE),
+            )
+            _spools[directory] = spool
+        return spool
+
+
+def _offset_path(segment: Path) -> Path:
+    return segment.with_name(segment.name + OFFSET_SUFFIX)
+
+
+def _load_offset(segment: Path) -> int:
+    try:
+        return int(_offset_path(segment).read_text() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _save_offset(segment: Path, offset: int) -> None:
+    target = _offset_path(segment)
+    staging = target.with_name(target.name + ".tmp")
+    staging.write_text(str(offset))
+    os.replace(staging, target)
+
+
+def _reject(spool: WebhookSpool, segment: Path, line: bytes, error: str) -> None:
+    logger.warning("Quarantining spool record", extra={"segment": segment.name, "error": error})
+    directory = spool.directory / REJECTED_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    record = {"segment": segment.name, "error": error, "record": line.decode("utf-8", errors="replace").rstrip("\n")}
+    with open(directory / f"{segment.stem}.jsonl", "a", encoding="utf-8") as rejected:
+        rejected.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _read_segment(spool: WebhookSpool, segment: Path, offset: int):
+    """Yield (offset after the record, (body, tenant_code) or None, raw line, error) from offset on.
+
+    Unreadable lines come with their error and no entry; they are quarantined once their batch commits.
+    """
+    max_record = getattr(settings, "HIK_WEBHOOK_SPOOL_MAX_RECORD_BYTES", DEFAULT_SPOOL_MAX_RECORD_BYTES)
+    with open(segment, "rb") as lines:
+        lines.seek(offset)
+        for line in lines:
+            offset += len(line)
+            if len(line) > max_record:
+                yield offset, None, line[:max_record], f"record over {max_record} bytes"
+                continue
+            try:
+                record = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+                # Usually a torn tail write from a crash; everything before it was fsynced intact.
+                yield offset, None, line, f"unreadable record: {exc}"
+                continue
+            if not isinstance(record, dict):
+                yield offset, None, line, "record is not an object"
+                continue
+            yield offset, (str(record.get("body") or ""), str(record.get("tenant_code") or "")), line, ""
+
+
+def _replay_batch(spool: WebhookSpool, segment: Path, batch: list) -> int:
+    readable = [index for index, (_, entry, _, _) in enumerate(batch) if entry is not None]
+    # Database errors propagate from here: the replay stops before the offset moves and the next
+    # run picks the batch up again. Only records that fail on their own data are quarantined.
+    failed = ingest_webhook_bodies([batch[index][1] for index in readable]) if readable else {}
+    errors = {readable[position]: error for position, error in failed.items()}
+    for index, (_, entry, line, error) in enumerate(batch):
+        if entry is None or index in errors:
+            _reject(spool, segment, line, error or errors[index])
+    # Committed: a replay interrupted after this point resumes behind the batch. Dying before it
+    # replays the batch again, which event-key dedupe absorbs.
+    _save_offset(segment, batch[-1][0])
+    return len(readable) - len(errors)
+
+
+def replay_spool(spool: WebhookSpool, batch_size: int = DEFAULT_SPOOL_REPLAY_BATCH_SIZE) -> int:
+    """Replay sealed segments into the database; raises, leaving the rest spooled, if the database fails."""
+    replayed = 0
+    for path in spool.sealed_segments():
+        batch = []
+        for item in _read_segment(spool, path, _load_offset(path)):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                replayed += _replay_batch(spool, path, batch)
+                batch = []
+        if batch:
+            replayed += _replay_batch(spool, path, batch)
+        path.unlink(missing_ok=True)
+        _offset_path(path).unlink(missing_ok=True)
+    return replayed
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from hik_gateway.client import drop_gateway_client
+from hik_gateway.models import Device, DeviceReaderConfig, Gateway, RawEvent
+from hik_gateway.services.device_resync import missing_device_backoff
+from hik_gateway.services.inventory_cache import inventory_cache
+from hik_gateway.services.resolution_cache import (
+    invalidate_device,
+    invalidate_gateway,
+    invalidate_reader_directions,
+    invalidate_tenant,
+    recent_event_keys,
+)
+from tenants.models import Tenant
+
+
+@receiver(post_delete, sender=Gateway)
+def drop_cached_gateway_client(sender, instance: Gateway, **kwargs) -> None:
+    drop_gateway_client(instance.id)
+
+
+@receiver(post_save, sender=Gateway)
+@receiver(post_delete, sender=Gateway)
+def invalidate_gateway_inventory(sender, instance: Gateway, **kwargs) -> None:
+    inventory_cache.invalidate(instance.id)
+    invalidate_gateway(instance)
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_tenant_resolution(sender, instance: Tenant, **kwargs) -> None:
+    invalidate_tenant(instance)
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_device_resolution(sender, instance: Device, **kwargs) -> None:
+    invalidate_device(instance)
+    invalidate_reader_directions(instance.id)
+    missing_device_backoff.forget(instance.dev_index)
+
+
+@receiver(post_save, sender=DeviceReaderConfig)
+@receiver(post_delete, sender=DeviceReaderConfig)
+def invalidate_reader_direction_map(sender, instance: DeviceReaderConfig, **kwargs) -> None:
+    invalidate_reader_directions(instance.device_id)
+
+
+@receiver(post_delete, sender=RawEvent)
+def forget_recent_event_key(sender, instance: RawEvent, **kwargs) -> None:
+    recent_event_keys.discard(bytes(instance.event_key))
@@ -1,13 +1,64 @@
-from io import StringIO
-from unittest.mock import patch
-
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest.mock import Mock, PropertyMock, patch
+
+import httpx
+import requests
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.management import call_command
 from django.core.management.base import CommandError
+from django.core.signals import request_started
+from django.db import OperationalError, close_old_connections, connection
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from hik_gateway.models import AttendanceLog, Device, Gateway, RawEvent
+from hik_gateway.async_client import AsyncHikGatewayClient
+from hik_gateway.client import HikGatewayClient, PreemptiveDigestAuth, _clients, get_gateway_client
+from hik_gateway.event_keys import set_aside_event_key, stored_event_key
+from hik_gateway.fast_lane import WebhookFastLaneWSGI
+from hik_gateway.models import (
+    AttendanceLog,
+    Device,
+    DeviceCursor,
+    DeviceReaderConfig,
+    Gateway,
+    InboxEvent,
+    PendingEvent,
+    RawEvent,
+    SerialGap,
+)
+from hik_gateway.services.alert_stream import AlertStreamConsumer
+from hik_gateway.services.backfill import plan_windows
+from hik_gateway.services.catchup import CatchupReport, catchup_device, catchup_device_report, catchup_serial_gaps
+from hik_gateway.services.catchup_scheduler import CatchupScheduler, poll_interval
+from hik_gateway.services.device_resync import (
+    _queued_gateways,
+    _resync_in_background,
+    missing_device_backoff,
+    resync_gateway,
+    schedule_device_resync,
+)
+from hik_gateway.services.event_classifier import heartbeat_touches, touch_device_heartbeat
+from hik_gateway.services.inventory_cache import InventoryCache
+from hik_gateway.services.picture_store import picture_path
+from hik_gateway.services.resolution_cache import MISSING, device_cache, recent_event_keys
+from hik_gateway.services.webhook_inbox import drain_inbox
+from hik_gateway.services.webhook_ingest import _build_event, _insert_raw_events, ingest_acs_events
+from hik_gateway.services.webhook_spool import database_breaker, get_webhook_spool, replay_spool
+from hik_gateway.views import _inventory_cache_key, hik_event_webhook_async
 from tenants.models import Tenant
 
 
@@ -105,6 +156,54 @@ class HikWebhookTenantRoutingTests(APITestCase):
         self.assertEqual(RawEvent.objects.count(), 1)
         self.assertEqual(AttendanceLog.objects.count(), 1)
 
+    def test_repeated_webhooks_resolve_tenant_and_device_from_cache(self):
+        def post(serial_no):
+            payload = {
+                "EventNotificationAlert": {
+                    "eventType": "AccessControllerEvent",
+                    "devIndex": "shared-dev-index",
+                    "dateTime": "2026-02-01T08:00:00Z",
+                    "AccessControllerEvent": {"attendanceStatus": "checkin", "employeeNoString": "E1003", "serialNo": serial_no, "subEventType": 1},
+                }
+            }
+            return self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="tenant-a")
+
+        post("200")
+        with CaptureQueriesContext(connection) as queries:
+            response = post("201")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        selects = [query["sql"] for query in queries if query["sql"].startswith("SELECT")]
+        self.assertFalse([sql for sql in selects if '"tenants_tenant"' in sql or '"hik_gateway_device"' in sql])
+
+        self.device_a.status = "offline"
+        self.device_a.save()
+        self.assertIs(device_cache.get((self.tenant_a.id, "shared-dev-index")), MISSING)
+
+    def test_reader_direction_map_is_loaded_once_and_invalidated_on_change(self):
+        reader = DeviceReaderConfig.objects.create(device=self.device_a, door_no=1, card_reader_no=2, direction_default="OUT")
+
+        def post(serial_no):
+            payload = {
+                "EventNotificationAlert": {
+                    "eventType": "AccessControllerEvent",
+                    "devIndex": "shared-dev-index",
+                    "dateTime": "2026-02-01T08:00:00Z",
+                    "AccessControllerEvent": {"employeeNoString": "E1004", "serialNo": serial_no, "subEventType": 1, "doorNo": 1, "cardReaderNo": 2},
+                }
+            }
+            self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="tenant-a")
+            return AttendanceLog.objects.latest("id").direction
+
+        self.assertEqual(post("300"), "OUT")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(post("301"), "OUT")
+        self.assertFalse([query for query in queries if "hik_gateway_devicereaderconfig" in query["sql"]])
+
+        reader.direction_default = "IN"
+        reader.save()
+        self.assertEqual(post("302"), "IN")
+
     def test_webhook_rejects_unknown_tenant_code(self):
         payload = {
             "EventNotificationAlert": {
@@ -133,6 +232,1214 @@ class HikWebhookTenantRoutingTests(APITestCase):
         self.assertEqual(AttendanceLog.objects.count(), 0)
 
 
+class HikWebhookUnknownDeviceTests(APITestCase):
+    def setUp(self):
+        missing_device_backoff.clear()
+        _queued_gateways.clear()
+        self.addCleanup(_queued_gateways.clear)
+        self.tenant = Tenant.objects.create(name="Tenant New", code="tenant-new")
+        self.gateway = Gateway.objects.create(
+            tenant=self.tenant,
+            base_url="https://gw-new.local",
+            username="admin",
+            password="pass",
+        )
+
+    def _post_event(self, serial_no):
+        payload = {
+            "EventNotificationAlert": {
+                "eventType": "AccessControllerEvent",
+                "devIndex": "IDX-NEW",
+                "dateTime": "2026-02-01T08:00:00Z",
+                "AccessControllerEvent": {"attendanceStatus": "checkin", "employeeNoString": "E2001", "serialNo": serial_no, "subEventType": 1},
+            }
+        }
+        return self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="tenant-new")
+
+    @patch("hik_gateway.services.device_resync._resync_in_background")
+    def test_unknown_device_events_are_parked_and_resync_is_deferred_once(self, mock_resync):
+        first = self._post_event("1")
+        second = self._post_event("2")
+
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(PendingEvent.objects.filter(dev_index="IDX-NEW").count(), 2)
+        self.assertEqual(RawEvent.objects.count(), 0)
+        self.assertEqual(mock_resync.call_count, 1)
+
+    @patch("hik_gateway.services.device_resync._executor")
+    def test_queued_resyncs_are_not_submitted_again_for_the_same_gateway(self, mock_executor):
+        other = Gateway.objects.create(tenant=self.tenant, base_url="https://gw-new-2.local", username="admin", password="pass")
+
+        for dev_index in ("IDX-NEW-1", "IDX-NEW-2", "IDX-NEW-3"):
+            self.assertTrue(schedule_device_resync(dev_index, tenant_id=self.tenant.id))
+
+        submitted = [call.args[1].id for call in mock_executor.submit.call_args_list]
+        self.assertEqual(sorted(submitted), sorted([self.gateway.id, other.id]))
+
+        # Once its job has run, the gateway can be queued again.
+        with patch("hik_gateway.services.device_resync.resync_gateway"):
+            _resync_in_background(self.gateway)
+        schedule_device_resync("IDX-NEW-4", tenant_id=self.tenant.id)
+        self.assertEqual(mock_executor.submit.call_count, 3)
+
+    @patch("hik_gateway.services.device_resync._resync_in_background")
+    @patch("hik_gateway.client.HikGatewayClient.device_list")
+    def test_resync_attaches_parked_events_once_device_is_found(self, mock_device_list, mock_resync):
+        self._post_event("1")
+        mock_device_list.return_value = {
+            "SearchResult": {
+                "numOfMatches": 1,
+                "totalMatches": 1,
+                "MatchList": [{"Device": {"EhomeParams": {"EhomeID": "SN-NEW"}, "devIndex": "IDX-NEW", "devStatus": "online"}}],
+            }
+        }
+
+        attached = resync_gateway(self.gateway)
+
+        self.assertEqual(attached, 1)
+        self.assertFalse(PendingEvent.objects.exists())
+        raw_event = RawEvent.objects.get()
+        self.assertEqual(raw_event.device.serial_number, "SN-NEW")
+        self.assertEqual(AttendanceLog.objects.count(), 1)
+
+
+class IngestEventsBatchTests(APITestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Tenant Batch", code="tenant-batch")
+        self.gateway = Gateway.objects.create(
+            tenant=self.tenant,
+            base_url="https://gw-batch.local",
+            username="admin",
+            password="pass",
+        )
+        self.device = Device.objects.create(
+            gateway=self.gateway,
+            tenant=self.tenant,
+            serial_number="SN-BATCH",
+            dev_index="IDX-BATCH",
+            status="online",
+        )
+
+    def _acs_event(self, serial_no, sub_event_type=1):
+        return {
+            "time": "2026-02-01T08:00:00Z",
+            "employeeNoString": "E3001",
+            "serialNo": serial_no,
+            "subEventType": sub_event_type,
+            "attendanceStatus": "checkin" if sub_event_type == 1 else "",
+        }
+
+    def test_batch_ingest_reports_per_event_outcomes(self):
+        ingest_acs_events(self.device, [self._acs_event(1)])
+
+        with self.assertNumQueries(7):
+            outcomes = ingest_acs_events(
+                self.device,
+                [self._acs_event(1), self._acs_event(2), self._acs_event(2), self._acs_event(3, sub_event_type=3)],
+            )
+
+        self.assertEqual([outcome.status for outcome in outcomes], ["duplicate", "created", "created", "created"])
+        self.assertTrue(outcomes[0].has_attendance)
+        self.assertIs(outcomes[1], outcomes[2])
+        self.assertFalse(outcomes[3].has_attendance)
+        self.assertEqual(RawEvent.objects.count(), 3)
+        self.assertEqual(AttendanceLog.objects.count(), 2)
+
+    def test_insert_without_returning_only_reports_rows_it_inserted(self):
+        ingest_acs_events(self.device, [self._acs_event(40)])
+
+        def build(serial_no):
+            payload = {"EventNotificationAlert": {"devIndex": "IDX-BATCH", "AccessControllerEvent": self._acs_event(serial_no)}}
+            return _build_event(self.device, payload, AttendanceLog.SOURCE_CATCHUP)[0]
+
+        features = type(connection.features)
+        with patch.object(features, "can_return_rows_from_bulk_insert", new_callable=PropertyMock, return_value=False):
+            # A row stored by a concurrent request between the caller's lookup and the insert.
+            inserted = _insert_raw_events([build(40), build(41)])
+            outcomes = ingest_acs_events(self.device, [self._acs_event(41), self._acs_event(42)])
+
+        self.assertEqual(list(inserted), [build(41).event_key])
+        self.assertEqual([outcome.status for outcome in outcomes], ["duplicate", "created"])
+        self.assertEqual(RawEvent.objects.count(), 3)
+        self.assertEqual(AttendanceLog.objects.count(), 2)
+
+    def test_recently_committed_events_are_recognised_without_queries(self):
+        self.addCleanup(recent_event_keys.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            created = ingest_acs_events(self.device, [self._acs_event(20), self._acs_event(21, sub_event_type=3)])
+
+        with self.assertNumQueries(2):
+            duplicates = ingest_acs_events(self.device, [self._acs_event(20), self._acs_event(21, sub_event_type=3)])
+
+        self.assertEqual([outcome.status for outcome in duplicates], ["duplicate", "duplicate"])
+        self.assertEqual([outcome.raw_event_id for outcome in duplicates], [outcome.raw_event_id for outcome in created])
+        self.assertEqual([outcome.has_attendance for outcome in duplicates], [True, False])
+
+    def test_duplicate_webhook_returns_existing_rows(self):
+        payload = {
+            "EventNotificationAlert": {
+                "eventType": "AccessControllerEvent",
+                "devIndex": "IDX-BATCH",
+                "dateTime": "2026-02-01T08:00:00Z",
+                "AccessControllerEvent": self._acs_event(30),
+            }
+        }
+
+        first = self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="tenant-batch")
+        second = self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="tenant-batch")
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(RawEvent.objects.count(), 1)
+
+    def test_catchup_recognises_realtime_event_sent_with_another_utc_offset(self):
+        payload = {
+            "EventNotificationAlert": {
+                "eventType": "AccessControllerEvent",
+                "devIndex": "IDX-BATCH",
+                "dateTime": "2026-02-01T09:00:00+01:00",
+                "AccessControllerEvent": {"employeeNoString": "E3001", "serialNo": 40, "subEventType": 1},
+            }
+        }
+        self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="tenant-batch")
+
+        outcomes = ingest_acs_events(self.device, [{"time": "2026-02-01T08:00:00Z", "serialNo": 40, "subEventType": 1}])
+
+        self.assertEqual(outcomes[0].status, "duplicate")
+        self.assertEqual(RawEvent.objects.count(), 1)
+        self.assertEqual(len(bytes(RawEvent.objects.get().event_key)), 16)
+
+    def test_backfilled_key_matches_ingestion_for_unparseable_timestamps(self):
+        ingest_acs_events(self.device, [{"time": "not a date", "serialNo": 50, "subEventType": 1}, self._acs_event(51)])
+
+        for raw_event in RawEvent.objects.all():
+            self.assertEqual(stored_event_key(raw_event), bytes(raw_event.event_key))
+
+    def test_purge_command_removes_only_set_aside_duplicates(self):
+        ingest_acs_events(self.device, [self._acs_event(60), self._acs_event(61)])
+        duplicate = RawEvent.objects.get(serial_no=61)
+        duplicate.event_key = set_aside_event_key(duplicate.event_key, duplicate.id)
+        duplicate.save(update_fields=["event_key"])
+
+        dry_run = StringIO()
+        call_command("hik_purge_duplicate_events", stdout=dry_run)
+        self.assertIn("Found 1 duplicate raw events", dry_run.getvalue())
+        self.assertEqual(RawEvent.objects.count(), 2)
+
+        call_command("hik_purge_duplicate_events", "--delete", stdout=StringIO())
+        self.assertEqual(list(RawEvent.objects.values_list("serial_no", flat=True)), [60])
+        self.assertEqual(AttendanceLog.objects.count(), 1)
+
+    @patch("hik_gateway.client.HikGatewayClient.acs_event_search")
+    def test_catchup_device_ingests_pages_in_bulk(self, mock_search):
+        mock_search.return_value = {"totalMatches": 2, "InfoList": [self._acs_event(10), self._acs_event(11)]}
+
+        processed = catchup_device(self.device, max_results=50)
+
+        self.assertEqual(processed, 2)
+        self.assertEqual(DeviceCursor.objects.get(device=self.device).last_serial_no, 11)
+        self.assertEqual(RawEvent.objects.filter(device=self.device).count(), 2)
+
+
+@override_settings(HIK_WEBHOOK_INBOX=True)
+class HikWebhookInboxTests(APITestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Tenant Inbox", code="tenant-inbox")
+        self.gateway = Gateway.objects.create(
+            tenant=self.tenant,
+            base_url="https://gw-inbox.local",
+            username="admin",
+            password="pass",
+        )
+        self.device = Device.objects.create(
+            gateway=self.gateway,
+            tenant=self.tenant,
+            serial_number="SN-INBOX",
+            dev_index="IDX-INBOX",
+            status="online",
+        )
+
+    def _payload(self, serial_no):
+        return {
+            "EventNotificationAlert": {
+                "eventType": "AccessControllerEvent",
+                "devIndex": "IDX-INBOX",
+                "dateTime": "2026-02-01T08:00:00Z",
+                "AccessControllerEvent": {"employeeNoString": "E4001", "serialNo": serial_no, "subEventType": 1},
+            }
+        }
+
+    def test_webhook_is_queued_without_ingesting(self):
+        response = self.client.post("/api/hik/events", self._payload(1), format="json", HTTP_X_TENANT_CODE="tenant-inbox")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()["status"], "queued")
+        inbox_event = InboxEvent.objects.get()
+        self.assertEqual(inbox_event.tenant_code, "tenant-inbox")
+        self.assertEqual(RawEvent.objects.count(), 0)
+
+    def test_drain_command_ingests_queued_events(self):
+        for serial_no in (1, 2, 2):
+            self.client.post("/api/hik/events", self._payload(serial_no), format="json", HTTP_X_TENANT_CODE="tenant-inbox")
+        self.client.post("/api/hik/events", "not json", content_type="application/json")
+        self.client.post("/api/hik/events", self._payload(3), format="json", HTTP_X_TENANT_CODE="unknown-tenant")
+
+        out = StringIO()
+        call_command("hik_drain_webhook_inbox", "--once", "--batch-size", "2", stdout=out)
+
+        self.assertIn("Drained 5 inbox events", out.getvalue())
+        self.assertFalse(InboxEvent.objects.exists())
+        self.assertEqual(sorted(RawEvent.objects.values_list("serial_no", flat=True)), [1, 2])
+        self.assertEqual(AttendanceLog.objects.filter(source=AttendanceLog.SOURCE_REALTIME).count(), 2)
+
+    def test_malformed_body_is_dead_lettered_without_blocking_the_batch(self):
+        InboxEvent.objects.create(tenant_code="tenant-inbox", body=json.dumps({"EventNotificationAlert": "oops"}))
+        InboxEvent.objects.create(tenant_code="tenant-inbox", body=json.dumps(self._payload(7)))
+
+        self.assertEqual(drain_inbox(), 2)
+        self.assertEqual(drain_inbox(), 0)
+
+        self.assertEqual(list(RawEvent.objects.values_list("serial_no", flat=True)), [7])
+        bad = InboxEvent.objects.get()
+        self.assertEqual(bad.body, json.dumps({"EventNotificationAlert": "oops"}))
+        self.assertIsNotNone(bad.failed_at)
+        self.assertIn("AttributeError", bad.error)
+
+
+    def test_database_errors_roll_back_instead_of_dead_lettering(self):
+        InboxEvent.objects.create(tenant_code="tenant-inbox", body=json.dumps(self._payload(8)))
+
+        with patch("hik_gateway.services.webhook_inbox.ingest_events", side_effect=OperationalError("deadlock detected")):
+            with self.assertRaises(OperationalError):
+                drain_inbox()
+
+        inbox_event = InboxEvent.objects.get()
+        self.assertIsNone(inbox_event.failed_at)
+        self.assertEqual(inbox_event.error, "")
+
+    def test_retry_failed_requeues_dead_lettered_events(self):
+        InboxEvent.objects.create(tenant_code="tenant-inbox", body=json.dumps(self._payload(9)), failed_at=timezone.now(), error="boom")
+
+        out = StringIO()
+        call_command("hik_drain_webhook_inbox", "--once", stdout=out)
+        self.assertTrue(InboxEvent.objects.exists())
+        call_command("hik_drain_webhook_inbox", "--once", "--retry-failed", stdout=out)
+
+        self.assertIn("Requeued 1 dead-lettered inbox events", out.getvalue())
+        self.assertFalse(InboxEvent.objects.exists())
+        self.assertEqual(list(RawEvent.objects.values_list("serial_no", flat=True)), [9])
+
+
+class HikWebhookSpoolTests(APITestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Tenant Spool", code="tenant-spool")
+        self.gateway = Gateway.objects.create(
+            tenant=self.tenant,
+            base_url="https://gw-spool.local",
+            username="admin",
+            password="pass",
+        )
+        Device.objects.create(
+            gateway=self.gateway,
+            tenant=self.tenant,
+            serial_number="SN-SPOOL",
+            dev_index="IDX-SPOOL",
+            status="online",
+        )
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        settings_override = override_settings(HIK_WEBHOOK_SPOOL_DIR=spool_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(database_breaker.reset)
+
+    def _post(self, serial_no):
+        payload = {
+            "EventNotificationAlert": {
+                "eventType": "AccessControllerEvent",
+                "devIndex": "IDX-SPOOL",
+                "dateTime": "2026-02-01T08:00:00Z",
+                "AccessControllerEvent": {"employeeNoString": "E5001", "serialNo": serial_no, "subEventType": 1},
+            }
+        }
+        return self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="tenant-spool")
+
+    def test_events_are_spooled_while_database_is_down_and_replayed_once(self):
+        with patch("hik_gateway.views.ingest_event", side_effect=OperationalError("db down")) as mock_ingest:
+            first = self._post(1)
+            second = self._post(2)
+
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.json()["status"], "spooled")
+        self.assertEqual(mock_ingest.call_count, 1)
+        self.assertEqual(RawEvent.objects.count(), 0)
+
+        get_webhook_spool().close()
+        out = StringIO()
+        call_command("hik_replay_webhook_spool", stdout=out)
+        call_command("hik_replay_webhook_spool", stdout=StringIO())
+
+        self.assertIn("Replayed 2 spooled events", out.getvalue())
+        self.assertEqual(sorted(RawEvent.objects.values_list("serial_no", flat=True)), [1, 2])
+        self.assertEqual(get_webhook_spool().sealed_segments(), [])
+
+    @override_settings(HIK_WEBHOOK_SPOOL_MAX_RECORD_BYTES=2048)
+    def test_bad_records_are_quarantined_and_replay_resumes_from_its_offset(self):
+        def record(serial_no):
+            payload = {
+                "EventNotificationAlert": {
+                    "eventType": "AccessControllerEvent",
+                    "devIndex": "IDX-SPOOL",
+                    "dateTime": "2026-02-01T08:00:00Z",
+                    "AccessControllerEvent": {"employeeNoString": "E5001", "serialNo": serial_no, "subEventType": 1},
+                }
+            }
+            return json.dumps({"body": json.dumps(payload), "tenant_code": "tenant-spool"}).encode() + b"\n"
+
+        spool = get_webhook_spool()
+        spool.directory.mkdir(parents=True, exist_ok=True)
+        segment = spool.directory / "00000000000000000001-1.seg"
+        lines = [
+            record(1),
+            record(2),
+            b'{"body": "{\\"EventNotificationAlert\\": \\"oops\\"}", "tenant_code": "tenant-spool"}\n',
+            b"not json\n",
+            json.dumps({"body": "x" * 4096}).encode() + b"\n",
+            record(3),
+        ]
+        segment.write_bytes(b"".join(lines))
+        # A previous replay committed the first record before it died.
+        segment.with_name(segment.name + ".offset").write_text(str(len(lines[0])))
+
+        self.assertEqual(replay_spool(spool, batch_size=2), 2)
+
+        self.assertEqual(sorted(RawEvent.objects.values_list("serial_no", flat=True)), [2, 3])
+        self.assertFalse(segment.exists())
+        self.assertEqual(spool.sealed_segments(), [])
+        rejected = [json.loads(line) for line in (spool.directory / "rejected" / f"{segment.stem}.jsonl").read_text().splitlines()]
+        self.assertEqual(len(rejected), 3)
+        self.assertIn("AttributeError", rejected[0]["error"])
+        self.assertIn("unreadable record", rejected[1]["error"])
+        self.assertIn("over 2048 bytes", rejected[2]["error"])
+
+    def test_replay_stops_without_quarantining_while_the_database_is_down(self):
+        spool = get_webhook_spool()
+        for serial_no in (1, 2, 3):
+            payload = {
+                "EventNotificationAlert": {
+                    "eventType": "AccessControllerEvent",
+                    "devIndex": "IDX-SPOOL",
+                    "dateTime": "2026-02-01T08:00:00Z",
+                    "AccessControllerEvent": {"employeeNoString": "E5001", "serialNo": serial_no, "subEventType": 1},
+                }
+            }
+            spool.append(json.dumps(payload), "tenant-spool")
+        spool.close()
+        segment = spool.sealed_segments()[0]
+
+        with patch("hik_gateway.services.webhook_inbox.ingest_events", side_effect=OperationalError("server closed the connection")):
+            with self.assertRaises(CommandError):
+                call_command("hik_replay_webhook_spool", "--batch-size", "2", stdout=StringIO())
+
+        self.assertTrue(segment.exists())
+        self.assertFalse((spool.directory / "rejected").exists())
+        self.assertFalse(segment.with_name(segment.name + ".offset").exists())
+
+        self.assertEqual(replay_spool(spool), 3)
+        self.assertEqual(sorted(RawEvent.objects.values_list("serial_no", flat=True)), [1, 2, 3])
+
+    def test_full_spool_rejects_with_503(self):
+        database_breaker.trip()
+        with self.settings(HIK_WEBHOOK_SPOOL_DIR=tempfile.mkdtemp(dir=settings.HIK_WEBHOOK_SPOOL_DIR), HIK_WEBHOOK_SPOOL_MAX_BYTES=64):
+            response = self._post(1)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class HikWebhookAsyncViewTests(APITestCase):
+    def setUp(self):
+        self.addCleanup(_queued_gateways.clear)
+        self.tenant = Tenant.objects.create(name="Tenant Async", code="tenant-async")
+        self.gateway = Gateway.objects.create(
+            tenant=self.tenant,
+            base_url="https://gw-async.local",
+            username="admin",
+            password="pass",
+        )
+        self.device = Device.objects.create(
+            gateway=self.gateway,
+            tenant=self.tenant,
+            serial_number="SN-ASYNC",
+            dev_index="IDX-ASYNC",
+            status="online",
+        )
+        DeviceReaderConfig.objects.create(device=self.device, door_no=1, card_reader_no=2, direction_default="OUT")
+
+    async def _post(self, dev_index, serial_no, tenant_code="tenant-async"):
+        payload = {
+            "EventNotificationAlert": {
+                "eventType": "AccessControllerEvent",
+                "devIndex": dev_index,
+                "dateTime": "2026-02-01T08:00:00Z",
+                "AccessControllerEvent": {
+                    "employeeNoString": "E6001",
+                    "serialNo": serial_no,
+                    "subEventType": 1,
+                    "doorNo": 1,
+                    "cardReaderNo": 2,
+                },
+            }
+        }
+        request = AsyncRequestFactory().post(
+            "/api/hik/events", payload, content_type="application/json", headers={"X-Tenant-Code": tenant_code}
+        )
+        return await hik_event_webhook_async(request)
+
+    async def test_async_webhook_ingests_and_recognises_duplicates(self):
+        first = await self._post("IDX-ASYNC", 1)
+        second = await self._post("IDX-ASYNC", 1)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(second.content)["raw_event_id"], json.loads(first.content)["raw_event_id"])
+        self.assertEqual(await RawEvent.objects.acount(), 1)
+        attendance = await AttendanceLog.objects.aget()
+        self.assertEqual(attendance.direction, "OUT")
+
+    @patch("hik_gateway.services.device_resync._resync_in_background")
+    async def test_async_webhook_rejects_unknown_tenant_and_parks_unknown_devices(self, mock_resync):
+        unknown_tenant = await self._post("IDX-ASYNC", 2, tenant_code="missing")
+        unknown_device = await self._post("IDX-MISSING", 3)
+
+        self.assertEqual(unknown_tenant.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(unknown_device.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(await PendingEvent.objects.filter(dev_index="IDX-MISSING").aexists())
+
+
+class HikWebhookFastLaneTests(APITestCase):
+    def setUp(self):
+        # Like the test client, keep the handler from closing the test transaction's connection.
+        request_started.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+
+        self.tenant = Tenant.objects.create(name="Tenant Fast", code="tenant-fast")
+        self.gateway = Gateway.objects.create(
+            tenant=self.tenant,
+            base_url="https://gw-fast.local",
+            username="admin",
+            password="pass",
+        )
+        Device.objects.create(
+            gateway=self.gateway,
+            tenant=self.tenant,
+            serial_number="SN-FAST",
+            dev_index="IDX-FAST",
+            status="online",
+        )
+
+    def _call(self, application, path):
+        body = json.dumps(
+            {
+                "EventNotificationAlert": {
+                    "eventType": "AccessControllerEvent",
+                    "devIndex": "IDX-FAST",
+                    "dateTime": "2026-02-01T08:00:00Z",
+                    "AccessControllerEvent": {"employeeNoString": "E7001", "serialNo": 1, "subEventType": 1},
+                }
+            }
+        ).encode("utf-8")
+        environ = {
+            "REQUEST_METHOD": "POST",
+            "PATH_INFO": path,
+            "SCRIPT_NAME": "",
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "REMOTE_ADDR": "127.0.0.1",
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "HTTP_X_TENANT_CODE": "tenant-fast",
+            "wsgi.input": BytesIO(body),
+            "wsgi.url_scheme": "http",
+        }
+        started = {}
+
+        def start_response(status_line, headers, exc_info=None):
+            started["status"] = status_line
+            started["headers"] = dict(headers)
+
+        with self.settings(ALLOWED_HOSTS=["localhost"]):
+            response = application(environ, start_response)
+            content = b"".join(response)
+            if hasattr(response, "close"):
+                response.close()
+        return started, content
+
+    def test_webhook_paths_skip_the_middleware_stack(self):
+        inner = Mock()
+        application = WebhookFastLaneWSGI(inner)
+
+        started, content = self._call(application, "/api/hikvision/events")
+
+        self.assertEqual(started["status"], "201 Created")
+        self.assertNotIn("X-Frame-Options", started["headers"])
+        self.assertEqual(json.loads(content)["raw_event_id"], RawEvent.objects.get().id)
+        inner.assert_not_called()
+
+    def test_other_paths_go_to_the_wrapped_application(self):
+        inner = Mock(return_value=[b"ok"])
+        application = WebhookFastLaneWSGI(inner)
+
+        self._call(application, "/api/hik/devices")
+
+        inner.assert_called_once()
+
+    def test_bench_command_reports_saved_overhead(self):
+        out = StringIO()
+        call_command("hik_bench_webhook", "--requests", "3", stdout=out)
+
+        self.assertIn("fast lane:", out.getvalue())
+        self.assertIn("saved", out.getvalue())
+
+
+class HikWebhookPreClassifierTests(APITestCase):
+    def setUp(self):
+        self.addCleanup(heartbeat_touches.clear)
+        self.tenant = Tenant.objects.create(name="Tenant Beat", code="tenant-beat")
+        self.gateway = Gateway.objects.create(
+            tenant=self.tenant,
+            base_url="https://gw-beat.local",
+            username="admin",
+            password="pass",
+        )
+        self.device = Device.objects.create(
+            gateway=self.gateway,
+            tenant=self.tenant,
+            serial_number="SN-BEAT",
+            dev_index="IDX-BEAT",
+            status="online",
+        )
+
+    def test_heartbeats_touch_device_liveness_at_most_once_per_interval(self):
+        payload = {"EventNotificationAlert": {"eventType": "heartBeat", "devIndex": "IDX-BEAT", "eventState": "active"}}
+
+        with self.assertNumQueries(1):
+            first = self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="tenant-beat")
+        with self.assertNumQueries(0):
+            second = self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="tenant-beat")
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.json()["status"], "alive")
+        self.device.refresh_from_db()
+        self.assertIsNotNone(self.device.last_seen_at)
+
+    def test_failed_heartbeat_touch_is_not_throttled(self):
+        with patch("django.db.models.QuerySet.update", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                touch_device_heartbeat("IDX-BEAT", "tenant-beat")
+        touch_device_heartbeat("IDX-BEAT", "tenant-beat")
+
+        self.device.refresh_from_db()
+        self.assertIsNotNone(self.device.last_seen_at)
+
+    def test_non_access_events_are_discarded_before_parsing(self):
+        payload = {
+            "EventNotificationAlert": {
+                "eventType": "VMD",
+                "devIndex": "IDX-BEAT",
+                "AccessControllerEvent": {"serialNo": 1},
+            }
+        }
+
+        with self.assertNumQueries(0), self.assertNoLogs("hik_gateway.views", level="INFO"):
+            response = self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="unknown-tenant")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()["status"], "ignored")
+        self.assertEqual(RawEvent.objects.count(), 0)
+
+
+class HikWebhookMultipartTests(APITestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Tenant Face", code="tenant-face")
+        self.gateway = Gateway.objects.create(
+            tenant=self.tenant,
+            base_url="https://gw-face.local",
+            username="admin",
+            password="pass",
+        )
+        Device.objects.create(
+            gateway=self.gateway,
+            tenant=self.tenant,
+            serial_number="SN-FACE",
+            dev_index="IDX-FACE",
+            status="online",
+        )
+        picture_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(picture_dir.cleanup)
+        self.picture_dir = picture_dir.name
+        settings_override = override_settings(HIK_PICTURE_DIR=self.picture_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _post(self, event_type, serial_no):
+        event_log = {
+            "EventNotificationAlert": {
+                "eventType": event_type,
+                "devIndex": "IDX-FACE",
+                "dateTime": "2026-02-01T08:00:00Z",
+                "AccessControllerEvent": {"employeeNoString": "E8001", "serialNo": serial_no, "subEventType": 75},
+            }
+        }
+        picture = SimpleUploadedFile("face.jpg", b"\xff\xd8" + b"x" * 200_000, content_type="image/jpeg")
+        return self.client.post(
+            "/api/hik/events",
+            {"event_log": json.dumps(event_log), "Picture": picture},
+            format="multipart",
+            HTTP_X_TENANT_CODE="tenant-face",
+        )
+
+    def _stored_files(self):
+        return sorted(path.name for path in Path(self.picture_dir).rglob("*") if path.is_file())
+
+    def test_pictures_are_stored_once_by_content_and_referenced_from_the_event(self):
+        first = self._post("AccessControllerEvent", 1)
+        second = self._post("AccessControllerEvent", 2)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        stored = self._stored_files()
+        self.assertEqual(len(stored), 1)
+        self.assertTrue(stored[0].endswith(".jpg"))
+        picture_refs = set(RawEvent.objects.values_list("picture_ref", flat=True))
+        self.assertEqual(len(picture_refs), 1)
+        self.assertTrue((Path(self.picture_dir) / picture_refs.pop()).is_file())
+
+    def test_picture_refs_not_minted_by_the_store_are_dropped(self):
+        digest = "ab" * 32
+        forged_refs = ["../../config/settings.py", "/etc/passwd", f"cd/ef/{digest}.jpg", f"ab/ab/{digest}/../x"]
+        for serial_no, picture_ref in enumerate(forged_refs, start=1):
+            payload = {
+                "EventNotificationAlert": {
+                    "eventType": "AccessControllerEvent",
+                    "devIndex": "IDX-FACE",
+                    "dateTime": "2026-02-01T08:00:00Z",
+                    "pictureRef": picture_ref,
+                    "AccessControllerEvent": {"employeeNoString": "E8001", "serialNo": serial_no, "subEventType": 75},
+                }
+            }
+            with self.assertLogs("hik_gateway.services.webhook_ingest", level="WARNING"):
+                response = self.client.post("/api/hik/events", payload, format="json", HTTP_X_TENANT_CODE="tenant-face")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(set(RawEvent.objects.values_list("picture_ref", flat=True)), {""})
+        with self.assertRaises(ValueError):
+            picture_path("../../config/settings.py")
+        self.assertEqual(picture_path(f"ab/ab/{digest}.jpg"), Path(self.picture_dir) / f"ab/ab/{digest}.jpg")
+
+    def test_pictures_of_discarded_events_are_not_kept(self):
+        response = self._post("VMD", 1)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self._stored_files(), [])
+
+
+class AlertStreamConsumerTests(APITestCase):
+    def setUp(self):
+        self.addCleanup(heartbeat_touches.clear)
+        self.tenant = Tenant.objects.create(name="Tenant Stream", code="tenant-stream")
+        self.gateway = Gateway.objects.create(
+            tenant=self.tenant,
+            base_url="https://gw-stream.local",
+            username="admin",
+            password="pass",
+        )
+        self.device = Device.objects.create(
+            gateway=self.gateway,
+            tenant=self.tenant,
+            serial_number="SN-STREAM",
+            dev_index="IDX-STREAM",
+            status="online",
+        )
+
+    def _stream(self, *parts):
+        body = b""
+        for content_type, part in parts:
+            body += b"--MIME_boundary\r\nContent-Type: " + content_type + b"\r\n"
+            body += b"Content-Length: " + str(len(part)).encode() + b"\r\n\r\n" + part + b"\r\n"
+        response = Mock()
+        response.headers = {"Content-Type": "multipart/mixed; boundary=MIME_boundary"}
+        response.iter_content.return_value = [body[start : start + 7] for start in range(0, len(body), 7)]
+        return response
+
+    def _access_event(self, serial_no, minute):
+        return json.dumps(
+            {
+                "eventType": "AccessControllerEvent",
+                "devIndex": "IDX-STREAM",
+                "dateTime": f"2026-02-01T08:{minute:02d}:00Z",
+                "AccessControllerEvent": {"employeeNoString": "E9001", "serialNo": serial_no, "subEventType": 1},
+            }
+        ).encode()
+
+    @patch("hik_gateway.client.HikGatewayClient.alert_stream")
+    def test_stream_parts_are_ingested_in_batches_and_advance_the_cursor(self, mock_stream):
+        mock_stream.return_value = self._stream(
+            (b"application/json", self._access_event(1, 0)),
+            (b"application/json", json.dumps({"eventType": "heartBeat", "devIndex": "IDX-STREAM"}).encode()),
+            (b"image/jpeg", b"\xff\xd8--MIME_boundar"),
+            (b"application/json", self._access_event(2, 5)),
+            (b"application/json", json.dumps({"eventType": "VMD", "devIndex": "IDX-STREAM"}).encode()),
+            (b"application/json", self._access_event(2, 5)),
+        )
+        consumer = AlertStreamConsumer(self.gateway, batch_size=2, flush_interval=60)
+
+        consumer.consume_once()
+        consumer.flush()
+
+        self.assertEqual(sorted(RawEvent.objects.values_list("serial_no", flat=True)), [1, 2])
+        self.assertEqual(consumer.ingested, 2)
+        self.device.refresh_from_db()
+        self.assertIsNotNone(self.device.last_seen_at)
+        self.assertEqual(self.device.cursor.last_event_time.minute, 5)
+
+    @override_settings(HIK_ALERT_STREAM_MAX_PENDING=2)
+    def test_failed_flushes_spill_to_the_spool_then_drop_instead_of_growing(self):
+        consumer = AlertStreamConsumer(self.gateway, batch_size=100, flush_interval=60)
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        with self.settings(HIK_WEBHOOK_SPOOL_DIR=spool_dir.name):
+            for serial_no in range(1, 5):
+                consumer._add(self._access_event(serial_no, serial_no))
+            get_webhook_spool().close()
+        with self.assertLogs("hik_gateway.services.alert_stream", level="ERROR"):
+            consumer._add(self._access_event(5, 5))
+
+        self.assertEqual((len(consumer._batch), consumer.spooled, consumer.dropped), (2, 2, 1))
+        lines = [line for path in Path(spool_dir.name).glob("*.seg") for line in path.read_text().splitlines()]
+        spooled = [json.loads(json.loads(line)["body"]) for line in lines]
+        self.assertEqual([payload["AccessControllerEvent"]["serialNo"] for payload in spooled], [3, 4])
+
+    def test_non_json_parts_are_logged_and_resume_runs_in_the_background(self):
+        consumer = AlertStreamConsumer(self.gateway)
+        with self.assertLogs("hik_gateway.services.alert_stream", level="WARNING") as logs:
+            consumer.handle_part({"content-type": "application/xml"}, b"<EventNotificationAlert/>")
+            consumer.handle_part({"content-type": "image/jpeg"}, b"\xff\xd8")
+        self.assertEqual(consumer.skipped, 1)
+        self.assertEqual(len(logs.records), 1)
+
+        release = threading.Event()
+        catchup = patch(
+            "hik_gateway.services.alert_stream.catchup_devices_parallel",
+            side_effect=lambda devices, **kwargs: release.wait(5) and [],
+        )
+        with catchup as parallel:
+            consumer.start_resume()
+            consumer.start_resume()
+            self.assertTrue(consumer._resume_thread.is_alive())
+            release.set()
+            consumer._resume_thread.join(5)
+
+        parallel.assert_called_once()
+        self.assertEqual([device.dev_index for device in parallel.call_args.args[0]], ["IDX-STREAM"])
+
+
+    def test_malformed_events_are_dropped_without_blocking_the_batch(self):
+        consumer = AlertStreamConsumer(self.gateway, batch_size=100, flush_interval=60)
+        consumer._add(self._access_event(1, 1))
+        consumer._add(self._access_event(2, 2).replace(b"2026-02-01T08:02", b"2026-02-30T08:02"))
+        consumer._add(json.dumps({"EventNotificationAlert": ["not", "an", "object"]}).encode())
+        consumer._add(self._access_event(3, 3))
+
+        with self.assertLogs("hik_gateway.services.alert_stream", level="ERROR"):
+            consumer.flush()
+
+        self.assertEqual(sorted(RawEvent.objects.values_list("serial_no", flat=True)), [1, 3])
+        self.assertEqual((consumer.ingested, consumer.failed, consumer._batch), (2, 2, []))
+
+        consumer._add(self._access_event(4, 4))
+        with patch("hik_gateway.services.alert_stream.ingest_events", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                consumer.flush()
+        self.assertEqual(len(consumer._batch), 1)
+
+    @patch("hik_gateway.client.HikGatewayClient.acs_event_search", return_value={"InfoList": []})
+    def test_resume_windows_are_fixed_before_the_stream_moves_the_cursors(self, mock_search):
+        disconnected_at = datetime(2026, 2, 1, 7, 0, tzinfo=dt_timezone.utc)
+        DeviceCursor.objects.create(device=self.device, tenant=self.tenant, last_event_time=disconnected_at)
+        consumer = AlertStreamConsumer(self.gateway, batch_size=100, flush_interval=60)
+
+        release = threading.Event()
+        catchup = patch(
+            "hik_gateway.services.alert_stream.catchup_devices_parallel",
+            side_effect=lambda devices, **kwargs: release.wait(5) and [],
+        )
+        with catchup:
+            consumer.start_resume()
+            # The stream connects and flushes while the device still waits for a resume worker.
+            consumer._add(self._access_event(1, 30))
+            consumer.flush()
+            release.set()
+            consumer._resume_thread.join(5)
+
+        self.assertEqual(DeviceCursor.objects.get(device=self.device).last_event_time.minute, 30)
+        catchup_device_report(self.device)
+        start_time = parse_datetime(mock_search.call_args.args[1]["AcsEventCond"]["startTime"])
+        self.assertEqual(start_time, disconnected_at - timedelta(minutes=2))
+
+class ParallelCatchupTests(APITestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Tenant Catchup", code="tenant-catchup")
+        for gateway_no in range(2):
+            gateway = Gateway.objects.create(
+                tenant=self.tenant,
+                base_url=f"https://gw-catchup-{gateway_no}.local",
+                username="admin",
+                password="pass",
+            )
+            for device_no in range(4):
+                Device.objects.create(
+                    gateway=gateway,
+                    tenant=self.tenant,
+                    serial_number=f"SN-C{gateway_no}{device_no}",
+                    dev_index=f"IDX-C{gateway_no}{device_no}",
+                    status="online",
+                )
+
+    def test_workers_respect_per_gateway_cap_and_report_each_device(self):
+        lock = threading.Lock()
+        in_flight = {}
+        peaks = {}
+
+        def catchup_pages(device, report, max_results, deadline):
+            with lock:
+                in_flight[device.gateway_id] = in_flight.get(device.gateway_id, 0) + 1
+                peaks[device.gateway_id] = max(peaks.get(device.gateway_id, 0), in_flight[device.gateway_id])
+            time.sleep(0.02)
+            with lock:
+                in_flight[device.gateway_id] -= 1
+            if device.dev_index == "IDX-C13":
+                raise RuntimeError("device offline")
+            report.pages = 1
+
+        out = StringIO()
+        with patch("hik_gateway.services.catchup._catchup_pages", side_effect=catchup_pages):
+            call_command("hik_catchup_acs_events", "--workers", "6", "--per-gateway", "2", stdout=out)
+
+        self.assertLessEqual(max(peaks.values()), 2)
+        output = out.getvalue()
+        self.assertIn("tenant-catchup/IDX-C00: processed=0 fetched=0 pages=1", output)
+        self.assertIn("tenant-catchup/IDX-C13: processed=0 fetched=0 pages=0", output)
+        self.assertIn("error: device offline", output)
+        self.assertIn("from 8 devices (1 failed, 0 over budget)", output)
+
+    @patch("hik_gateway.management.commands.hik_catchup_acs_events.catchup_all_devices")
+    @patch("hik_gateway.management.commands.hik_catchup_acs_events.catchup_devices_parallel", return_value=[])
+    def test_per_gateway_alone_uses_the_reporting_path(self, mock_parallel, mock_serial):
+        call_command("hik_catchup_acs_events", "--per-gateway", "1", stdout=StringIO())
+
+        mock_serial.assert_not_called()
+        self.assertEqual(mock_parallel.call_args.kwargs["per_gateway"], 1)
+
+    @patch("hik_gateway.client.HikGatewayClient.acs_event_search")
+    def test_device_budget_stops_between_pages_and_keeps_progress(self, mock_search):
+        device = Device.objects.get(dev_index="IDX-C00")
+        mock_search.side_effect = lambda dev_index, cond: {
+            "InfoList": [{"time": "2026-02-01T08:00:00Z", "serialNo": cond["AcsEventCond"]["searchResultPosition"] + 1, "subEventType": 1}],
+        }
+
+        report = catchup_device_report(device, max_results=1, budget=1e-9)
+
+        self.assertTrue(report.timed_out)
+        self.assertEqual((report.pages, report.fetched, report.processed), (1, 1, 1))
+        device.cursor.refresh_from_db()
+        self.assertEqual(device.cursor.last_search_result_position, 1)
+
+    @patch("hik_gateway.client.HikGatewayClient.acs_event_search")
+    def test_session_resumes_at_the_checkpointed_page_after_a_crash(self, mock_search):
+        device = Device.objects.get(dev_index="IDX-C00")
+        conditions = []
+
+        def page(dev_index, cond):
+            conditions.append(dict(cond["AcsEventCond"]))
+            position = cond["AcsEventCond"]["searchResultPosition"]
+            if position == 2 and len(conditions) == 2:
+                raise ConnectionError("gateway reset")
+            serials = [serial_no for serial_no in (position + 1, position + 2) if serial_no <= 3]
+            return {"InfoList": [{"time": "2026-02-01T08:00:00Z", "serialNo": serial_no, "subEventType": 1} for serial_no in serials]}
+
+        mock_search.side_effect = page
+        self.assertTrue(catchup_device_report(device, max_results=2).error)
+        cursor = DeviceCursor.objects.get(device=device)
+        self.assertEqual(cursor.last_search_result_position, 2)
+        self.assertEqual(RawEvent.objects.filter(device=device).count(), 2)
+
+        catchup_device(device, max_results=2)
+
+        first, _, resumed = conditions
+        self.assertEqual([cond["searchResultPosition"] for cond in conditions], [0, 2, 2])
+        self.assertEqual(resumed["searchID"], first["searchID"])
+        self.assertEqual((resumed["startTime"], resumed["endTime"]), (first["startTime"], first["endTime"]))
+        self.assertEqual(sorted(RawEvent.objects.filter(device=device).values_list("serial_no", flat=True)), [1, 2, 3])
+        cursor.refresh_from_db()
+        self.assertIsNone(cursor.session_end_time)
+
+        catchup_device(device, max_results=2)
+        self.assertNotEqual(conditions[3]["searchID"], first["searchID"])
+        self.assertEqual(conditions[3]["searchResultPosition"], 0)
+
+
+class CatchupSchedulerTests(APITestCase):
+    def setUp(self):
+        self.devices = {}
+        for tenant_code, dev_indexes in (("sched-a", ["A1", "A2", "A3", "A-OFF"]), ("sched-b", ["B1", "B-LIVE"])):
+            tenant = Tenant.objects.create(name=tenant_code, code=tenant_code)
+            gateway = Gateway.objects.create(tenant=tenant, base_url=f"https://{tenant_code}.local", username="admin", password="pass")
+            for dev_index in dev_indexes:
+                self.devices[dev_index] = Device.objects.create(
+                    gateway=gateway,
+                    tenant=tenant,
+                    serial_number=f"SN-{dev_index}",
+                    dev_index=dev_index,
+                    status="offline" if dev_index.endswith("OFF") else "online",
+                )
+        AttendanceLog.objects.create(
+            tenant=self.devices["B-LIVE"].tenant,
+            device=self.devices["B-LIVE"],
+            timestamp="2026-02-01T08:00:00Z",
+            attendance_type="checkin",
+            source=AttendanceLog.SOURCE_REALTIME,
+            raw_event=RawEvent.objects.create(
+                tenant=self.devices["B-LIVE"].tenant,
+                device=self.devices["B-LIVE"],
+                dev_index="B-LIVE",
+                event_type="AccessControllerEvent",
+                event_datetime="2026-02-01T08:00:00Z",
+                event_key=b"live-event-key-1",
+                payload={},
+            ),
+        )
+
+    def test_poll_interval_follows_event_rate_and_realtime_freshness(self):
+        now = timezone.now()
+        self.assertIsNone(poll_interval(0, now, now))
+        self.assertEqual(poll_interval(0, None, now), 1800)
+        self.assertLess(poll_interval(50, None, now), poll_interval(5, None, now))
+        self.assertEqual(poll_interval(100000, None, now), 60)
+
+    @override_settings(HIK_CATCHUP_TICK_DEVICES=3)
+    def test_due_devices_skip_offline_and_live_devices_and_alternate_tenants(self):
+        due = CatchupScheduler().due_devices()
+
+        self.assertEqual([device.dev_index for device in due], ["A1", "B1", "A2"])
+
+    def test_failed_devices_back_off_and_others_come_back_when_due(self):
+        scheduler = CatchupScheduler()
+
+        def fake_parallel(devices, **kwargs):
+            return [CatchupReport(device, error="timeout" if device.dev_index == "A1" else "") for device in devices]
+
+        with patch("hik_gateway.services.catchup_scheduler.catchup_devices_parallel", side_effect=fake_parallel):
+            first = scheduler.tick()
+            second = scheduler.tick()
+
+        self.assertEqual(sorted(report.device.dev_index for report in first), ["A1", "A2", "A3", "B1"])
+        self.assertEqual(second, [])
+        self.assertEqual(scheduler._states[self.devices["A1"].id].failures, 1)
+
+
+    def test_scheduler_command_survives_a_failed_round(self):
+        tick = patch.object(CatchupScheduler, "tick", side_effect=[OperationalError("server closed the connection"), [], KeyboardInterrupt])
+        with (
+            tick as mock_tick,
+            patch("hik_gateway.management.commands.hik_catchup_scheduler.close_old_connections") as close_connections,
+            patch("hik_gateway.management.commands.hik_catchup_scheduler.time.sleep"),
+            self.assertLogs("hik_gateway.management.commands.hik_catchup_scheduler", level="ERROR"),
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("hik_catchup_scheduler", stdout=StringIO())
+
+        self.assertEqual(mock_tick.call_count, 3)
+        self.assertEqual(close_connections.call_count, 3)
+
+class SerialGapTrackerTests(APITestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Tenant Gaps", code="tenant-gaps")
+        self.gateway = Gateway.objects.create(tenant=self.tenant, base_url="https://gw-gaps.local", username="admin", password="pass")
+        self.device = Device.objects.create(
+            gateway=self.gateway,
+            tenant=self.tenant,
+            serial_number="SN-GAPS",
+            dev_index="IDX-GAPS",
+            status="online",
+        )
+
+    def _acs_event(self, serial_no):
+        return {"time": f"2026-02-01T08:{serial_no % 60:02d}:00Z", "employeeNoString": "E9101", "serialNo": serial_no, "subEventType": 1}
+
+    def _ingest(self, *serials):
+        return ingest_acs_events(self.device, [self._acs_event(serial_no) for serial_no in serials])
+
+    def _gaps(self):
+        return list(SerialGap.objects.filter(device=self.device).order_by("first_serial_no").values_list("first_serial_no", "last_serial_no"))
+
+    def test_missing_serials_open_gaps_and_late_events_close_them(self):
+        self._ingest(1, 2)
+        with self.assertNumQueries(6):
+            self._ingest(3)
+        self._ingest(8, 9, 12)
+        self.assertEqual(self._gaps(), [(4, 7), (10, 11)])
+
+        self._ingest(5, 10)
+
+        self.assertEqual(self._gaps(), [(4, 4), (6, 7), (11, 11)])
+        self.assertEqual(DeviceCursor.objects.get(device=self.device).last_serial_no, 12)
+
+    def test_counter_reset_does_not_open_a_huge_gap(self):
+        self._ingest(1)
+        self._ingest(500000)
+
+        self.assertEqual(self._gaps(), [])
+
+    def test_counter_restarting_below_the_high_water_mark_rebases_tracking(self):
+        def at(serial_no, moment):
+            return {"time": moment, "employeeNoString": "E9101", "serialNo": serial_no, "subEventType": 1}
+
+        ingest_acs_events(self.device, [at(50000, "2026-02-01T08:00:00Z"), at(50003, "2026-02-01T08:05:00Z")])
+        self.assertEqual(self._gaps(), [(50001, 50002)])
+
+        # History far below the mark (a backfill) is older than it: not a reset.
+        ingest_acs_events(self.device, [at(7, "2026-01-01T08:00:00Z")])
+        self.assertEqual(DeviceCursor.objects.get(device=self.device).last_serial_no, 50003)
+
+        with self.assertLogs("hik_gateway.services.serial_gaps", level="WARNING"):
+            ingest_acs_events(self.device, [at(1, "2026-02-01T09:00:00Z"), at(3, "2026-02-01T09:01:00Z")])
+        ingest_acs_events(self.device, [at(4, "2026-02-01T09:02:00Z")])
+
+        self.assertEqual(self._gaps(), [(2, 2)])
+        self.assertEqual(DeviceCursor.objects.get(device=self.device).last_serial_no, 4)
+
+    @patch("hik_gateway.client.HikGatewayClient.acs_event_search")
+    def test_gap_catchup_asks_for_the_missing_serials_only(self, mock_search):
+        self._ingest(1, 5)
+        mock_search.return_value = {"InfoList": [self._acs_event(2), self._acs_event(4)]}
+
+        report = catchup_serial_gaps(self.device)
+
+        self.assertTrue(report.ok)
+        self.assertEqual(report.processed, 2)
+        cond = mock_search.call_args.args[1]["AcsEventCond"]
+        self.assertEqual((cond["beginSerialNo"], cond["endSerialNo"]), (2, 4))
+        self.assertEqual(sorted(RawEvent.objects.values_list("serial_no", flat=True)), [1, 2, 4, 5])
+        # Serial 3 is no longer on the terminal: asking again would never find it.
+        self.assertEqual(self._gaps(), [])
+
+    def test_scheduler_targets_devices_with_gaps_even_when_realtime_is_fresh(self):
+        scheduler = CatchupScheduler()
+        scheduler._state(self.device.id).next_due = float("inf")
+        self.assertEqual(scheduler.due_devices(), [])
+
+        self._ingest(1, 3)
+        with patch("hik_gateway.services.catchup_scheduler.catchup_serial_gaps") as gap_catchup:
+            scheduler._catchup(scheduler.due_devices()[0])
+
+        gap_catchup.assert_called_once()
+
+
+class _InlineExecutor:
+    """Runs submitted work in the calling thread, so it shares the test transaction."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as exc:  # noqa: BLE001
+            future.set_exception(exc)
+        return future
+
+
+@override_settings(HIK_BACKFILL_WINDOW_EVENTS=3, HIK_CATCHUP_PER_GATEWAY=2)
+class BackfillCommandTests(APITestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Tenant Backfill", code="tenant-backfill")
+        self.gateway = Gateway.objects.create(tenant=self.tenant, base_url="https://gw-backfill.local", username="admin", password="pass")
+        self.device = Device.objects.create(
+            gateway=self.gateway,
+            tenant=self.tenant,
+            serial_number="SN-BACKFILL",
+            dev_index="IDX-BACKFILL",
+            status="online",
+        )
+        day = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+        # 06:00 sits exactly on the boundary between the first two windows.
+        self.stored = [day + timedelta(hours=hour) for hour in (1, 1, 2, 6, 9, 9, 9, 9, 15, 22, 23)]
+
+    def _in_window(self, cond, inclusive_end=False):
+        start, end = parse_datetime(cond["startTime"]), parse_datetime(cond["endTime"])
+        return [
+            (serial_no, moment)
+            for serial_no, moment in enumerate(self.stored, start=1)
+            if start <= moment and (moment < end or (inclusive_end and moment == end))
+        ]
+
+    def _total_num(self, dev_index, cond):
+        return {"AcsEventTotalNum": {"totalNum": len(self._in_window(cond["AcsEventTotalNumCond"]))}}
+
+    def _search(self, dev_index, cond):
+        # Like the terminals, the search returns events stamped exactly at endTime as well.
+        cond = cond["AcsEventCond"]
+        position = cond["searchResultPosition"]
+        page = self._in_window(cond, inclusive_end=True)[position : position + cond["maxResults"]]
+        return {
+            "InfoList": [
+                {"time": moment.isoformat(), "serialNo": serial_no, "employeeNoString": f"E{serial_no}", "subEventType": 1}
+                for serial_no, moment in page
+            ]
+        }
+
+    def test_backfill_splits_range_by_event_count_and_stores_every_event_once(self):
+        out = StringIO()
+        with (
+            patch("hik_gateway.client.HikGatewayClient.acs_event_total_num", side_effect=self._total_num),
+            patch("hik_gateway.client.HikGatewayClient.acs_event_search", side_effect=self._search),
+            patch("hik_gateway.services.backfill.ThreadPoolExecutor", _InlineExecutor),
+        ):
+            day = self.stored[0].replace(hour=0)
+            windows = plan_windows(get_gateway_client(self.gateway), self.device, day, day + timedelta(days=1))
+            call_command(
+                "hik_backfill_acs_events",
+                "--tenant=tenant-backfill",
+                "--dev-index=IDX-BACKFILL",
+                "--start=2026-01-05T00:00:00Z",
+                "--end=2026-01-06T00:00:00Z",
+                "--max-results=2",
+                stdout=out,
+            )
+
+        # Four events share one second: that window cannot be split below the minimum width.
+        self.assertTrue(all(window.expected <= 3 or window.end - window.start <= timedelta(minutes=1) for window in windows))
+        self.assertIn(self.stored[3], [window.end for window in windows])
+        self.assertEqual(sum(window.expected for window in windows), 11)
+
+        raw_events = RawEvent.objects.filter(device=self.device)
+        self.assertEqual(sorted(raw_events.values_list("serial_no", flat=True)), list(range(1, 12)))
+        self.assertEqual(raw_events.filter(event_datetime=self.stored[3]).count(), 1)
+        logs = AttendanceLog.objects.filter(device=self.device, source=AttendanceLog.SOURCE_CATCHUP)
+        self.assertEqual(sorted(logs.values_list("person_id", flat=True)), sorted(f"E{serial_no}" for serial_no in range(1, 12)))
+        self.assertEqual(DeviceCursor.objects.get(device=self.device).last_serial_no, 11)
+        self.assertFalse(SerialGap.objects.filter(device=self.device).exists())
+        # Windows ending at 06:00 and 09:00 fetch the events stamped there again; only the first copy is stored.
+        self.assertIn("Backfilled 11 new events (16 fetched)", out.getvalue())
+        self.assertIn("0 windows failed", out.getvalue())
+
+
 class HikCheckDeviceCommandTests(APITestCase):
     def setUp(self):
         self.tenant = Tenant.objects.create(name="Tenant Cmd", code="tenant-cmd")
@@ -143,7 +1450,7 @@ class HikCheckDeviceCommandTests(APITestCase):
             password="pass",
         )
 
-    @patch("hik_gateway.management.commands.hik_check_device.HikGatewayClient.device_list")
+    @patch("hik_gateway.client.HikGatewayClient.device_list")
     def test_command_returns_success_when_device_is_found(self, mock_device_list):
         mock_device_list.return_value = {
             "DeviceList": {
@@ -170,7 +1477,23 @@ class HikCheckDeviceCommandTests(APITestCase):
         self.assertIn("Communication OK", stdout.getvalue())
         mock_device_list.assert_called_once()
 
-    @patch("hik_gateway.management.commands.hik_check_device.HikGatewayClient.device_list")
+    @patch("hik_gateway.client.HikGatewayClient.device_list")
+    def test_command_stops_paging_once_device_is_found(self, mock_device_list):
+        mock_device_list.return_value = {
+            "SearchResult": {
+                "numOfMatches": 1,
+                "totalMatches": 250,
+                "MatchList": [{"Device": {"EhomeParams": {"EhomeID": "SN-FIRST"}, "devIndex": "IDX-1", "devStatus": "online"}}],
+            }
+        }
+
+        stdout = StringIO()
+        call_command("hik_check_device", "--tenant", "tenant-cmd", "--serial", "SN-FIRST", stdout=stdout)
+
+        self.assertIn("devIndex=IDX-1", stdout.getvalue())
+        mock_device_list.assert_called_once()
+
+    @patch("hik_gateway.client.HikGatewayClient.device_list")
     def test_command_raises_error_when_device_is_missing(self, mock_device_list):
         mock_device_list.return_value = {"DeviceList": {"Device": []}}
 
@@ -209,7 +1532,7 @@ class HikRegisterWebhooksCommandTests(APITestCase):
             status="online",
         )
 
-    @patch("hik_gateway.management.commands.hik_register_webhooks.HikGatewayClient.set_http_host")
+    @patch("hik_gateway.client.HikGatewayClient.set_http_host")
     def test_register_webhooks_uses_http_host_notification_list_payload(self, mock_set_http_host):
         call_command(
             "hik_register_webhooks",
@@ -240,7 +1563,7 @@ class HikDevicesPageTests(APITestCase):
             password="pass",
         )
 
-    @patch("hik_gateway.views.HikGatewayClient.device_list")
+    @patch("hik_gateway.client.HikGatewayClient.device_list")
     def test_page_displays_devices_from_search_result_payload(self, mock_device_list):
         mock_device_list.return_value = {
             "SearchResult": {
@@ -272,7 +1595,7 @@ class HikDevicesPageTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertContains(response, "Ajoute ?tenant=&lt;code_tenant&gt;", status_code=status.HTTP_403_FORBIDDEN)
 
-    @patch("hik_gateway.views.HikGatewayClient.device_list")
+    @patch("hik_gateway.client.HikGatewayClient.device_list")
     def test_admin_can_list_devices_for_all_tenants_without_filter(self, mock_device_list):
         tenant_2 = Tenant.objects.create(name="Tenant UI 2", code="tenant-ui-2")
         Gateway.objects.create(
@@ -300,7 +1623,7 @@ class HikDevicesPageTests(APITestCase):
         self.assertContains(response, "tenant-ui-2")
         self.assertEqual(mock_device_list.call_count, 2)
 
-    @patch("hik_gateway.views.HikGatewayClient.device_list")
+    @patch("hik_gateway.client.HikGatewayClient.device_list")
     def test_page_finds_tenant_case_insensitively(self, mock_device_list):
         mock_device_list.return_value = {
             "SearchResult": {
@@ -337,7 +1660,7 @@ class HikDevicesApiTests(APITestCase):
         user = user_model.objects.create_user(username="api-user", password="pass", is_staff=True)
         self.client.force_authenticate(user=user)
 
-    @patch("hik_gateway.views.HikGatewayClient.device_list_all")
+    @patch("hik_gateway.client.HikGatewayClient.device_list_all")
     def test_devices_api_returns_normalized_mapping(self, mock_device_list_all):
         mock_device_list_all.return_value = {
             "SearchResult": {
@@ -378,7 +1701,7 @@ class HikDevicesApiTests(APITestCase):
             key="",
         )
 
-    @patch("hik_gateway.views.HikGatewayClient.device_list_all")
+    @patch("hik_gateway.client.HikGatewayClient.device_list_all")
     def test_devices_api_can_return_raw_search_result_per_gateway(self, mock_device_list_all):
         mock_device_list_all.return_value = {
             "SearchResult": {
@@ -396,6 +1719,99 @@ class HikDevicesApiTests(APITestCase):
         self.assertIn("search_result", payload["results"][0])
         self.assertEqual(payload["results"][0]["tenant_code"], "tenant-api")
 
+    @patch("hik_gateway.client.HikGatewayClient.device_list_all")
+    def test_devices_api_serves_cached_inventory_unless_fresh_is_requested(self, mock_device_list_all):
+        mock_device_list_all.return_value = {"SearchResult": {"MatchList": [{"Device": {"devIndex": "IDX-CACHED"}}]}}
+
+        first = self.client.get("/api/hikgateway/devices/?tenant=tenant-api")
+        second = self.client.get("/api/hikgateway/devices/?tenant=tenant-api")
+        self.assertEqual(mock_device_list_all.call_count, 1)
+        self.assertEqual(first.json()["results"], second.json()["results"])
+
+        self.client.get("/api/hikgateway/devices/?tenant=tenant-api&fresh=1")
+        self.assertEqual(mock_device_list_all.call_count, 2)
+
+    @override_settings(HIK_GATEWAY_FANOUT_DEADLINE=0.2)
+    def test_devices_api_returns_partial_results_when_gateway_misses_deadline(self):
+        slow_tenant = Tenant.objects.create(name="Tenant Slow", code="tenant-slow")
+        Gateway.objects.create(tenant=slow_tenant, base_url="https://gw-slow.local", username="admin", password="pass")
+        release = threading.Event()
+
+        def device_list_all(client, **kwargs):
+            if "gw-slow" in client.base_url:
+                release.wait(5)
+                return {"SearchResult": {"MatchList": []}}
+            return {"SearchResult": {"MatchList": [{"Device": {"EhomeParams": {"EhomeID": "SN-FAST"}, "devIndex": "IDX-FAST"}}]}}
+
+        with patch.object(HikGatewayClient, "device_list_all", autospec=True, side_effect=device_list_all):
+            response = self.client.get("/api/hikgateway/devices/")
+        release.set()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        payload = response.json()
+        self.assertEqual([item["sn"] for item in payload["results"]], ["SN-FAST"])
+        self.assertEqual(len(payload["errors"]), 1)
+        self.assertTrue(payload["errors"][0].startswith("tenant-slow: deadline exceeded after"))
+
+
+class InventoryCacheTests(APITestCase):
+    def test_stale_entry_is_served_while_refreshing_in_background(self):
+        cache = InventoryCache(ttl=0, stale_ttl=60)
+        payloads = iter(["first", "second"])
+
+        self.assertEqual(cache.get(1, "devices", lambda: next(payloads)), "first")
+        self.assertEqual(cache.get(1, "devices", lambda: next(payloads)), "first")
+        cache._refresher.shutdown(wait=True)
+        self.assertEqual(cache._entries[(1, "devices")][1], "second")
+
+    def test_entries_are_bounded_by_lru_size_and_expiry(self):
+        cache = InventoryCache(ttl=60, stale_ttl=0, maxsize=2)
+        cache.get(1, "a", lambda: "a")
+        cache.get(1, "b", lambda: "b")
+        cache.get(1, "a", lambda: "reloaded")
+        cache.get(1, "c", lambda: "c")
+
+        self.assertEqual(list(cache._entries), [(1, "a"), (1, "c")])
+
+        expiring = InventoryCache(ttl=0, stale_ttl=0, maxsize=10)
+        expiring.get(1, "a", lambda: "a")
+        expiring.get(1, "b", lambda: "b")
+        self.assertEqual(list(expiring._entries), [(1, "b")])
+
+    def test_free_form_device_queries_are_not_cached(self):
+        self.assertEqual(
+            _inventory_cache_key(100, ["ehomeV5", "ehomeV5"], ["online"], "", ""),
+            _inventory_cache_key(100, ["ehomeV5"], ["online"], "", ""),
+        )
+        self.assertIsNone(_inventory_cache_key(100, [], [], "", "front door"))
+        self.assertIsNone(_inventory_cache_key(10**9, [], [], "", ""))
+        self.assertIsNone(_inventory_cache_key(100, [f"p{index}" for index in range(20)], [], "", ""))
+
+    def test_concurrent_misses_share_one_upstream_call(self):
+        cache = InventoryCache(ttl=60, stale_ttl=0)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "inventory"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cache.get(1, "devices", loader)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(cache.get(1, "devices", loader)))
+        follower.start()
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(results, ["inventory", "inventory"])
+        self.assertEqual(len(calls), 1)
+
 
 class _DummyResponse:
     def __init__(self, payload):
@@ -410,10 +1826,8 @@ class _DummyResponse:
 
 
 class HikGatewayClientPaginationTests(APITestCase):
-    @patch("hik_gateway.client.requests.post")
+    @patch("hik_gateway.client.requests.Session.post")
     def test_device_list_all_fetches_all_pages(self, mock_post):
-        from hik_gateway.client import HikGatewayClient
-
         mock_post.side_effect = [
             _DummyResponse(
                 {
@@ -441,3 +1855,120 @@ class HikGatewayClientPaginationTests(APITestCase):
         self.assertEqual(payload["SearchResult"]["numOfMatches"], 2)
         self.assertEqual(len(payload["SearchResult"]["MatchList"]), 2)
         self.assertEqual(mock_post.call_count, 2)
+
+    @patch("hik_gateway.client.requests.Session.post")
+    def test_device_list_all_fetches_remaining_windows_and_dedupes(self, mock_post):
+        pages = {
+            0: ["IDX-1", "IDX-2"],
+            2: ["IDX-2", "IDX-3"],
+            4: ["IDX-4"],
+        }
+
+        def post(url, json, **kwargs):
+            position = json["SearchDescription"]["position"]
+            return _DummyResponse(
+                {
+                    "SearchResult": {
+                        "numOfMatches": len(pages[position]),
+                        "totalMatches": 5,
+                        "MatchList": [{"Device": {"devIndex": dev_index}} for dev_index in pages[position]],
+                    }
+                }
+            )
+
+        mock_post.side_effect = post
+
+        client = HikGatewayClient("https://gw.local", "admin", "pass")
+        payload = client.device_list_all(max_result=2)
+
+        requested = sorted(call.kwargs["json"]["SearchDescription"]["position"] for call in mock_post.call_args_list)
+        self.assertEqual(requested, [0, 2, 4])
+        self.assertEqual(
+            [item["Device"]["devIndex"] for item in payload["SearchResult"]["MatchList"]],
+            ["IDX-1", "IDX-2", "IDX-3", "IDX-4"],
+        )
+
+
+class HikGatewayClientRegistryTests(APITestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Tenant Pool", code="tenant-pool")
+        self.gateway = Gateway.objects.create(
+            tenant=self.tenant,
+            base_url="https://gw-pool.local",
+            username="admin",
+            password="pass",
+        )
+
+    def test_registry_reuses_client_until_credentials_change(self):
+        client = get_gateway_client(self.gateway)
+        self.assertIs(get_gateway_client(self.gateway), client)
+        self.assertIn("gzip", client.session.headers["Accept-Encoding"])
+
+        self.gateway.password = "rotated"
+        self.gateway.save()
+
+        with patch.object(client, "close", wraps=client.close) as close:
+            rotated = get_gateway_client(self.gateway)
+        self.assertIsNot(rotated, client)
+        self.assertEqual(rotated.auth.password, "rotated")
+        close.assert_called_once_with()
+
+    def test_registry_drops_client_when_gateway_is_deleted(self):
+        get_gateway_client(self.gateway)
+        gateway_id = self.gateway.id
+        self.gateway.delete()
+
+        self.assertNotIn(gateway_id, _clients)
+
+
+class PreemptiveDigestAuthTests(APITestCase):
+    def test_challenge_and_nonce_count_are_shared_across_threads(self):
+        auth = PreemptiveDigestAuth("admin", "pass")
+        auth.init_per_thread_state()
+        auth._thread_local.chal = {"realm": "gw", "nonce": "nonce-1", "qop": "auth"}
+        auth.build_digest_header("POST", "https://gw.local/ISAPI/ContentMgmt/DeviceMgmt/deviceList")
+
+        headers = {}
+
+        def send():
+            request = requests.Request("POST", "https://gw.local/ISAPI/AccessControl/AcsEvent").prepare()
+            headers.update(auth(request).headers)
+
+        worker = threading.Thread(target=send)
+        worker.start()
+        worker.join()
+
+        self.assertIn('nonce="nonce-1"', headers["Authorization"])
+        self.assertIn("nc=00000002", headers["Authorization"])
+
+
+class AsyncHikGatewayClientTests(APITestCase):
+    def test_async_device_list_all_fetches_all_pages(self):
+        positions = []
+
+        def handler(request):
+            position = json.loads(request.content)["SearchDescription"]["position"]
+            positions.append(position)
+            return httpx.Response(
+                200,
+                json={
+                    "SearchResult": {
+                        "numOfMatches": 1,
+                        "totalMatches": 2,
+                        "MatchList": [{"Device": {"devIndex": f"IDX-{position}"}}],
+                    }
+                },
+            )
+
+        async def run():
+            async with AsyncHikGatewayClient("https://gw.local", "admin", "pass") as client:
+                await client.http.aclose()
+                client.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+                return await client.device_list_all(max_result=1)
+
+        payload = asyncio.run(run())
+
+        self.assertEqual(positions, [0, 1])
+        self.assertEqual(payload["SearchResult"]["numOfMatches"], 2)
+        self.assertEqual(payload["SearchResult"]["MatchList"][1]["Device"]["devIndex"], "IDX-1")
+
@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.urls import path
 
-from hik_gateway.views import hik_devices_api, hik_devices_page, hik_event_webhook
+from hik_gateway.views import hik_devices_api, hik_devices_page, hik_event_webhook, hik_event_webhook_async
+
+# Under an ASGI server the native async view avoids holding a worker thread per device connection.
+webhook_view = hik_event_webhook_async if getattr(settings, "HIK_WEBHOOK_ASYNC", False) else hik_event_webhook
 
 urlpatterns = [
     path("hikgateway/devices/", hik_devices_api, name="hikgateway-devices-api"),
     path("hik/devices", hik_devices_page, name="hik-devices"),
-    path("hik/events", hik_event_webhook, name="hik-events"),
-    path("hikvision/events", hik_event_webhook, name="hikvision-events"),
+    path("hik/events", webhook_view, name="hik-events"),
+    path("hikvision/events", webhook_view, name="hikvision-events"),
 ]
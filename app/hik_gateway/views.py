@@ -2,8 +2,11 @@ from __future__ import annotations
 
 import json
 import logging
+import time
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import InterfaceError, OperationalError
 from django.http import HttpRequest, JsonResponse
 from django.shortcuts import render
 from django.views.decorators.http import require_GET
@@ -13,10 +16,22 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 
-from hik_gateway.client import HikGatewayClient
 from hik_gateway.models import AttendanceLog, Gateway
 from hik_gateway.services.device_payload import extract_devices, normalize_device
-from hik_gateway.services.webhook_ingest import ingest_event
+from hik_gateway.services.event_classifier import (
+    EVENT_DISCARD,
+    EVENT_HEARTBEAT,
+    atouch_device_heartbeat,
+    classify_event,
+    touch_device_heartbeat,
+)
+from hik_gateway.services.gateway_fanout import call_gateways
+from hik_gateway.services.inventory_cache import inventory_cache
+from hik_gateway.services.picture_store import SpooledPicture, is_multipart, read_multipart_webhook
+from hik_gateway.services.resolution_cache import aresolve_tenant_code, resolve_tenant_code
+from hik_gateway.services.webhook_inbox import aenqueue_webhook, enqueue_webhook, inbox_enabled
+from hik_gateway.services.webhook_ingest import aingest_event, ingest_event
+from hik_gateway.services.webhook_spool import SpoolFull, WebhookSpool, database_breaker, get_webhook_spool
 from tenants.models import Tenant
 
 
@@ -35,6 +50,10 @@ DEFAULT_DEVICE_LIST_PAYLOAD = {
         },
     }
 }
+# Bounds on the inventory queries shared through the cache; anything larger is fetched uncached.
+INVENTORY_CACHE_MAX_RESULT = 1000
+INVENTORY_CACHE_MAX_FILTERS = 8
+INVENTORY_CACHE_MAX_TERM = 64
 
 
 def _client_ip(request: HttpRequest) -> str:
@@ -51,16 +70,28 @@ def _is_allowed_ip(ip: str) -> bool:
     return ip in allowed
 
 
-def _resolve_tenant(request: HttpRequest, payload: dict) -> Tenant | None:
+def _requested_tenant_code(request: HttpRequest, payload: dict) -> str:
     tenant_code = request.headers.get("X-TENANT-CODE", "").strip()
     root = payload.get("EventNotificationAlert", payload) if isinstance(payload, dict) else {}
     if not tenant_code and isinstance(root, dict):
         tenant_code = str(root.get("tenantCode") or payload.get("tenantCode") or "").strip()
+    return tenant_code
+
 
+def _resolve_tenant(request: HttpRequest, payload: dict) -> Tenant | None:
+    tenant_code = _requested_tenant_code(request, payload)
     if not tenant_code:
         return None
 
-    return Tenant.objects.filter(code=tenant_code).first()
+    return resolve_tenant_code(tenant_code)
+
+
+async def _aresolve_tenant(request: HttpRequest, payload: dict) -> Tenant | None:
+    tenant_code = _requested_tenant_code(request, payload)
+    if not tenant_code:
+        return None
+
+    return await aresolve_tenant_code(tenant_code)
 
 
 def _is_allowed_token(request: HttpRequest) -> bool:
@@ -71,15 +102,24 @@ def _is_allowed_token(request: HttpRequest) -> bool:
     return provided == expected
 
 
-@csrf_exempt
-@require_POST
-def hik_event_webhook(request: HttpRequest) -> JsonResponse:
-    ip = _client_ip(request)
-    if not _is_allowed_ip(ip) or not _is_allowed_token(request):
-        return JsonResponse({"detail": "Unauthorized source"}, status=403)
+def _ingest_response(raw_event, attendance) -> JsonResponse:
+    if raw_event is None:
+        return JsonResponse({"status": "ignored"}, status=202)
+
+    return JsonResponse(
+        {
+            "status": "ok",
+            "raw_event_id": raw_event.id,
+            "attendance_log_id": attendance.id if attendance else None,
+        },
+        status=201,
+    )
 
-    raw_body = request.body.decode("utf-8", errors="replace")
-    logger.info("Hikvision webhook payload received", extra={"client_ip": ip, "raw_body": raw_body})
+
+def _accept_webhook(request: HttpRequest, raw_body: str, ip: str) -> JsonResponse:
+    if inbox_enabled():
+        inbox_event = enqueue_webhook(raw_body, tenant_code=request.headers.get("X-TENANT-CODE", "").strip(), client_ip=ip)
+        return JsonResponse({"status": "queued", "inbox_event_id": inbox_event.id}, status=202)
 
     try:
         payload = json.loads(raw_body or "{}")
@@ -91,17 +131,148 @@ def hik_event_webhook(request: HttpRequest) -> JsonResponse:
         return JsonResponse({"detail": "Unknown tenant"}, status=400)
 
     raw_event, attendance = ingest_event(payload, source=AttendanceLog.SOURCE_REALTIME, tenant=tenant)
-    if raw_event is None:
+    return _ingest_response(raw_event, attendance)
+
+
+async def _aaccept_webhook(request: HttpRequest, raw_body: str, ip: str) -> JsonResponse:
+    if inbox_enabled():
+        inbox_event = await aenqueue_webhook(raw_body, tenant_code=request.headers.get("X-TENANT-CODE", "").strip(), client_ip=ip)
+        return JsonResponse({"status": "queued", "inbox_event_id": inbox_event.id}, status=202)
+
+    try:
+        payload = json.loads(raw_body or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"detail": "Invalid JSON"}, status=400)
+
+    tenant = await _aresolve_tenant(request, payload)
+    if request.headers.get("X-TENANT-CODE") and tenant is None:
+        return JsonResponse({"detail": "Unknown tenant"}, status=400)
+
+    raw_event, attendance = await aingest_event(payload, source=AttendanceLog.SOURCE_REALTIME, tenant=tenant)
+    return _ingest_response(raw_event, attendance)
+
+
+def _spool_webhook(spool: WebhookSpool, request: HttpRequest, raw_body: str, ip: str) -> JsonResponse:
+    try:
+        spool.append(raw_body, tenant_code=request.headers.get("X-TENANT-CODE", "").strip(), client_ip=ip)
+    except SpoolFull:
+        logger.error("Webhook spool is full, rejecting event", extra={"client_ip": ip})
+        return JsonResponse({"detail": "Event store unavailable"}, status=503)
+    return JsonResponse({"status": "spooled"}, status=202)
+
+
+def _handle_webhook(request: HttpRequest, body: bytes, pictures: list[SpooledPicture], ip: str) -> JsonResponse:
+    # Heartbeats and non-access events are answered from a byte scan, before decoding or logging the body.
+    kind, dev_index = classify_event(body)
+    if kind == EVENT_DISCARD:
         return JsonResponse({"status": "ignored"}, status=202)
+    if kind == EVENT_HEARTBEAT:
+        try:
+            touch_device_heartbeat(dev_index, tenant_code=request.headers.get("X-TENANT-CODE", "").strip())
+        except (OperationalError, InterfaceError):
+            logger.warning("Could not record heartbeat", extra={"client_ip": ip, "dev_index": dev_index})
+        return JsonResponse({"status": "alive"})
 
-    return JsonResponse(
-        {
-            "status": "ok",
-            "raw_event_id": raw_event.id,
-            "attendance_log_id": attendance.id if attendance else None,
-        },
-        status=201,
-    )
+    _commit_pictures(pictures)
+    raw_body = body.decode("utf-8", errors="replace")
+    logger.info("Hikvision webhook payload received", extra={"client_ip": ip, "raw_body": raw_body})
+
+    spool = get_webhook_spool()
+    if spool is None:
+        return _accept_webhook(request, raw_body, ip)
+    if database_breaker.is_open():
+        return _spool_webhook(spool, request, raw_body, ip)
+
+    started = time.monotonic()
+    try:
+        response = _accept_webhook(request, raw_body, ip)
+    except (OperationalError, InterfaceError):
+        logger.exception("Database unavailable, spooling webhook to disk", extra={"client_ip": ip})
+        database_breaker.trip()
+        return _spool_webhook(spool, request, raw_body, ip)
+    database_breaker.record(time.monotonic() - started)
+    return response
+
+
+async def _ahandle_webhook(request: HttpRequest, body: bytes, pictures: list[SpooledPicture], ip: str) -> JsonResponse:
+    kind, dev_index = classify_event(body)
+    if kind == EVENT_DISCARD:
+        return JsonResponse({"status": "ignored"}, status=202)
+    if kind == EVENT_HEARTBEAT:
+        try:
+            await atouch_device_heartbeat(dev_index, tenant_code=request.headers.get("X-TENANT-CODE", "").strip())
+        except (OperationalError, InterfaceError):
+            logger.warning("Could not record heartbeat", extra={"client_ip": ip, "dev_index": dev_index})
+        return JsonResponse({"status": "alive"})
+
+    if pictures:
+        await sync_to_async(_commit_pictures, thread_sensitive=False)(pictures)
+    raw_body = body.decode("utf-8", errors="replace")
+    logger.info("Hikvision webhook payload received", extra={"client_ip": ip, "raw_body": raw_body})
+
+    spool = get_webhook_spool()
+    if spool is None:
+        return await _aaccept_webhook(request, raw_body, ip)
+    # Spool appends fsync; keep them off the event loop.
+    spool_webhook = sync_to_async(_spool_webhook, thread_sensitive=False)
+    if database_breaker.is_open():
+        return await spool_webhook(spool, request, raw_body, ip)
+
+    started = time.monotonic()
+    try:
+        response = await _aaccept_webhook(request, raw_body, ip)
+    except (OperationalError, InterfaceError):
+        logger.exception("Database unavailable, spooling webhook to disk", extra={"client_ip": ip})
+        database_breaker.trip()
+        return await spool_webhook(spool, request, raw_body, ip)
+    database_breaker.record(time.monotonic() - started)
+    return response
+
+
+def _commit_pictures(pictures: list[SpooledPicture]) -> None:
+    for picture in pictures:
+        picture.commit()
+
+
+def _discard_pictures(pictures: list[SpooledPicture]) -> None:
+    # Only pictures of events we kept were committed; the rest are temp files in the store.
+    for picture in pictures:
+        picture.discard()
+
+
+@csrf_exempt
+@require_POST
+def hik_event_webhook(request: HttpRequest) -> JsonResponse:
+    ip = _client_ip(request)
+    if not _is_allowed_ip(ip) or not _is_allowed_token(request):
+        return JsonResponse({"detail": "Unauthorized source"}, status=403)
+
+    if not is_multipart(request):
+        return _handle_webhook(request, request.body, [], ip)
+
+    body, pictures = read_multipart_webhook(request)
+    try:
+        return _handle_webhook(request, body, pictures, ip)
+    finally:
+        _discard_pictures(pictures)
+
+
+@csrf_exempt
+@require_POST
+async def hik_event_webhook_async(request: HttpRequest) -> JsonResponse:
+    ip = _client_ip(request)
+    if not _is_allowed_ip(ip) or not _is_allowed_token(request):
+        return JsonResponse({"detail": "Unauthorized source"}, status=403)
+
+    if not is_multipart(request):
+        return await _ahandle_webhook(request, request.body, [], ip)
+
+    # Multipart parsing streams pictures to disk; run it on a worker thread.
+    body, pictures = await sync_to_async(read_multipart_webhook, thread_sensitive=False)(request)
+    try:
+        return await _ahandle_webhook(request, body, pictures, ip)
+    finally:
+        await sync_to_async(_discard_pictures, thread_sensitive=False)(pictures)
 
 
 def _parse_csv_query_list(value: str) -> list[str]:
@@ -112,6 +283,18 @@ def _to_bool(value: str | None) -> bool:
     return str(value).strip().lower() in {"1", "true", "yes", "on"}
 
 
+def _inventory_cache_key(
+    max_result: int, protocol_types: list[str], statuses: list[str], dev_type: str, key: str
+) -> tuple | None:
+    """Cache key for a device inventory query, or None when the query is free-form and must not be cached."""
+    if key or len(dev_type) > INVENTORY_CACHE_MAX_TERM or not 1 <= max_result <= INVENTORY_CACHE_MAX_RESULT:
+        return None
+    filters = sorted(set(protocol_types)), sorted(set(statuses))
+    if any(len(items) > INVENTORY_CACHE_MAX_FILTERS or any(len(item) > INVENTORY_CACHE_MAX_TERM for item in items) for items in filters):
+        return None
+    return ("device_list_all", max_result, tuple(filters[0]), tuple(filters[1]), dev_type)
+
+
 def _is_admin_request(request: HttpRequest) -> bool:
     user = getattr(request, "user", None)
     return bool(user and user.is_authenticated and (user.is_staff or user.is_superuser))
@@ -125,6 +308,7 @@ def hik_devices_api(request: HttpRequest) -> Response:
     dev_type = (request.GET.get("dev_type") or "").strip()
     key = (request.GET.get("key") or "").strip()
     normalized = _to_bool(request.GET.get("normalized", "1"))
+    fresh = _to_bool(request.GET.get("fresh"))
 
     try:
         max_result = int(request.GET.get("max_result", 100))
@@ -151,20 +335,30 @@ def hik_devices_api(request: HttpRequest) -> Response:
     errors = []
     gateway_payloads = []
 
-    for gateway in gateways:
-        client = HikGatewayClient(gateway.base_url, gateway.username, gateway.password)
-        try:
-            payload = client.device_list_all(
+    cache_key = _inventory_cache_key(max_result, protocol_types, statuses, dev_type, key)
+
+    def list_devices(gateway, client):
+        def load():
+            return client.device_list_all(
                 max_result=max_result,
                 protocol_types=protocol_types or None,
                 statuses=statuses or None,
                 dev_type=dev_type,
                 key=key,
             )
-        except Exception as exc:  # noqa: BLE001
-            logger.exception("Unable to list devices for gateway", extra={"tenant": gateway.tenant.code, "gateway": gateway.base_url})
-            errors.append(f"{gateway.tenant.code}: {exc}")
+
+        if cache_key is None:
+            return load()
+        return inventory_cache.get(gateway.id, cache_key, load, fresh=fresh)
+
+    results = call_gateways(gateways, list_devices)
+
+    for result in results:
+        gateway = result.gateway
+        if not result.ok:
+            errors.append(f"{gateway.tenant.code}: {result.error}")
             continue
+        payload = result.payload
 
         gateway_payloads.append(
             {
@@ -239,16 +433,30 @@ def hik_devices_page(request: HttpRequest):
         context["error"] = "Request Parameters doit être un JSON valide."
         return render(request, "hik_gateway/device_list.html", context, status=400)
 
-    for gateway in gateways:
-        client = HikGatewayClient(gateway.base_url, gateway.username, gateway.password)
+    fresh = _to_bool(request.GET.get("fresh"))
+    # Only the default search is shared through the cache; hand-edited payloads are one-off requests.
+    cacheable = payload_to_send == DEFAULT_DEVICE_LIST_PAYLOAD
+    results = call_gateways(
+        gateways,
+        lambda gateway, client: inventory_cache.get(
+            gateway.id,
+            ("device_list", "default"),
+            lambda: client.device_list(payload=payload_to_send),
+            fresh=fresh,
+        )
+        if cacheable
+        else client.device_list(payload=payload_to_send),
+    )
+
+    for result in results:
+        gateway = result.gateway
         context["gateway_url"] = gateway.base_url
-        try:
-            payload = client.device_list(payload=payload_to_send)
-            response_payload = payload
-            context["status_code"] = 200
-        except Exception as exc:  # noqa: BLE001
-            errors.append(f"{gateway.tenant.code}: {exc}")
+        if not result.ok:
+            errors.append(f"{gateway.tenant.code}: {result.error}")
             continue
+        payload = result.payload
+        response_payload = payload
+        context["status_code"] = 200
 
         for item in extract_devices(payload):
             normalized = normalize_device(item)
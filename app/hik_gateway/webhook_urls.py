@@ -0,0 +1,11 @@
+from django.urls import path
+
+from hik_gateway.urls import webhook_view
+
+# Full request paths, since this urlconf is served on its own by the webhook fast lane.
+WEBHOOK_PATHS = ("/api/hik/events", "/api/hikvision/events")
+
+urlpatterns = [
+    path("api/hik/events", webhook_view, name="hik-events"),
+    path("api/hikvision/events", webhook_view, name="hikvision-events"),
+]